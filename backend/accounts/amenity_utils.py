@@ -1,6 +1,8 @@
 """Helpers for resolving business type and amenity catalogs."""
 
 from accounts.models import Amenity
+from accounts.persian_text import first_in_order, scan
+from accounts.reference_registry import registry
 
 BUSINESS_TYPE_KEYWORDS = {
     'cafe': ['کافه', 'قهوه', 'cafe', 'coffee'],
@@ -16,54 +18,37 @@ BUSINESS_TYPE_KEYWORDS = {
 }
 
 
-def normalize_persian(text: str) -> str:
-    if not text:
-        return ''
-    return (
-        text.replace('\u200c', '')
-        .replace('\u200d', '')
-        .replace('ي', 'ی')
-        .replace('ك', 'ک')
-        .strip()
-        .lower()
-    )
+def category_name_chain(category) -> str:
+    from accounts.category_tree import category_name_chain as name_chain
+    return name_chain(category)
 
 
-def category_name_chain(category) -> str:
-    names = []
-    cat = category
-    visited = set()
-    while cat and cat.pk not in visited:
-        visited.add(cat.pk)
-        if cat.name:
-            names.append(cat.name)
-        cat = cat.parent
-    return ' '.join(names)
+def business_type_for_names(names: str) -> str | None:
+    """Match a category name chain against the business type keyword table."""
+    return first_in_order(scan(names or '').get('business_type', frozenset()), BUSINESS_TYPE_KEYWORDS)
 
 
 def infer_business_type_from_category(category) -> str | None:
-    """Map a ServiceCategory to one of the amenity business_type keys."""
+    """Map a ServiceCategory to one of the amenity business_type keys (precomputed on the category)."""
     if not category:
         return None
-    combined = normalize_persian(category_name_chain(category))
-    for business_type, keywords in BUSINESS_TYPE_KEYWORDS.items():
-        for kw in keywords:
-            if normalize_persian(kw) in combined:
-                return business_type
-    return None
+    from accounts.category_tree import get_category
+    materialized = get_category(category.pk)
+    return (materialized.business_type if materialized else None) or None
 
 
 def get_amenities_for_business(business_profile):
-    """Return general + category-specific amenities for a business."""
+    """
+    Return general + category-specific amenities for a business.
+    The list comes from the in-process reference registry (ordered by business_type, order, name);
+    the Amenity instances are shared and must not be modified.
+    """
     business_type = infer_business_type_from_category(
         business_profile.category if business_profile else None
     )
-    qs = Amenity.objects.filter(is_active=True)
-    if business_type:
-        qs = qs.filter(business_type__in=['general', business_type])
-    else:
-        qs = qs.filter(business_type='general')
-    return qs.order_by('business_type', 'order', 'name'), business_type
+    types = {'general', business_type} if business_type else {'general'}
+    amenities = [a for a in registry.get().amenities if a.business_type in types]
+    return amenities, business_type
 
 
 BUSINESS_TYPE_LABELS = dict(Amenity.BUSINESS_TYPE_CHOICES)
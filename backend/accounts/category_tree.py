@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+درخت materialize شده ServiceCategory
+
+برای هر دسته این مقادیر ذخیره می‌شوند:
+- path: شناسه‌های مسیر از ریشه، مثل "/3/12/" (زیرمجموعه‌ها با یک range روی
+  ایندکس path پیدا می‌شوند؛ ServiceCategory.subtree_q)
+- depth
+- effective_club_id: باشگاه canonical دسته (از FK خود دسته یا اجداد، یا
+  کلمات کلیدی نام‌ها) — همان نتیجه resolve_business_club
+- business_type: نوع کسب‌وکار برای کاتالوگ امکانات
+
+درخت دسته‌ها کوچک است؛ با هر تغییر ServiceCategory یا Club کل درخت در حافظه
+دوباره محاسبه و فقط ردیف‌های تغییر کرده با bulk_update نوشته می‌شوند
+(accounts/signals.py). command rebuild_category_tree همین کار را دستی انجام
+می‌دهد.
+"""
+from .reference_registry import registry
+
+MATERIALIZED_FIELDS = ['path', 'depth', 'effective_club_id', 'business_type']
+
+
+def ancestor_chain(category, categories_by_id):
+    """[دسته، پدر، پدربزرگ، ...] بدون کوئری (با حفاظت در برابر حلقه)"""
+    chain = []
+    seen = set()
+    cat = category
+    while cat is not None and cat.pk not in seen:
+        seen.add(cat.pk)
+        chain.append(cat)
+        cat = categories_by_id.get(cat.parent_id) if cat.parent_id else None
+    return chain
+
+
+def category_name_chain(category):
+    """نام دسته و اجدادش (به ترتیب از خود دسته تا ریشه)"""
+    if not category:
+        return ''
+    categories_by_id = registry.get().categories_by_id
+    names = []
+    seen = set()
+    cat = category
+    while cat is not None and cat.pk not in seen:
+        seen.add(cat.pk)
+        if cat.name:
+            names.append(cat.name)
+        if not cat.parent_id:
+            break
+        # دسته تازه‌ای که هنوز در رجیستری این worker نیست → FK
+        cat = categories_by_id.get(cat.parent_id) or cat.parent
+    return ' '.join(names)
+
+
+def materialize(categories):
+    """
+    محاسبه مقادیر materialize شده برای همه دسته‌ها (در حافظه)
+    خروجی: دسته‌هایی که مقدارشان تغییر کرده
+    """
+    from packages.club_utils import club_for_category_chain
+    from .amenity_utils import business_type_for_names
+
+    categories_by_id = {category.pk: category for category in categories}
+    changed = []
+    for category in categories:
+        chain = ancestor_chain(category, categories_by_id)
+        names = ' '.join(cat.name for cat in chain if cat.name)
+        club = club_for_category_chain(chain, names)
+        values = {
+            'path': '/' + '/'.join(str(cat.pk) for cat in reversed(chain)) + '/',
+            'depth': len(chain) - 1,
+            'effective_club_id': club.pk if club else None,
+            'business_type': business_type_for_names(names) or '',
+        }
+        if any(getattr(category, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(category, field, value)
+            changed.append(category)
+    return changed
+
+
+def rebuild_category_tree():
+    """محاسبه مجدد کل درخت؛ خروجی: تعداد ردیف‌های به‌روز شده"""
+    from .models import ServiceCategory
+    from .reference_snapshots import invalidate
+
+    changed = materialize(list(ServiceCategory.objects.all()))
+    if changed:
+        ServiceCategory.objects.bulk_update(changed, MATERIALIZED_FIELDS, batch_size=500)
+        # bulk_update سیگنال ندارد؛ رجیستری همین worker و بقیه workerها باید دوباره بخوانند
+        invalidate(['service_categories'])
+        registry.invalidate()
+    return len(changed)
+
+
+def get_category(category_id):
+    """
+    دسته materialize شده با یک lookup در رجیستری
+    (دسته تازه در worker دیگر → یک کوئری؛ دسته materialize نشده → ساخت درخت)
+    نمونه برگردانده شده مشترک است و نباید تغییر داده شود.
+    """
+    from .models import ServiceCategory
+
+    if not category_id:
+        return None
+    category = registry.get().categories_by_id.get(category_id)
+    if category is None:
+        category = ServiceCategory.objects.filter(pk=category_id).first()
+    if category is not None and not category.path:
+        rebuild_category_tree()
+        category = ServiceCategory.objects.filter(pk=category_id).first()
+    return category
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+تخصیص کد یکتای کسب‌وکار (unique_code)
+
+روش قبلی (مرتب‌سازی بر اساس بیشترین کد + چند بار exists) در ثبت‌نام‌های همزمان
+کد تکراری می‌داد. اینجا:
+
+- شمارنده در جدول CodeSequence با UPDATE اتمیک (F expression) جلو می‌رود
+- هر worker یک بلوک از کدها را رزرو و از حافظه مصرف می‌کند
+- رقم آخر هر کد رقم کنترلی Luhn است تا اشتباه تایپی صندوق‌دار
+  (یک رقم اشتباه یا جابجایی دو رقم کنار هم) به کسب‌وکار دیگری نرسد
+
+کدهای قدیمی (۶ رقمی، بدون رقم کنترلی) همچنان معتبرند.
+کدهای رزرو شده‌ای که worker قبل از مصرف از دست بدهد (restart) فقط شکاف در
+دنباله ایجاد می‌کنند و هرگز تکراری نمی‌شوند.
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+BUSINESS_SEQUENCE = 'business_unique_code'
+
+# کد شروع برای اولین کسب‌وکار (بدون رقم کنترلی)
+FIRST_BASE = 111111
+
+# کدهای تا این مقدار، کدهای قدیمی بدون رقم کنترلی هستند
+LEGACY_CODE_MAX = 999999
+
+
+def luhn_digit(base):
+    """محاسبه رقم کنترلی Luhn برای عدد base"""
+    total = 0
+    for index, char in enumerate(reversed(str(base))):
+        digit = int(char)
+        if index % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return (10 - total % 10) % 10
+
+
+def with_check_digit(base):
+    return base * 10 + luhn_digit(base)
+
+
+def is_valid_code(code):
+    """
+    بررسی ساختار کد قبل از جستجو در دیتابیس
+    کدهای قدیمی رقم کنترلی ندارند و همیشه معتبر فرض می‌شوند.
+    """
+    if code <= 0:
+        return False
+    if code <= LEGACY_CODE_MAX:
+        return True
+    return luhn_digit(code // 10) == code % 10
+
+
+def initial_base(max_code):
+    """مقدار شروع شمارنده بر اساس بیشترین کد موجود"""
+    if not max_code:
+        return FIRST_BASE
+    if max_code <= LEGACY_CODE_MAX:
+        return max_code + 1
+    return max_code // 10 + 1
+
+
+class CodeAllocator:
+    """
+    رزرو بلوکی از شمارنده CodeSequence و تحویل کدها از حافظه
+    هر process یک نمونه دارد؛ lock برای workerهای چند thread است.
+    """
+
+    def __init__(self, name, block_size=None):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def get_block_size(self):
+        if self.block_size:
+            return self.block_size
+        return getattr(settings, 'UNIQUE_CODE_BLOCK_SIZE', 20)
+
+    def _seed_value(self):
+        from .models import BusinessProfile
+
+        max_code = (
+            BusinessProfile.objects.filter(unique_code__isnull=False)
+            .order_by('-unique_code')
+            .values_list('unique_code', flat=True)
+            .first()
+        )
+        return initial_base(max_code)
+
+    def _reserve(self, size):
+        """افزایش اتمیک شمارنده به اندازه size و برگرداندن بازه [start, end)"""
+        from .models import CodeSequence
+
+        with transaction.atomic():
+            updated = CodeSequence.objects.filter(name=self.name).update(
+                next_value=F('next_value') + size
+            )
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        CodeSequence.objects.create(
+                            name=self.name,
+                            next_value=self._seed_value() + size,
+                        )
+                except IntegrityError:
+                    # worker دیگری همزمان ردیف را ساخت
+                    CodeSequence.objects.filter(name=self.name).update(
+                        next_value=F('next_value') + size
+                    )
+            end = CodeSequence.objects.filter(name=self.name).values_list(
+                'next_value', flat=True
+            ).get()
+        return end - size, end
+
+    def next_base(self):
+        with self._lock:
+            if self._next >= self._end:
+                if connection.in_atomic_block:
+                    # اگر transaction بیرونی rollback شود، رزرو شمارنده هم برمی‌گردد؛
+                    # پس بلوک را در حافظه نگه نمی‌داریم تا worker دیگری کد تکراری نگیرد
+                    start, _ = self._reserve(1)
+                    return start
+                self._next, self._end = self._reserve(self.get_block_size())
+            base = self._next
+            self._next += 1
+            return base
+
+    def next_code(self):
+        """کد جدید همراه با رقم کنترلی"""
+        return with_check_digit(self.next_base())
+
+    def reset(self):
+        """دور ریختن بلوک رزرو شده در حافظه"""
+        with self._lock:
+            self._next = self._end = 0
+
+
+business_code_allocator = CodeAllocator(BUSINESS_SEQUENCE)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+ابزارهای جغرافیایی: geohash، پوشش bounding box با سلول‌های geohash و فاصله haversine
+
+BusinessProfile.geohash (دقت ۹ ≈ ۵ متر) هنگام save از مختصات ساخته می‌شود.
+جستجوی «نزدیک من» سه مرحله دارد:
+۱. پیش‌فیلتر با ایندکس: سلول‌های geohash که bounding box شعاع را می‌پوشانند
+   (هر سلول یک range روی ایندکس geohash)
+۲. پیش‌فیلتر دقیق bounding box روی lat/lng
+۳. فاصله haversine به صورت عبارت SQL (haversine_expression) برای فیلتر شعاع،
+   مرتب‌سازی و صفحه‌بندی cursor در خود دیتابیس
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+GEOHASH_PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# بزرگ‌تر از همه کاراکترهای geohash؛ سقف range پیشوند
+_PREFIX_END = '~'
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    lat, lng = float(lat), float(lng)
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(ارتفاع، عرض) سلول geohash به درجه"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def bounding_box(lat, lng, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) مستطیل دربرگیرنده دایره"""
+    lat, lng = float(lat), float(lng)
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlng = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return (
+        max(lat - dlat, -90.0), min(lat + dlat, 90.0),
+        max(lng - dlng, -180.0), min(lng + dlng, 180.0),
+    )
+
+
+def cells_for_bbox(bbox, precision, max_cells=None):
+    """
+    سلول‌های geohash با دقت ثابت که bbox را می‌پوشانند
+    اگر تعداد از max_cells بیشتر شود None برگردانده می‌شود.
+    """
+    if precision == 0:
+        return ['']
+    min_lat, max_lat, min_lng, max_lng = bbox
+    height, width = cell_size(precision)
+    rows = int(max_lat // height) - int(min_lat // height) + 1
+    cols = int(max_lng // width) - int(min_lng // width) + 1
+    if max_cells is not None and rows * cols > max_cells:
+        return None
+    cells = set()
+    for row in range(rows):
+        cell_lat = min(min_lat + row * height, max_lat)
+        for col in range(cols):
+            cell_lng = min(min_lng + col * width, max_lng)
+            cells.add(encode_geohash(cell_lat, cell_lng, precision))
+    # گوشه‌ها ممکن است با گام‌ها جا بیفتند
+    for corner_lat in (min_lat, max_lat):
+        for corner_lng in (min_lng, max_lng):
+            cells.add(encode_geohash(corner_lat, corner_lng, precision))
+    if max_cells is not None and len(cells) > max_cells:
+        return None
+    return sorted(cells)
+
+
+def covering_cells(bbox, max_cells=16):
+    """
+    سلول‌های geohash که bbox را می‌پوشانند؛ بیشترین دقتی که تعداد سلول‌ها از
+    max_cells بیشتر نشود (سلول بزرگ‌تر = range کمتر ولی ردیف اضافه بیشتر)
+    """
+    best = ['']
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        cells = cells_for_bbox(bbox, precision, max_cells)
+        if cells is None:
+            break
+        best = cells
+    return best
+
+
+def geohash_prefilter(cells, field='geohash'):
+    """Q شامل یک range روی ایندکس برای هر سلول (به جای LIKE که از ایندکس استفاده نمی‌کند)"""
+    condition = Q()
+    for cell in cells:
+        if not cell:
+            return Q(**{f'{field}__gt': ''})
+        condition |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + _PREFIX_END})
+    return condition
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def haversine_expression(lat, lng, lat_field, lng_field):
+    """عبارت SQL فاصله (کیلومتر) از نقطه ثابت تا ستون‌های lat/lng"""
+    lat_rad = math.radians(float(lat))
+    lng_rad = math.radians(float(lng))
+    row_lat = Radians(Cast(F(lat_field), FloatField()))
+    row_lng = Radians(Cast(F(lng_field), FloatField()))
+    a = (
+        Power(Sin((row_lat - Value(lat_rad)) / Value(2.0)), 2)
+        + Value(math.cos(lat_rad)) * Cos(row_lat)
+        * Power(Sin((row_lng - Value(lng_rad)) / Value(2.0)), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
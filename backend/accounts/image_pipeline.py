@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+پردازش پس‌زمینه تصاویر (عکس پروفایل، لوگو، گالری)
+
+فایل اصلی همان‌طور که آپلود شده ذخیره می‌شود و بعد از commit، نسخه‌های
+کوچک‌شده (thumb / card / full) با فرمت WebP و JPEG در یک process pool ساخته
+می‌شوند. نتیجه در فیلد JSON کنار فیلد تصویر ثبت می‌شود:
+
+    {'source': 'business_gallery_images/a.jpg',
+     'thumb': {'webp': 'variants/business_gallery_images/a/thumb.webp', 'jpg': ...},
+     'card': {...}, 'full': {...}}
+
+serializerهای فید با variant_url نسخه مناسب هر جایگاه را برمی‌گردانند و تا
+وقتی نسخه‌ها آماده نشده‌اند همان فایل اصلی برگردانده می‌شود.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# بیشترین طول ضلع هر نسخه (پیکسل)
+VARIANT_SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1280,
+}
+
+# پسوند فایل → فرمت Pillow
+VARIANT_FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+
+VARIANTS_DIR = 'variants'
+
+_executor = None
+
+# فایل‌های در صف پردازش → (future, [(model, pk, field_name, variants_field), ...])
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def variant_name(source_name, variant, ext):
+    """مسیر نسبی نسخه، قابل محاسبه از نام فایل اصلی"""
+    base, _ = os.path.splitext(source_name)
+    return f"{VARIANTS_DIR}/{base}/{variant}.{ext}"
+
+
+def render_variants(source_path, source_name, media_root):
+    """
+    ساخت همه نسخه‌ها از فایل اصلی (در process جداگانه اجرا می‌شود)
+    فقط به Pillow و مسیر فایل نیاز دارد تا بدون ORM قابل اجرا باشد.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        from pillow_heif import register_heif_opener  # type: ignore
+        register_heif_opener()
+    except Exception:
+        pass
+
+    result = {'source': source_name}
+    names = {
+        variant: {ext: variant_name(source_name, variant, ext) for ext in VARIANT_FORMATS}
+        for variant in VARIANT_SIZES
+    }
+    # فایل‌های محتوا-محور: اگر همین محتوا قبلاً پردازش شده، نسخه‌ها موجودند
+    if all(
+        os.path.exists(os.path.join(media_root, name))
+        for exts in names.values() for name in exts.values()
+    ):
+        result.update(names)
+        return result
+
+    with Image.open(source_path) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode in ('RGBA', 'LA', 'P'):
+            rgba = im.convert('RGBA')
+            flat = Image.new('RGB', rgba.size, (255, 255, 255))
+            flat.paste(rgba, mask=rgba.split()[-1])
+        else:
+            rgba = None
+            flat = im.convert('RGB')
+
+        for variant, max_edge in VARIANT_SIZES.items():
+            result[variant] = {}
+            for ext, fmt in VARIANT_FORMATS.items():
+                # WebP شفافیت را نگه می‌دارد، JPEG روی زمینه سفید
+                resized = (rgba if (rgba is not None and fmt == 'WEBP') else flat).copy()
+                resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+                name = variant_name(source_name, variant, ext)
+                path = os.path.join(media_root, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if fmt == 'JPEG':
+                    resized.save(path, fmt, quality=82, optimize=True, progressive=True)
+                else:
+                    resized.save(path, fmt, quality=80, method=4)
+                result[variant][ext] = name
+    return result
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2)
+        )
+    return _executor
+
+
+def _save_variants(model, pk, field_name, variants_field, variants):
+    """ثبت نسخه‌ها فقط اگر فایل اصلی در این فاصله عوض نشده باشد"""
+    model.objects.filter(pk=pk, **{field_name: variants['source']}).update(
+        **{variants_field: variants}
+    )
+
+
+def _on_done(source_name, submitter):
+    def callback(future):
+        with _pending_lock:
+            _, targets = _pending.pop(source_name, (None, []))
+        try:
+            variants = future.result()
+        except Exception as e:
+            logger.error(f'[image pipeline] {source_name}: {e}', exc_info=True)
+            return
+        if not targets:
+            return
+        try:
+            for target in targets:
+                _save_variants(*target, variants)
+        finally:
+            # معمولاً callback در thread داخلی executor اجرا می‌شود؛ ولی اگر future
+            # پیش از add_done_callback تمام شده باشد در همان thread ارسال‌کننده
+            # (درخواست، شاید داخل atomic) اجرا می‌شود و اتصال آن نباید بسته شود
+            if threading.current_thread() is not submitter:
+                connection.close()
+    return callback
+
+
+def _submit(field_file, target, save=True):
+    """
+    ارسال فایل به process pool؛ اگر همین فایل (مثلاً عکس پروفایل که لوگو هم
+    هست) در صف باشد فقط target اضافه می‌شود و همان future برگردانده می‌شود.
+    save=False: ثبت نتیجه برای target با خود فراخواننده است (process_now)، پس
+    callback نباید آن را دوباره ذخیره کند.
+    """
+    source_name = field_file.name
+    with _pending_lock:
+        if source_name in _pending:
+            future, targets = _pending[source_name]
+            if save:
+                targets.append(target)
+            else:
+                targets[:] = [t for t in targets if t != target]
+            return future
+        future = _get_executor().submit(
+            render_variants, field_file.path, source_name, str(settings.MEDIA_ROOT)
+        )
+        _pending[source_name] = (future, [target] if save else [])
+    # خارج از قفل: callback ممکن است همین‌جا اجرا شود و خودش قفل را می‌گیرد
+    future.add_done_callback(_on_done(source_name, threading.current_thread()))
+    return future
+
+
+def needs_processing(instance, field_name, variants_field):
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return False
+    variants = getattr(instance, variants_field) or {}
+    return variants.get('source') != field_file.name
+
+
+def process_now(instance, field_name, variants_field, in_pool=False, timeout=30):
+    """
+    ساخت نسخه‌ها و انتظار برای نتیجه
+    in_pool=False: در همین process (command و حالت sync)
+    in_pool=True: در process pool (مثلاً HEIC که مرورگر فایل اصلی را نمایش نمی‌دهد)
+    """
+    field_file = getattr(instance, field_name)
+    target = (type(instance), instance.pk, field_name, variants_field)
+    if in_pool:
+        variants = _submit(field_file, target, save=False).result(timeout=timeout)
+    else:
+        variants = render_variants(field_file.path, field_file.name, str(settings.MEDIA_ROOT))
+    _save_variants(*target, variants)
+    setattr(instance, variants_field, variants)
+    return variants
+
+
+def schedule(instance, field_name, variants_field):
+    """زمان‌بندی ساخت نسخه‌ها در process pool بعد از commit"""
+    if not needs_processing(instance, field_name, variants_field):
+        return
+
+    if getattr(settings, 'IMAGE_PIPELINE_SYNC', False):
+        transaction.on_commit(lambda: process_now(instance, field_name, variants_field))
+        return
+
+    field_file = getattr(instance, field_name)
+    target = (type(instance), instance.pk, field_name, variants_field)
+
+    def submit():
+        try:
+            _submit(field_file, target)
+        except Exception as e:
+            logger.error(f'[image pipeline] submit failed for {field_file.name}: {e}', exc_info=True)
+
+    transaction.on_commit(submit)
+
+
+def delete_variants(source_name):
+    """حذف نسخه‌های یک فایل اصلی (بعد از جایگزینی یا حذف تصویر)"""
+    if not source_name:
+        return
+    for variant in VARIANT_SIZES:
+        for ext in VARIANT_FORMATS:
+            name = variant_name(source_name, variant, ext)
+            try:
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+            except Exception:
+                pass
+
+
+def variant_url(field_file, variants, slot, request=None, ext='webp'):
+    """
+    URL نسخه مناسب جایگاه (thumb / card / full)
+    اگر نسخه‌ها هنوز آماده نیستند URL فایل اصلی برگردانده می‌شود.
+    """
+    if not field_file:
+        return None
+    variants = variants or {}
+    name = None
+    if variants.get('source') == field_file.name:
+        name = (variants.get(slot) or {}).get(ext)
+    try:
+        url = default_storage.url(name) if name else field_file.url
+    except Exception:
+        return None
+    return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+management command: benchmark_text
+micro-benchmark ماژول متن فارسی (accounts/persian_text.py) در برابر
+پیاده‌سازی قبلی (replace های زنجیره‌ای و حلقه تو در توی تست substring)
+
+روی نام‌های آزمایشی ساخته شده از کلمات کلیدی و کلمات بی‌ربط اجرا می‌شود و
+برابری نتیجه‌ها را هم بررسی می‌کند. دیتابیس لازم ندارد.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+
+def _legacy_normalize(text):
+    if not text:
+        return ''
+    return (
+        text.replace('\u200c', '')
+        .replace('\u200d', '')
+        .replace('ي', 'ی')
+        .replace('ك', 'ک')
+        .strip()
+        .lower()
+    )
+
+
+def _legacy_business_type(names):
+    from accounts.amenity_utils import BUSINESS_TYPE_KEYWORDS
+
+    combined = _legacy_normalize(names)
+    for business_type, keywords in BUSINESS_TYPE_KEYWORDS.items():
+        for kw in keywords:
+            if _legacy_normalize(kw) in combined:
+                return business_type
+    return None
+
+
+def _legacy_club_name(combined):
+    from packages.club_utils import CATEGORY_CLUB_KEYWORDS
+
+    combined_lower = combined.lower()
+    for club_name, keywords in CATEGORY_CLUB_KEYWORDS.items():
+        if any(kw in combined or kw in combined_lower for kw in keywords):
+            return club_name
+    return None
+
+
+FILLER = ['مرکز', 'تخصصی', 'شعبه', 'ونک', 'خانواده', 'ممتاز', 'نوین', 'پارس', 'آسمان', 'گلستان']
+
+
+class Command(BaseCommand):
+    help = 'مقایسه سرعت نرمال‌سازی و تطبیق کلمات کلیدی فارسی با پیاده‌سازی قبلی'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=2000, help='تعداد نام‌های آزمایشی')
+        parser.add_argument('--repeat', type=int, default=5, help='تکرار هر اندازه‌گیری')
+
+    def _samples(self, count):
+        from accounts.amenity_utils import BUSINESS_TYPE_KEYWORDS
+        from packages.club_utils import CATEGORY_CLUB_KEYWORDS
+
+        keywords = [kw for kws in BUSINESS_TYPE_KEYWORDS.values() for kw in kws]
+        keywords += [kw for kws in CATEGORY_CLUB_KEYWORDS.values() for kw in kws]
+        rng = random.Random(13)
+        samples = []
+        for _ in range(count):
+            words = rng.sample(FILLER, 3)
+            if rng.random() < 0.7:
+                words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+            text = ' '.join(words)
+            if rng.random() < 0.3:
+                text = text.replace('ی', 'ي').replace('ک', 'ك')
+            if rng.random() < 0.3:
+                text = text.replace(' ', '\u200c', 1)
+            samples.append(text)
+        return samples
+
+    def _time(self, func, samples, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for text in samples:
+                func(text)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best / len(samples) * 1_000_000
+
+    def handle(self, *args, **options):
+        from accounts import persian_text
+        from accounts.amenity_utils import BUSINESS_TYPE_KEYWORDS
+        from packages.club_utils import CATEGORY_CLUB_KEYWORDS
+
+        samples = self._samples(options['samples'])
+        repeat = options['repeat']
+
+        def business_type(text):
+            matches = persian_text.scan.__wrapped__(text).get('business_type', frozenset())
+            return persian_text.first_in_order(matches, BUSINESS_TYPE_KEYWORDS)
+
+        def club_name(text):
+            matches = persian_text.scan.__wrapped__(text).get('club', frozenset())
+            return persian_text.first_in_order(matches, CATEGORY_CLUB_KEYWORDS)
+
+        mismatches = sum(
+            _legacy_business_type(text) != business_type(text) for text in samples
+        )
+        # تطبیق باشگاه حالا روی متن نرمال شده است (ی/ک عربی هم پیدا می‌شود)
+        club_changes = sum(
+            _legacy_club_name(text) not in (None, club_name(text)) for text in samples
+        )
+        persian_text.keyword_automaton()
+
+        def translate_normalize(text):
+            return text.translate(persian_text.TRANSLATE_TABLE).strip().lower() if text else ''
+
+        rows = [
+            ('normalize', _legacy_normalize, persian_text.normalize),
+            ('normalize (str.translate)', _legacy_normalize, translate_normalize),
+            ('business type (no cache)', _legacy_business_type, business_type),
+            ('club keywords (no cache)', _legacy_club_name, club_name),
+        ]
+        self.stdout.write(f'samples={len(samples)} repeat={repeat} (µs per call, best run)')
+        for label, legacy, current in rows:
+            before = self._time(legacy, samples, repeat)
+            after = self._time(current, samples, repeat)
+            self.stdout.write(f'{label:<28} legacy={before:8.2f}  new={after:8.2f}  x{before / after:5.1f}')
+
+        persian_text.scan.cache_clear()
+        for text in samples:
+            persian_text.scan(text)
+        cached = self._time(persian_text.scan, samples, repeat)
+        self.stdout.write(f'{"scan (cached)":<28} new={cached:8.2f}')
+        self.stdout.write(
+            f'business type mismatches: {mismatches}; club results changed: {club_changes}'
+        )
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+management command: gc_media_blobs
+جمع‌آوری فایل‌های media بدون ارجاع (برای اجرای دوره‌ای با cron)
+
+۱. شمارش مجدد ارجاع‌ها از روی همه FileFieldها (اصلاح هر انحراف شمارنده‌ها)
+۲. حذف blobهایی که بیش از مهلت تعیین شده بدون ارجاع مانده‌اند، همراه با نسخه‌هایشان
+۳. (اختیاری) حذف فایل‌های قدیمی غیر محتوا-محور که دیگر به آن‌ها ارجاعی نیست؛
+   فقط در پوشه‌های upload_to فیلدهای پیگیری‌شده و با چاپ مسیر هر فایل حذف‌شده
+"""
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'حذف فایل‌های media بدون ارجاع (blobهای محتوا-محور و فایل‌های قدیمی)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=int,
+            default=24,
+            help='حداقل مدت بدون ارجاع بودن قبل از حذف (ساعت)'
+        )
+        parser.add_argument(
+            '--legacy',
+            action='store_true',
+            help='فایل‌های قدیمی بدون ارجاع در پوشه‌های upload_to (خارج از blobs/) هم حذف شوند'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='فقط پیش‌نمایش بدون حذف'
+        )
+
+    def handle(self, *args, **options):
+        from django.core.files.storage import default_storage
+        from accounts.models import MediaBlob
+        from accounts.image_pipeline import delete_variants
+        from accounts.storage import referenced_names
+
+        dry_run = options.get('dry_run')
+        now = timezone.now()
+        cutoff = now - timedelta(hours=options['grace_hours'])
+
+        references = referenced_names()
+
+        # ۱. شمارش مجدد
+        changed = []
+        for blob in MediaBlob.objects.only('id', 'name', 'ref_count', 'unreferenced_since').iterator():
+            actual = references.get(blob.name, 0)
+            if blob.ref_count == actual:
+                continue
+            if actual == 0:
+                # ارجاع تازه ممکن است بعد از mark ثبت شده باشد؛ مهلت از الان شروع می‌شود
+                blob.unreferenced_since = now
+            elif blob.ref_count == 0:
+                blob.unreferenced_since = None
+            blob.ref_count = actual
+            changed.append(blob)
+        if changed and not dry_run:
+            MediaBlob.objects.bulk_update(changed, ['ref_count', 'unreferenced_since'], batch_size=500)
+
+        # ۲. حذف blobهای بدون ارجاع
+        removed = 0
+        freed = 0
+        candidates = MediaBlob.objects.filter(ref_count=0, unreferenced_since__lt=cutoff)
+        for blob in candidates.iterator():
+            if dry_run:
+                removed += 1
+                freed += blob.size
+                continue
+            # فقط اگر در این فاصله ارجاعی اضافه نشده باشد
+            deleted, _ = MediaBlob.objects.filter(pk=blob.pk, ref_count=0).delete()
+            if not deleted:
+                continue
+            if default_storage.exists(blob.name):
+                default_storage.delete(blob.name)
+            delete_variants(blob.name)
+            removed += 1
+            freed += blob.size
+
+        self.stdout.write(f'ref counts fixed: {len(changed)}')
+        self.stdout.write(f'blobs removed: {removed} ({freed / 1024 / 1024:.1f} MB)')
+
+        # ۳. فایل‌های قدیمی
+        if options.get('legacy'):
+            removed_legacy = self._sweep_legacy(references, cutoff, dry_run)
+            self.stdout.write(f'legacy files removed: {removed_legacy}')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('dry-run: هیچ فایلی حذف نشد'))
+
+    def _legacy_dirs(self):
+        """
+        پوشه‌های upload_to فیلدهای پیگیری‌شده؛ فایل‌های قدیمی فقط در همین‌ها جستجو
+        می‌شوند تا هر چیز دیگری که در MEDIA_ROOT است دست نخورد
+        """
+        from accounts.storage import tracked_file_fields
+
+        dirs = set()
+        for model, fields in tracked_file_fields():
+            for field_name in fields:
+                upload_to = model._meta.get_field(field_name).upload_to
+                if callable(upload_to):
+                    self.stdout.write(f'legacy: skipped {model.__name__}.{field_name} (callable upload_to)')
+                    continue
+                # بخش ثابت مسیر، قبل از الگوهای strftime مثل '%Y/%m'
+                # upload_to خالی یعنی ریشه MEDIA_ROOT که جستجو نمی‌شود
+                prefix = upload_to.split('%', 1)[0].strip('/')
+                if prefix:
+                    dirs.add(os.path.normpath(prefix))
+        return sorted(dirs)
+
+    def _sweep_legacy(self, references, cutoff, dry_run):
+        from django.conf import settings
+        from accounts.image_pipeline import VARIANTS_DIR, delete_variants
+        from accounts.storage import BLOBS_DIR
+
+        media_root = str(settings.MEDIA_ROOT)
+        cutoff_ts = cutoff.timestamp()
+        removed = 0
+        for upload_dir in self._legacy_dirs():
+            if upload_dir.split(os.sep)[0] in (BLOBS_DIR, VARIANTS_DIR):
+                continue
+            for root, _, files in os.walk(os.path.join(media_root, upload_dir)):
+                rel_root = os.path.relpath(root, media_root)
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    name = os.path.normpath(os.path.join(rel_root, filename)).replace(os.sep, '/')
+                    if name in references:
+                        continue
+                    if os.path.getmtime(path) >= cutoff_ts:
+                        continue
+                    removed += 1
+                    if dry_run:
+                        self.stdout.write(f'legacy: would remove {name}')
+                        continue
+                    os.remove(path)
+                    delete_variants(name)
+                    self.stdout.write(f'legacy: removed {name}')
+        return removed
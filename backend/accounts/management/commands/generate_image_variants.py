@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+management command: generate_image_variants
+ساخت نسخه‌های thumb/card/full برای تصاویری که هنوز نسخه ندارند
+(تصاویر قدیمی یا کارهایی که با restart شدن process از صف pool حذف شده‌اند)
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'ساخت نسخه‌های کوچک‌شده (WebP/JPEG) برای عکس پروفایل، لوگو و گالری'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='ساخت دوباره حتی اگر نسخه‌ها موجود باشند'
+        )
+
+    def handle(self, *args, **options):
+        from accounts.models import User, BusinessProfile, BusinessGallery
+        from accounts.image_pipeline import needs_processing, process_now
+
+        force = options.get('force')
+        targets = [
+            (User.objects.exclude(image='').exclude(image__isnull=True), 'image', 'image_variants'),
+            (BusinessProfile.objects.exclude(logo='').exclude(logo__isnull=True), 'logo', 'logo_variants'),
+            (BusinessGallery.objects.exclude(image=''), 'image', 'image_variants'),
+        ]
+
+        processed = 0
+        failed = 0
+        for queryset, field_name, variants_field in targets:
+            for instance in queryset.iterator():
+                if not force and not needs_processing(instance, field_name, variants_field):
+                    continue
+                try:
+                    process_now(instance, field_name, variants_field)
+                    processed += 1
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'  {instance._meta.label} #{instance.pk}: {e}'
+                    ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'نسخه‌های {processed} تصویر ساخته شد' + (f' ({failed} خطا)' if failed else '')
+        ))
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+management command: rebuild_category_tree
+محاسبه مجدد path / باشگاه / نوع کسب‌وکار materialize شده همه دسته‌ها
+(بعد از migrate یا تغییرات گروهی بدون سیگنال مثل queryset.update)
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'محاسبه مجدد درخت materialize شده دسته‌بندی‌های خدمات'
+
+    def handle(self, *args, **options):
+        from accounts.category_tree import rebuild_category_tree
+
+        updated = rebuild_category_tree()
+        self.stdout.write(self.style.SUCCESS(f'دسته‌های به‌روز شده: {updated}'))
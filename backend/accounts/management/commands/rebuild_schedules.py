@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+management command: rebuild_schedules
+کامپایل مجدد برنامه هفتگی (weekly_hours / open_slots) همه کسب‌وکارها
+(بعد از تغییرات گروهی ساعات کاری بدون سیگنال مثل bulk_create یا queryset.update)
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'کامپایل مجدد برنامه هفتگی ساعات کاری کسب‌وکارها'
+
+    def handle(self, *args, **options):
+        from accounts.models import BusinessProfile
+        from accounts.schedule import rebuild_business_schedule
+
+        count = 0
+        for business_id in BusinessProfile.objects.values_list('id', flat=True).iterator():
+            rebuild_business_schedule(business_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'برنامه کسب‌وکارهای کامپایل شده: {count}'))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+management command: stress_unique_codes
+آزمون همزمانی تخصیص unique_code: چند process (مثل workerهای gunicorn) همزمان
+کسب‌وکار ثبت می‌کنند و در پایان تکراری نبودن کدها و صحت رقم کنترلی بررسی می‌شود.
+
+کاربران و کسب‌وکارهای آزمایشی در پایان حذف می‌شوند؛ کدهای مصرف شده فقط در
+شمارنده شکاف ایجاد می‌کنند.
+"""
+import multiprocessing
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def _register_businesses(prefix, worker, count, queue):
+    from accounts.models import User, BusinessProfile
+
+    # هر process باید اتصال دیتابیس خودش را باز کند
+    connections.close_all()
+    codes = []
+    try:
+        for i in range(count):
+            user = User.objects.create(
+                username=f'{prefix}_{worker}_{i}',
+                phone_number=f'{prefix}{worker:02d}{i:04d}',
+                role='business',
+            )
+            business = BusinessProfile.objects.create(user=user, name='')
+            codes.append(business.unique_code)
+        queue.put((worker, codes, None))
+    except Exception as e:
+        queue.put((worker, codes, repr(e)))
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'آزمون تکراری نبودن unique_code در ثبت‌نام همزمان کسب‌وکارها'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='تعداد process همزمان')
+        parser.add_argument('--per-worker', type=int, default=50, help='تعداد ثبت‌نام هر process')
+
+    def handle(self, *args, **options):
+        from accounts.models import User
+        from accounts.code_allocator import is_valid_code
+
+        workers = options['workers']
+        per_worker = options['per_worker']
+        prefix = f'st{uuid.uuid4().hex[:6]}'
+
+        # fork تا تنظیمات Django در processها آماده باشد
+        ctx = multiprocessing.get_context('fork')
+        queue = ctx.Queue()
+        connections.close_all()
+        processes = [
+            ctx.Process(target=_register_businesses, args=(prefix, w, per_worker, queue))
+            for w in range(workers)
+        ]
+        for p in processes:
+            p.start()
+        results = [queue.get() for _ in processes]
+        for p in processes:
+            p.join()
+
+        try:
+            errors = [(w, err) for w, _, err in results if err]
+            codes = [code for _, worker_codes, _ in results for code in worker_codes]
+            duplicates = [code for code, n in Counter(codes).items() if n > 1]
+            invalid = [code for code in codes if not is_valid_code(code)]
+
+            self.stdout.write(f'registrations: {len(codes)} / {workers * per_worker}')
+            self.stdout.write(f'distinct codes: {len(set(codes))}')
+            self.stdout.write(f'duplicates: {len(duplicates)}')
+            self.stdout.write(f'invalid check digits: {len(invalid)}')
+            for worker, err in errors:
+                self.stdout.write(self.style.WARNING(f'worker {worker}: {err}'))
+        finally:
+            User.objects.filter(username__startswith=f'{prefix}_').delete()
+
+        if duplicates or invalid:
+            raise CommandError('تخصیص unique_code در حالت همزمان نادرست است')
+        # ثبت‌نام ناموفق (مثلاً database is locked) هم شکست آزمون است
+        if errors or len(codes) < workers * per_worker:
+            raise CommandError(f'{workers * per_worker - len(codes)} ثبت‌نام همزمان ناموفق بود')
+        self.stdout.write(self.style.SUCCESS('کد تکراری یا نامعتبر یافت نشد'))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+management command: sync_replica
+به‌روزرسانی replica محلی SQLite (DATABASES['replica'] با DATABASE_REPLICA_NAME)
+از روی default با backup API خود SQLite؛ برای تست محلی مسیر replica
+(core/db_router.py) یا اجرای دوره‌ای با cron.
+
+با --interval در حلقه اجرا می‌شود و تاخیر replica را شبیه‌سازی می‌کند. replica
+PostgreSQL با replication خود PostgreSQL به‌روز می‌شود و به این command نیازی ندارد.
+"""
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.db_router import DEFAULT_DB, REPLICA_DB, replica_configured
+
+
+class Command(BaseCommand):
+    help = 'کپی دیتابیس default روی replica محلی SQLite'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='تکرار هر چند ثانیه (۰: یک بار)'
+        )
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('replica تعریف نشده است (DATABASE_REPLICA_NAME)')
+        source = connections[DEFAULT_DB].settings_dict
+        target = connections[REPLICA_DB].settings_dict
+        if connections[DEFAULT_DB].vendor != 'sqlite' or connections[REPLICA_DB].vendor != 'sqlite':
+            raise CommandError('sync_replica فقط برای replica محلی SQLite است')
+        if str(source['NAME']) == str(target['NAME']):
+            raise CommandError('replica و default یک فایل هستند')
+
+        while True:
+            started = time.perf_counter()
+            self._copy(str(source['NAME']), str(target['NAME']))
+            self.stdout.write(
+                f"replica به‌روز شد ({(time.perf_counter() - started) * 1000:.0f}ms): {target['NAME']}"
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def _copy(self, source_path, target_path):
+        source = sqlite3.connect(source_path)
+        replica = sqlite3.connect(target_path, timeout=30)
+        try:
+            source.backup(replica)
+        finally:
+            replica.close()
+            source.close()
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.7 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+BUSINESS_SEQUENCE = 'business_unique_code'
+FIRST_BASE = 111111
+LEGACY_CODE_MAX = 999999
+
+
+def seed_business_sequence(apps, schema_editor):
+    """
+    مقدار شروع شمارنده از بیشترین unique_code موجود
+    کدهای قدیمی ۶ رقمی بدون رقم کنترلی هستند؛ کدهای جدید base * 10 + رقم کنترلی
+    """
+    BusinessProfile = apps.get_model('accounts', 'BusinessProfile')
+    CodeSequence = apps.get_model('accounts', 'CodeSequence')
+
+    max_code = (
+        BusinessProfile.objects.filter(unique_code__isnull=False)
+        .order_by('-unique_code')
+        .values_list('unique_code', flat=True)
+        .first()
+    )
+    if not max_code:
+        next_value = FIRST_BASE
+    elif max_code <= LEGACY_CODE_MAX:
+        next_value = max_code + 1
+    else:
+        next_value = max_code // 10 + 1
+
+    CodeSequence.objects.update_or_create(
+        name=BUSINESS_SEQUENCE,
+        defaults={'next_value': next_value},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_businessprofile_unique_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='نام شمارنده')),
+                ('next_value', models.PositiveIntegerField(verbose_name='مقدار بعدی')),
+            ],
+            options={
+                'verbose_name': 'شمارنده کد',
+                'verbose_name_plural': 'شمارنده‌های کد',
+            },
+        ),
+        migrations.RunPython(seed_business_sequence, migrations.RunPython.noop),
+    ]
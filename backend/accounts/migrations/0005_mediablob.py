@@ -0,0 +1,30 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='نام فایل')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='حجم (بایت)')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='تعداد ارجاع')),
+                ('unreferenced_since', models.DateTimeField(blank=True, null=True, verbose_name='بدون ارجاع از')),
+            ],
+            options={
+                'verbose_name': 'فایل media',
+                'verbose_name_plural': 'فایل‌های media',
+                'indexes': [models.Index(fields=['ref_count', 'unreferenced_since'], name='accounts_me_ref_cou_152f51_idx')],
+            },
+        ),
+    ]
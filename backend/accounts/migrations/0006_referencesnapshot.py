@@ -0,0 +1,31 @@
+# Generated by Django 5.0.7 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_mediablob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(max_length=50, unique=True, verbose_name='کلید')),
+                ('etag', models.CharField(max_length=64, verbose_name='hash محتوا')),
+                ('payload', models.BinaryField(verbose_name='محتوای gzip شده')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='حجم JSON (بایت)')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='نسخه داده')),
+                ('built_version', models.PositiveIntegerField(default=0, verbose_name='نسخه ساخته شده')),
+            ],
+            options={
+                'verbose_name': 'snapshot داده مرجع',
+                'verbose_name_plural': 'snapshotهای داده مرجع',
+            },
+        ),
+    ]
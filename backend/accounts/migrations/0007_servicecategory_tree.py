@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_referencesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicecategory',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255, verbose_name='مسیر'),
+        ),
+        migrations.AddField(
+            model_name='servicecategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='عمق'),
+        ),
+        migrations.AddField(
+            model_name='servicecategory',
+            name='effective_club_id',
+            field=models.PositiveBigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='باشگاه محاسبه شده'),
+        ),
+        migrations.AddField(
+            model_name='servicecategory',
+            name='business_type',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20, verbose_name='نوع کسب\u200cوکار محاسبه شده'),
+        ),
+    ]
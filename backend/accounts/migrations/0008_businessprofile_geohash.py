@@ -0,0 +1,64 @@
+# Generated by Django 5.0.7 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+# کپی accounts.geo.encode_geohash در زمان این migration (دقت ۹)؛ migration نباید
+# به کد جاری وابسته باشد تا تغییرات بعدی آن تاریخچه را عوض نکند
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(lat, lng, precision=9):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    lat, lng = float(lat), float(lng)
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def fill_geohash(apps, schema_editor):
+    BusinessProfile = apps.get_model('accounts', 'BusinessProfile')
+    located = BusinessProfile.objects.exclude(business_location_latitude__isnull=True).exclude(
+        business_location_longitude__isnull=True
+    )
+    changed = []
+    for business in located.only('id', 'business_location_latitude', 'business_location_longitude').iterator():
+        business.geohash = encode_geohash(
+            business.business_location_latitude, business.business_location_longitude
+        )
+        changed.append(business)
+    BusinessProfile.objects.bulk_update(changed, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_servicecategory_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businessprofile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
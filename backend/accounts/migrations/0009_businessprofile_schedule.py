@@ -0,0 +1,108 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+# کپی accounts.schedule.compile_schedule در زمان این migration؛ migration نباید
+# به کد جاری وابسته باشد تا تغییرات بعدی آن تاریخچه را عوض نکند
+SLOT_MINUTES = 5
+MINUTES_PER_DAY = 24 * 60
+SLOT_COUNT = 7 * MINUTES_PER_DAY // SLOT_MINUTES
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _subtract(intervals, removed):
+    result = []
+    for start, end in intervals:
+        pieces = [[start, end]]
+        for cut_start, cut_end in removed:
+            next_pieces = []
+            for piece_start, piece_end in pieces:
+                if cut_end <= piece_start or cut_start >= piece_end:
+                    next_pieces.append([piece_start, piece_end])
+                    continue
+                if piece_start < cut_start:
+                    next_pieces.append([piece_start, cut_start])
+                if cut_end < piece_end:
+                    next_pieces.append([cut_end, piece_end])
+            pieces = next_pieces
+        result.extend(pieces)
+    return result
+
+
+def compile_schedule(hours):
+    days = {}
+    working = []
+    breaks = []
+    for entry in sorted(hours, key=lambda h: (h.weekday, h.start_time)):
+        days.setdefault(str(entry.weekday), []).append([
+            entry.start_time.strftime('%H:%M'),
+            entry.end_time.strftime('%H:%M'),
+            entry.is_closed,
+            entry.is_break,
+        ])
+        if entry.is_closed:
+            continue
+        offset = entry.weekday * MINUTES_PER_DAY
+        interval = (offset + _minutes(entry.start_time), offset + _minutes(entry.end_time))
+        if interval[0] >= interval[1]:
+            continue
+        (breaks if entry.is_break else working).append(interval)
+
+    open_intervals = _merge(_subtract(_merge(working), _merge(breaks)))
+
+    slots = ['0'] * SLOT_COUNT
+    for start, end in open_intervals:
+        first = -(-start // SLOT_MINUTES)
+        for slot in range(first, end // SLOT_MINUTES):
+            slots[slot] = '1'
+    return {'days': days, 'open': open_intervals}, ''.join(slots)
+
+
+def compile_schedules(apps, schema_editor):
+    BusinessProfile = apps.get_model('accounts', 'BusinessProfile')
+    BusinessWorkingHours = apps.get_model('accounts', 'BusinessWorkingHours')
+
+    hours_by_business = {}
+    for entry in BusinessWorkingHours.objects.all().iterator():
+        hours_by_business.setdefault(entry.business_profile_id, []).append(entry)
+
+    changed = []
+    for business in BusinessProfile.objects.filter(pk__in=hours_by_business).only('id'):
+        business.weekly_hours, business.open_slots = compile_schedule(hours_by_business[business.pk])
+        changed.append(business)
+    BusinessProfile.objects.bulk_update(changed, ['weekly_hours', 'open_slots'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_businessprofile_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businessprofile',
+            name='weekly_hours',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='businessprofile',
+            name='open_slots',
+            field=models.CharField(blank=True, default='', editable=False, max_length=2016),
+        ),
+        migrations.RunPython(compile_schedules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.7 on 2026-10-19 21:10
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # جدول DatabaseCache (CACHE_BACKEND=database، پیش‌فرض core/cache_tier.py)؛
+    # برای backendهای دیگر کاری انجام نمی‌دهد و اگر جدول باشد دوباره ساخته نمی‌شود
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_businessprofile_modified_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
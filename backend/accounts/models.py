@@ -1,4 +1,3 @@
-import os
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import AbstractUser
@@ -42,6 +41,16 @@ class ServiceCategory(BaseModel):
         verbose_name='باشگاه'
     )
 
+    # مقادیر materialize شده؛ فقط accounts/category_tree.py آن‌ها را می‌نویسد
+    path = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False, verbose_name='مسیر')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='عمق')
+    effective_club_id = models.PositiveBigIntegerField(
+        null=True, blank=True, db_index=True, editable=False, verbose_name='باشگاه محاسبه شده'
+    )
+    business_type = models.CharField(
+        max_length=20, blank=True, default='', editable=False, verbose_name='نوع کسب\u200cوکار محاسبه شده'
+    )
+
     class Meta:
         verbose_name = 'دسته‌بندی خدمات'
         verbose_name_plural = 'دسته‌بندی‌های خدمات'
@@ -50,6 +59,22 @@ class ServiceCategory(BaseModel):
     def __str__(self):
         return self.name
 
+    def subtree_q(self, prefix=''):
+        """
+        شرط همه دسته‌های زیرمجموعه (شامل خود دسته) با یک range روی path
+        مثال: BusinessProfile.objects.filter(category.subtree_q('category__'))
+        """
+        path = self.path
+        if not path:
+            # نمونه قبل از materialize شدن در حافظه مانده
+            from .category_tree import get_category
+            path = get_category(self.pk).path
+        # '/' < '0'؛ پس "/3/12/..." بین "/3/12/" و "/3/120" قرار می‌گیرد ولی "/3/120/" نه
+        return models.Q(**{
+            f'{prefix}path__gte': path,
+            f'{prefix}path__lt': path[:-1] + '0',
+        })
+
 
 class Province(BaseModel):
     name = models.CharField(max_length=100, verbose_name='نام استان')
@@ -95,6 +120,8 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     phone_number = models.CharField(max_length=20, unique=True)
     image = models.ImageField(upload_to='user_images/', blank=True, null=True)
+    # نسخه‌های کوچک‌شده تصویر (accounts/image_pipeline.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     
     # Override AbstractUser fields to make them optional
     email = models.EmailField(blank=True, null=True)
@@ -123,8 +150,74 @@ class User(AbstractUser):
             except:
                 return False
         return True  # For other roles, assume profile is complete
+
+    @property
+    def is_ops_staff(self):
+        """کارکنان فنی با دسترسی به ابزارهای عملیاتی (آمار درخواست‌ها، profiling)"""
+        return self.is_staff or self.role in ('admin', 'it_manager')
     
 
+class CodeSequence(models.Model):
+    """
+    شمارنده کدهای یکتا (مثل unique_code کسب‌وکار)
+    فقط با UPDATE اتمیک از طریق accounts/code_allocator.py جلو می‌رود
+    """
+    name = models.CharField(max_length=50, unique=True, verbose_name='نام شمارنده')
+    next_value = models.PositiveIntegerField(verbose_name='مقدار بعدی')
+
+    class Meta:
+        verbose_name = 'شمارنده کد'
+        verbose_name_plural = 'شمارنده‌های کد'
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class MediaBlob(BaseModel):
+    """
+    فایل ذخیره شده در ContentAddressedStorage و تعداد ارجاع‌های آن
+    (accounts/storage.py)
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name='نام فایل')
+    size = models.PositiveBigIntegerField(default=0, verbose_name='حجم (بایت)')
+    ref_count = models.PositiveIntegerField(default=0, verbose_name='تعداد ارجاع')
+    unreferenced_since = models.DateTimeField(
+        null=True, blank=True, verbose_name='بدون ارجاع از'
+    )
+
+    class Meta:
+        verbose_name = 'فایل media'
+        verbose_name_plural = 'فایل‌های media'
+        indexes = [
+            models.Index(fields=['ref_count', 'unreferenced_since']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+class ReferenceSnapshot(BaseModel):
+    """
+    نسخه ذخیره شده (JSON فشرده) یک مجموعه داده مرجع مثل باشگاه‌ها و استان‌ها
+    (accounts/reference_snapshots.py)
+    version با هر تغییر مدل‌های مرتبط یک واحد زیاد می‌شود و اگر با built_version
+    برابر نباشد snapshot کهنه است و در درخواست بعدی دوباره ساخته می‌شود.
+    """
+    key = models.CharField(max_length=50, unique=True, verbose_name='کلید')
+    etag = models.CharField(max_length=64, verbose_name='hash محتوا')
+    payload = models.BinaryField(verbose_name='محتوای gzip شده')
+    size = models.PositiveIntegerField(default=0, verbose_name='حجم JSON (بایت)')
+    version = models.PositiveIntegerField(default=0, verbose_name='نسخه داده')
+    built_version = models.PositiveIntegerField(default=0, verbose_name='نسخه ساخته شده')
+
+    class Meta:
+        verbose_name = 'snapshot داده مرجع'
+        verbose_name_plural = 'snapshotهای داده مرجع'
+
+    def __str__(self):
+        return f"{self.key} ({self.etag[:12]})"
+
+
 class BusinessProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, limit_choices_to={'role': 'business'})
     name = models.CharField(max_length=255, blank=True, null=True, verbose_name='نام کسب‌وکار')
@@ -135,8 +228,16 @@ class BusinessProfile(models.Model):
     rating_avg = models.FloatField(default=0)
     business_location_latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
     business_location_longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    # از مختصات در save ساخته می‌شود (accounts/geo.py)
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    # برنامه هفتگی کامپایل شده از BusinessWorkingHours (accounts/schedule.py)
+    weekly_hours = models.JSONField(default=dict, blank=True, editable=False)
+    open_slots = models.CharField(max_length=2016, blank=True, default='', editable=False)
+    # همگام‌سازی index های حافظه‌ای workerها (packages/typeahead.py)
+    modified_at = models.DateTimeField(auto_now=True, db_index=True)
     city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True)
     logo = models.ImageField(upload_to='business_logos/', blank=True, null=True, verbose_name='لوگو')
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False)
     instagram_link = models.URLField(blank=True, null=True, verbose_name='لینک صفحه اینستاگرام')
     website_link = models.URLField(blank=True, null=True, verbose_name='لینک سایت')
     unique_code = models.PositiveIntegerField(unique=True, blank=True, null=True, verbose_name='کد منحصر به فرد')
@@ -189,34 +290,12 @@ class BusinessProfile(models.Model):
     def generate_unique_code():
         """
         تولید کد یکتا برای کسب‌وکار جدید
-        بر اساس آخرین کد موجود + 1
-        کد شروع: 111111
+        از شمارنده CodeSequence (رزرو بلوکی) + رقم کنترلی Luhn
+        جزئیات در accounts/code_allocator.py
         """
-        from django.db import transaction
-        
-        with transaction.atomic():
-            # پیدا کردن آخرین کسب‌وکار با بالاترین unique_code
-            last_business = BusinessProfile.objects.filter(
-                unique_code__isnull=False
-            ).order_by('-unique_code').first()
-            
-            if last_business and last_business.unique_code:
-                new_code = last_business.unique_code + 1
-            else:
-                # اولین کسب‌وکار - شروع از 111111
-                new_code = 111111
-            
-            # اطمینان از یکتا بودن (در صورت تداخل احتمالی)
-            max_attempts = 100
-            attempt = 0
-            while BusinessProfile.objects.filter(unique_code=new_code).exists() and attempt < max_attempts:
-                new_code += 1
-                attempt += 1
-            
-            if attempt >= max_attempts:
-                raise ValueError('امکان تولید کد یکتا وجود ندارد. لطفاً با پشتیبانی تماس بگیرید.')
-            
-            return new_code
+        from .code_allocator import business_code_allocator
+
+        return business_code_allocator.next_code()
 
     def save(self, *args, **kwargs):
         """
@@ -225,9 +304,30 @@ class BusinessProfile(models.Model):
         # فقط برای کسب‌وکارهای جدید که unique_code ندارند
         if not self.pk and not self.unique_code:
             self.unique_code = self.generate_unique_code()
-        
+
+        previous_geohash = self.geohash
+        self.geohash = self.compute_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {
+            'business_location_latitude', 'business_location_longitude'
+        } & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+
         super().save(*args, **kwargs)
 
+        if previous_geohash != self.geohash:
+            # کاشی‌های خوشه نقشه در محل قبلی و جدید (packages/map_clusters.py)
+            from packages.map_clusters import invalidate_point
+            invalidate_point(previous_geohash)
+            invalidate_point(self.geohash)
+
+    def compute_geohash(self):
+        from .geo import encode_geohash
+
+        if self.business_location_latitude is None or self.business_location_longitude is None:
+            return ''
+        return encode_geohash(self.business_location_latitude, self.business_location_longitude)
+
 
 
     def get_featured_image(self):
@@ -238,23 +338,21 @@ class BusinessProfile(models.Model):
         return self.gallery_images.first()
     
     def get_weekly_schedule(self):
-        """Get complete weekly schedule"""
-        schedule = {}
-        for day_num, day_name in BusinessWorkingHours.WEEKDAY_CHOICES:
-            hours = self.get_working_hours_for_day(day_num)
-            if hours.exists():
-                schedule[day_name] = [
-                    f"{h.start_time.strftime('%H:%M')} - {h.end_time.strftime('%H:%M')}" 
-                    for h in hours
-                ]
-            else:
-                schedule[day_name] = ['تعطیل']
-        return schedule
+        """Get complete weekly schedule (from the compiled weekly_hours, no queries)"""
+        from .schedule import render_weekly_schedule
+
+        return render_weekly_schedule(self.weekly_hours)
 
     def get_working_hours_for_day(self, weekday):
         """Get working hours for a specific weekday (0=Saturday, 6=Friday)"""
         return self.working_hours.filter(weekday=weekday, is_closed=False).order_by('start_time')
 
+    def is_open_at(self, moment=None):
+        """باز بودن در یک لحظه (پیش‌فرض: الان) به وقت محلی کسب‌وکار"""
+        from .schedule import is_open
+
+        return is_open(self.weekly_hours, moment)
+
     def is_profile_complete(self):
         """Check if required profile fields are completed"""
         return bool(
@@ -357,6 +455,7 @@ class BusinessGallery(BaseModel):
         upload_to='business_gallery_images/',
         verbose_name='تصویر'
     )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(
         max_length=255, 
         blank=True, 
@@ -396,12 +495,6 @@ class BusinessGallery(BaseModel):
         self.clean()
         super().save(*args, **kwargs)
 
-    def delete(self, *args, **kwargs):
-        """Delete image file when model instance is deleted"""
-        if self.image:
-            if os.path.isfile(self.image.path):
-                os.remove(self.image.path)
-        super().delete(*args, **kwargs)
 
 
 
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+پردازش متن فارسی مشترک پروژه
+
+- normalize: حذف نیم‌فاصله (ZWNJ/ZWJ)، ی/ک عربی → فارسی، strip و lower
+  (یک جدول نگاشت CHAR_MAP به جای دو نسخه جدا با قواعد متفاوت)
+- normalize_compact: همان به اضافه حذف فاصله‌ها (کلید index نام باشگاه/دسته)
+- tokenize: کلمات متن نرمال شده
+- skeleton: اسکلت صامت لاتین کلمه برای تطبیق تقریبی تایپ فینگلیش
+- KeywordAutomaton: تطبیق چند کلمه کلیدی در یک پیمایش متن (Aho-Corasick)
+- scan: همه جدول‌های کلمات کلیدی (باشگاه، نوع کسب‌وکار، کلید باشگاه) در یک
+  automaton که یک بار ساخته می‌شود؛ نتیجه هر متن cache می‌شود تا
+  club_for_category_chain و business_type_for_names روی یک زنجیره نام فقط
+  یک پیمایش داشته باشند.
+
+command benchmark_text این توابع را با پیاده‌سازی قبلی مقایسه می‌کند.
+"""
+import re
+from collections import deque
+from functools import lru_cache
+
+# (قدیمی، جدید)؛ تنها جدول نگاشت حروف پروژه
+CHAR_MAP = (
+    ('\u200c', ''),
+    ('\u200d', ''),
+    ('ي', 'ی'),
+    ('ك', 'ک'),
+)
+# برای متن‌های کوتاه str.replace های پشت سر هم در CPython حدود ۴ برابر سریع‌تر از
+# str.translate با همین جدول است (command benchmark_text)؛ جدول translate فقط برای مقایسه
+TRANSLATE_TABLE = str.maketrans(dict(CHAR_MAP))
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _map_chars(text):
+    for old, new in CHAR_MAP:
+        text = text.replace(old, new)
+    return text
+
+
+def normalize(text):
+    if not text:
+        return ''
+    return _map_chars(text).strip().lower()
+
+
+def normalize_compact(text):
+    """نرمال‌سازی نام برای index (بدون نیم‌فاصله و فاصله)"""
+    if not text:
+        return ''
+    return _map_chars(text).replace(' ', '').strip().lower()
+
+
+def tokenize(text):
+    return _WORD_RE.findall(normalize(text))
+
+
+# «اسکلت» لاتین کلمه برای تطبیق تایپ فینگلیش: فقط صامت‌ها، چون فارسی
+# مصوت‌های کوتاه را نمی‌نویسد (تهران / tehran → thrn، کافه / cafe → kf)
+_LATIN = {
+    'ب': 'b', 'پ': 'p', 'ت': 't', 'ث': 's', 'ج': 'j', 'چ': 'ch', 'ح': 'h', 'خ': 'kh',
+    'د': 'd', 'ذ': 'z', 'ر': 'r', 'ز': 'z', 'ژ': 'zh', 'س': 's', 'ش': 'sh', 'ص': 's',
+    'ض': 'z', 'ط': 't', 'ظ': 'z', 'غ': 'gh', 'ف': 'f', 'ق': 'gh', 'ک': 'k', 'گ': 'g',
+    'ل': 'l', 'م': 'm', 'ن': 'n', 'ه': 'h', 'ة': 'h',
+}
+# صامت‌هایی که فقط در ابتدای کلمه صامت‌اند (در میانه معمولاً مصوت بلند)
+_LATIN_INITIAL = {'و': 'v', 'ی': 'y'}
+_LATIN_FOLD = (('ph', 'f'), ('ch', '\x00'), ('c', 'k'), ('\x00', 'ch'), ('q', 'gh'),
+               ('w', 'v'), ('x', 'ks'))
+_VOWELS = frozenset('aeiouy')
+
+
+def latin_skeleton(word):
+    """اسکلت صامت کلمه لاتین (فینگلیش)"""
+    word = word.lower()
+    for old, new in _LATIN_FOLD:
+        word = word.replace(old, new)
+    if not word:
+        return ''
+    first = word[0] if word[0] in 'vy' else ''
+    body = word[1:] if first else word
+    return first + ''.join(char for char in body if char not in _VOWELS)
+
+
+def persian_skeleton(word):
+    """اسکلت صامت کلمه فارسی نرمال شده؛ ه پایانی مصوت حساب می‌شود"""
+    if not word:
+        return ''
+    if word[-1] in 'هة' and len(word) > 1:
+        word = word[:-1]
+    first = _LATIN_INITIAL.get(word[0], '')
+    body = word[1:] if first else word
+    return first + ''.join(_LATIN.get(char, char if char.isascii() else '') for char in body)
+
+
+def skeleton(word):
+    return latin_skeleton(word) if word.isascii() else persian_skeleton(word)
+
+
+class KeywordAutomaton:
+    """
+    automaton چند الگویی (Aho-Corasick) روی کلمات کلیدی نرمال شده
+    entries: [(keyword, payload), ...]؛ هر کلمه می‌تواند چند payload داشته باشد
+
+    انتقال‌ها با پیوندهای fail از قبل کامل می‌شوند (DFA)، پس پیمایش متن برای
+    هر کاراکتر فقط یک lookup دیکشنری است.
+    """
+
+    def __init__(self, entries):
+        goto = [{}]
+        outputs = [[]]
+        for keyword, payload in entries:
+            keyword = normalize(keyword)
+            if not keyword:
+                continue
+            node = 0
+            for char in keyword:
+                nxt = goto[node].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][char] = nxt
+                    goto.append({})
+                    outputs.append([])
+                node = nxt
+            outputs[node].append((keyword, payload))
+
+        # BFS: پیوند fail هر گره، خروجی پسوندها و جدول انتقال کامل
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        out = [tuple(items) for items in outputs]
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            delta[node] = {**delta[fail[node]], **goto[node]}
+            if out[fail[node]]:
+                out[node] = out[node] + out[fail[node]]
+            for char, child in goto[node].items():
+                fail[child] = delta[fail[node]].get(char, 0)
+                queue.append(child)
+        self._delta = delta
+        self._out = out
+
+    def iter_matches(self, text):
+        """(پایان، keyword، payload) برای هر وقوع در متن نرمال شده"""
+        delta = self._delta
+        out = self._out
+        node = 0
+        for index, char in enumerate(text):
+            node = delta[node].get(char, 0)
+            if out[node]:
+                for keyword, payload in out[node]:
+                    yield index, keyword, payload
+
+    def payloads(self, text):
+        """مجموعه payload های کلمات موجود در متن (متن اینجا نرمال می‌شود)"""
+        delta = self._delta
+        out = self._out
+        found = set()
+        node = 0
+        for char in normalize(text):
+            node = delta[node].get(char, 0)
+            if out[node]:
+                found.update(payload for _, payload in out[node])
+        return found
+
+
+def _keyword_entries():
+    from packages.club_utils import CATEGORY_CLUB_KEYWORDS, CLUB_MATCH_KEYWORDS
+    from .amenity_utils import BUSINESS_TYPE_KEYWORDS
+
+    for club_name, keywords in CATEGORY_CLUB_KEYWORDS.items():
+        for keyword in keywords:
+            yield keyword, ('club', club_name)
+    for business_type, keywords in BUSINESS_TYPE_KEYWORDS.items():
+        for keyword in keywords:
+            yield keyword, ('business_type', business_type)
+    for keyword in CLUB_MATCH_KEYWORDS:
+        yield keyword, ('club_key', normalize(keyword))
+
+
+@lru_cache(maxsize=1)
+def keyword_automaton():
+    return KeywordAutomaton(_keyword_entries())
+
+
+@lru_cache(maxsize=4096)
+def scan(text):
+    """
+    {جدول: frozenset(مقادیر)} برای همه جدول‌های کلمات کلیدی در یک پیمایش
+    جدول‌ها: club (نام باشگاه)، business_type، club_key (کلمات get_club_match_key)
+    """
+    found = {}
+    for table, value in keyword_automaton().payloads(text):
+        found.setdefault(table, set()).add(value)
+    return {table: frozenset(values) for table, values in found.items()}
+
+
+def first_in_order(matches, ordered):
+    """اولین مقدار به ترتیب جدول (همان اولویت حلقه‌های قبلی)"""
+    for value in ordered:
+        if value in matches:
+            return value
+    return None
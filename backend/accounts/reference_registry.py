@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+رجیستری داخل process برای داده‌های مرجع (باشگاه‌ها، دسته‌بندی‌ها، امکانات،
+دسته‌بندی‌های VIP)
+
+جستجوهایی مثل find_club_by_name یا کاتالوگ امکانات قبلاً در هر فراخوانی کل
+جدول را می‌خواندند و نام‌ها را نرمال می‌کردند. این رجیستری همه را یک بار
+(lazy) بارگذاری و بر اساس id و نام نرمال شده index می‌کند تا این جستجوها
+فقط lookup دیکشنری باشند.
+
+ابطال:
+- در همین process: سیگنال‌های post_save/post_delete همان لحظه invalidate() را
+  صدا می‌زنند (accounts/signals.py و packages/signals.py)
+- بین workerها: invalidate() بعد از commit نسخه Namespace('reference') را در
+  cache مشترک (core/cache_tier.py) زیاد می‌کند و همین نسخه مهر رجیستری است؛
+  حداکثر هر REFERENCE_REGISTRY_CHECK_SECONDS ثانیه یک cache.get، بدون کوئری
+  روی جدول‌های دیتابیس. bump بعد از commit است تا workerی که مهر تازه را
+  می‌بیند داده تازه را هم بخواند؛ اگر کلید نسخه از cache پاک شود مهر عوض
+  می‌شود و نتیجه فقط یک بارگذاری اضافه است.
+
+اشیاء داخل رجیستری بین درخواست‌ها مشترک‌اند و نباید تغییر داده شوند؛
+برای ویرایش، نمونه تازه از دیتابیس بخوانید.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache_tier import Namespace
+
+from .persian_text import normalize_compact
+
+# کلیدهای ReferenceSnapshot که تغییرشان رجیستری را باطل می‌کند
+STAMP_KEYS = ('clubs', 'service_categories', 'amenities', 'vip_categories')
+
+stamp = Namespace('reference')
+
+
+def _first_by(items, key_func):
+    index = {}
+    for item in items:
+        index.setdefault(key_func(item), item)
+    return index
+
+
+def _group_by(items, key_func):
+    index = {}
+    for item in items:
+        index.setdefault(key_func(item), []).append(item)
+    return index
+
+
+class ReferenceData:
+    """یک نسخه بارگذاری شده از داده‌های مرجع و indexهای آن"""
+
+    def __init__(self, clubs, categories, amenities, vip_categories):
+        self.clubs = clubs
+        self.clubs_by_id = {club.pk: club for club in clubs}
+        self.clubs_by_name = _first_by(clubs, lambda c: c.name)
+        self.clubs_by_normalized = _first_by(clubs, lambda c: normalize_compact(c.name))
+
+        self.categories = categories
+        self.categories_by_id = {category.pk: category for category in categories}
+        self.categories_by_normalized = _first_by(categories, lambda c: normalize_compact(c.name))
+
+        # فقط امکانات فعال، به ترتیب (business_type, order, name)
+        self.amenities = amenities
+        self.amenities_by_id = {amenity.pk: amenity for amenity in amenities}
+        self.amenities_by_type = _group_by(amenities, lambda a: a.business_type)
+
+        # به ترتیب (vip_type, id)
+        self.vip_categories = vip_categories
+        self.vip_by_id = {item.pk: item for item in vip_categories}
+
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def derived(self, name, builder):
+        """
+        index ساخته شده از همین نسخه داده (مثلاً باشگاه‌ها بر اساس کلید تطبیق)
+        فقط یک بار برای هر نسخه ساخته می‌شود.
+        """
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = builder(self)
+            return self._derived[name]
+
+
+class ReferenceRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._stamp = None
+        self._checked_at = 0.0
+
+    def _check_interval(self):
+        return getattr(settings, 'REFERENCE_REGISTRY_CHECK_SECONDS', 2.0)
+
+    def _current_stamp(self):
+        return stamp.version()
+
+    def _load(self):
+        from packages.models import VipExperienceCategory
+        from .models import Amenity, Club, ServiceCategory
+
+        return ReferenceData(
+            clubs=list(Club.objects.order_by('name', 'pk')),
+            categories=list(ServiceCategory.objects.order_by('name', 'pk')),
+            amenities=list(
+                Amenity.objects.filter(is_active=True).order_by('business_type', 'order', 'name')
+            ),
+            vip_categories=list(VipExperienceCategory.objects.order_by('vip_type', 'id')),
+        )
+
+    def get(self):
+        data = self._data
+        if data is not None and time.monotonic() - self._checked_at < self._check_interval():
+            return data
+        with self._lock:
+            # مهر قبل از بارگذاری خوانده می‌شود تا تغییر همزمان در بررسی بعدی دیده شود
+            stamp = self._current_stamp()
+            if self._data is None or stamp != self._stamp:
+                self._data = self._load()
+                self._stamp = stamp
+            self._checked_at = time.monotonic()
+            return self._data
+
+    def invalidate(self):
+        """ابطال نسخه همین process و (بعد از commit) مهر نسخه مشترک workerها"""
+        with self._lock:
+            self._data = None
+        transaction.on_commit(stamp.bump)
+
+
+registry = ReferenceRegistry()
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+snapshotهای نسخه‌دار داده‌های مرجع (باشگاه‌ها، دسته‌بندی‌ها، استان‌ها، شهرها،
+امکانات، دسته‌بندی‌های VIP)
+
+این داده‌ها تقریباً هیچ‌وقت تغییر نمی‌کنند ولی اپ در هر بار اجرا همه را
+می‌گیرد. هر مجموعه یک بار serialize می‌شود و JSON فشرده (gzip) همراه با
+sha256 محتوا در ReferenceSnapshot ذخیره می‌شود. پاسخ با ETag / Last-Modified
+برگردانده می‌شود و درخواست شرطی تکراری فقط 304 می‌گیرد.
+
+- ابطال: سیگنال‌های post_save/post_delete مدل‌های مرتبط فقط version ردیف را
+  زیاد می‌کنند (accounts/signals.py و packages/signals.py)؛ ساخت مجدد در اولین
+  درخواست بعدی انجام می‌شود.
+- هر درخواست فقط یک کوئری سبک (بدون payload) روی ReferenceSnapshot می‌زند؛
+  محتوای فشرده بر اساس etag در cache (core/cache_tier.py) نگه داشته می‌شود؛
+  چون کلید شامل etag است، workerهای مختلف هرگز نسخه کهنه برنمی‌گردانند.
+"""
+import gzip
+import hashlib
+import json
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+Dataset = namedtuple('Dataset', ['builder', 'models', 'public'])
+Snapshot = namedtuple('Snapshot', ['key', 'etag', 'last_modified', 'payload'])
+
+_GZIP_RE = re.compile(r'\bgzip\b')
+
+
+def _cache_key(key, etag):
+    return f"reference_snapshot_{key}_{etag}"
+
+
+# ─── سازنده‌های داده ───────────────────────────────────────────────
+
+def _build_clubs():
+    from .models import Club
+    from .serializers import ClubSerializer
+
+    return ClubSerializer(Club.objects.all(), many=True).data
+
+
+def _build_service_categories():
+    from .models import ServiceCategory
+    from .serializers import ServiceCategorySerializer
+
+    queryset = ServiceCategory.objects.select_related('club').all()
+    return ServiceCategorySerializer(queryset, many=True).data
+
+
+def _build_provinces():
+    from .models import Province
+    from .serializers import ProvinceSerializer
+
+    return ProvinceSerializer(Province.objects.order_by('name'), many=True).data
+
+
+def _build_cities():
+    """شهرها گروه‌بندی شده بر اساس استان (خروجی get_all_cities_view)"""
+    from django.db.models import Prefetch
+    from .models import City, Province
+    from .serializers import CitySerializer
+
+    provinces = Province.objects.order_by('name').prefetch_related(
+        Prefetch('cities', queryset=City.objects.select_related('province').order_by('name'))
+    )
+    return [
+        {
+            'id': province.id,
+            'name': province.name,
+            'cities': CitySerializer(province.cities.all(), many=True).data,
+        }
+        for province in provinces
+    ]
+
+
+def _build_amenities():
+    from .models import Amenity
+    from .serializers import AmenitySerializer
+
+    return AmenitySerializer(Amenity.objects.filter(is_active=True), many=True).data
+
+
+def _build_vip_categories():
+    from packages.models import VipExperienceCategory
+    from packages.serializers import VipExperienceCategorySerializer
+
+    queryset = VipExperienceCategory.objects.select_related(
+        'category', 'category__club', 'club'
+    ).order_by('vip_type', 'id')
+    return VipExperienceCategorySerializer(queryset, many=True).data
+
+
+# کلید → (سازنده، مدل‌هایی که تغییرشان snapshot را باطل می‌کند، عمومی بودن)
+DATASETS = {
+    'clubs': Dataset(_build_clubs, ('accounts.Club',), True),
+    'service_categories': Dataset(
+        _build_service_categories, ('accounts.ServiceCategory', 'accounts.Club'), True
+    ),
+    'provinces': Dataset(_build_provinces, ('accounts.Province',), True),
+    'cities': Dataset(_build_cities, ('accounts.Province', 'accounts.City'), True),
+    'amenities': Dataset(_build_amenities, ('accounts.Amenity',), True),
+    'vip_categories': Dataset(
+        _build_vip_categories,
+        ('packages.VipExperienceCategory', 'accounts.ServiceCategory', 'accounts.Club'),
+        False,
+    ),
+}
+
+
+def keys_for_model(model):
+    label = model._meta.label
+    return [key for key, dataset in DATASETS.items() if label in dataset.models]
+
+
+# ─── ساخت و خواندن ────────────────────────────────────────────────
+
+def _encode(data):
+    from rest_framework.utils.encoders import JSONEncoder
+
+    raw = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    # mtime=0 تا خروجی gzip برای محتوای یکسان همیشه یکسان باشد
+    return raw, gzip.compress(raw, mtime=0)
+
+
+def rebuild(key, version=None):
+    """
+    ساخت snapshot و ذخیره آن (فقط اگر در این فاصله دوباره باطل نشده باشد)
+    اگر محتوا با نسخه قبلی یکی باشد Last-Modified و ETag تغییر نمی‌کنند.
+    """
+    from .models import ReferenceSnapshot
+
+    if version is None:
+        version = (
+            ReferenceSnapshot.objects.filter(key=key).values_list('version', flat=True).first() or 0
+        )
+
+    raw, payload = _encode(DATASETS[key].builder())
+    etag = hashlib.sha256(raw).hexdigest()
+    now = timezone.now()
+
+    current = ReferenceSnapshot.objects.filter(key=key).values('etag', 'modified_at').first()
+    if current is None:
+        try:
+            ReferenceSnapshot.objects.create(
+                key=key, etag=etag, payload=payload, size=len(raw),
+                version=version, built_version=version,
+            )
+        except IntegrityError:
+            # درخواست یا سیگنال دیگری ردیف را ساخت؛ همین نتیجه برگردانده می‌شود
+            pass
+        last_modified = now
+    elif current['etag'] == etag:
+        ReferenceSnapshot.objects.filter(key=key, version=version).update(built_version=version)
+        last_modified = current['modified_at']
+    else:
+        ReferenceSnapshot.objects.filter(key=key, version=version).update(
+            etag=etag, payload=payload, size=len(raw),
+            built_version=version, modified_at=now,
+        )
+        last_modified = now
+
+    cache.set(_cache_key(key, etag), payload, getattr(settings, 'REFERENCE_SNAPSHOT_CACHE_TTL', 86400))
+    return Snapshot(key, etag, last_modified, payload)
+
+
+def get_snapshot(key):
+    """snapshot فعلی (در صورت کهنه بودن یا نبودن، ساخته می‌شود)"""
+    from .models import ReferenceSnapshot
+
+    row = (
+        ReferenceSnapshot.objects.filter(key=key)
+        .values('etag', 'modified_at', 'version', 'built_version')
+        .first()
+    )
+    if row is None:
+        return rebuild(key, version=0)
+    if row['version'] != row['built_version']:
+        return rebuild(key, version=row['version'])
+
+    etag = row['etag']
+    payload = cache.get(_cache_key(key, etag))
+    if payload is None:
+        payload = (
+            ReferenceSnapshot.objects.filter(key=key, etag=etag)
+            .values_list('payload', flat=True)
+            .first()
+        )
+        if payload is None:
+            # بین دو کوئری دوباره ساخته شد
+            return get_snapshot(key)
+        payload = bytes(payload)
+        cache.set(_cache_key(key, etag), payload, getattr(settings, 'REFERENCE_SNAPSHOT_CACHE_TTL', 86400))
+    return Snapshot(key, etag, row['modified_at'], payload)
+
+
+def get_data(key):
+    """داده snapshot به صورت شیء Python (برای استفاده داخلی)"""
+    return json.loads(gzip.decompress(get_snapshot(key).payload))
+
+
+def invalidate(keys):
+    """
+    باطل کردن snapshotها با افزایش version
+    ردیف نبود → ردیف خالی ساخته می‌شود تا ساختی که همزمان از داده قدیمی
+    شروع شده نتواند خودش را به‌روز ثبت کند.
+    """
+    from .models import ReferenceSnapshot
+
+    keys = list(keys)
+    if not keys:
+        return
+    ReferenceSnapshot.objects.bulk_create(
+        [ReferenceSnapshot(key=key, etag='', payload=b'') for key in keys],
+        ignore_conflicts=True,
+    )
+    ReferenceSnapshot.objects.filter(key__in=keys).update(version=F('version') + 1)
+
+
+def invalidate_for_model(model):
+    invalidate(keys_for_model(model))
+
+
+# ─── پاسخ HTTP ──────────────────────────────────────────────────
+
+def snapshot_response(request, key):
+    """
+    پاسخ JSON از snapshot با ETag / Last-Modified و 304 برای درخواست شرطی
+    اگر کلاینت gzip بپذیرد همان بایت‌های ذخیره شده فرستاده می‌شوند.
+    """
+    snapshot = get_snapshot(key)
+    # ETag ضعیف: نسخه gzip و بدون gzip از نظر معنا یکسان‌اند
+    etag = f'W/"{snapshot.etag}"'
+    last_modified = int(snapshot.last_modified.timestamp())
+
+    response = HttpResponse(content_type='application/json')
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    response.headers['Vary'] = 'Accept-Encoding'
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=response
+    )
+    if conditional is not response:
+        return conditional
+
+    if _GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        response.content = snapshot.payload
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response.content = gzip.decompress(snapshot.payload)
+    return response
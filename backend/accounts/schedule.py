@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+برنامه هفتگی کامپایل شده کسب‌وکار
+
+BusinessWorkingHours (شامل استراحت‌ها) در دو فیلد BusinessProfile ذخیره می‌شود:
+- weekly_hours: بازه‌های هر روز برای نمایش ({"0": [["09:00", "17:00", false, false], ...]}
+  به ترتیب ساعت شروع؛ [شروع، پایان، تعطیل، استراحت]) و بازه‌های باز بودن به
+  دقیقه هفته ("open": [[540, 1020], ...]؛ شنبه ۰۰:۰۰ = ۰، استراحت‌ها کم شده)
+- open_slots: bitmap هفتگی با خانه‌های ۵ دقیقه‌ای به صورت رشته '0'/'1'
+  (۲۰۱۶ کاراکتر) تا فیلتر «الان باز است» با یک SUBSTR در خود SQL اجرا شود.
+  خانه‌ای '1' است که کل ۵ دقیقه‌اش باز باشد.
+
+ساعات کاری به وقت محلی کسب‌وکار (BUSINESS_TIME_ZONE، پیش‌فرض Asia/Tehran)
+ثبت می‌شوند؛ TIME_ZONE پروژه UTC است.
+
+با هر تغییر ساعات کاری (accounts/signals.py) برنامه بعد از commit یک بار
+دوباره کامپایل می‌شود؛
+command rebuild_schedules همین کار را برای همه کسب‌وکارها انجام می‌دهد.
+"""
+import threading
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+SLOT_MINUTES = 5
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+SLOT_COUNT = MINUTES_PER_WEEK // SLOT_MINUTES
+
+CLOSED_LABEL = 'تعطیل'
+
+# کسب‌وکارهای منتظر کامپایل در transaction جاری این thread
+_local = threading.local()
+
+
+def business_timezone():
+    return ZoneInfo(getattr(settings, 'BUSINESS_TIME_ZONE', 'Asia/Tehran'))
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _subtract(intervals, removed):
+    result = []
+    for start, end in intervals:
+        pieces = [[start, end]]
+        for cut_start, cut_end in removed:
+            next_pieces = []
+            for piece_start, piece_end in pieces:
+                if cut_end <= piece_start or cut_start >= piece_end:
+                    next_pieces.append([piece_start, piece_end])
+                    continue
+                if piece_start < cut_start:
+                    next_pieces.append([piece_start, cut_start])
+                if cut_end < piece_end:
+                    next_pieces.append([cut_end, piece_end])
+            pieces = next_pieces
+        result.extend(pieces)
+    return result
+
+
+def compile_schedule(hours):
+    """
+    hours: ردیف‌های BusinessWorkingHours (یا هر شیء با همان فیلدها)
+    خروجی: (weekly_hours, open_slots)
+    """
+    days = {}
+    working = []
+    breaks = []
+    for entry in sorted(hours, key=lambda h: (h.weekday, h.start_time)):
+        days.setdefault(str(entry.weekday), []).append([
+            entry.start_time.strftime('%H:%M'),
+            entry.end_time.strftime('%H:%M'),
+            entry.is_closed,
+            entry.is_break,
+        ])
+        if entry.is_closed:
+            continue
+        offset = entry.weekday * MINUTES_PER_DAY
+        interval = (offset + _minutes(entry.start_time), offset + _minutes(entry.end_time))
+        if interval[0] >= interval[1]:
+            continue
+        (breaks if entry.is_break else working).append(interval)
+
+    open_intervals = _merge(_subtract(_merge(working), _merge(breaks)))
+
+    slots = ['0'] * SLOT_COUNT
+    for start, end in open_intervals:
+        first = -(-start // SLOT_MINUTES)  # اولین خانه‌ای که کامل داخل بازه است
+        for slot in range(first, end // SLOT_MINUTES):
+            slots[slot] = '1'
+    return {'days': days, 'open': open_intervals}, ''.join(slots)
+
+
+def schedule_rebuild(business_id):
+    """
+    کامپایل مجدد بعد از commit؛ تغییرات چند ردیف ساعات کاری یک transaction
+    برای هر کسب‌وکار یک بار کامپایل می‌شوند (مثل search_index.schedule_reindex)
+    """
+    if not business_id:
+        return
+    _pending().add(business_id)
+    transaction.on_commit(_flush)
+
+
+def _pending():
+    if not hasattr(_local, 'pending'):
+        _local.pending = set()
+    return _local.pending
+
+
+def _flush():
+    pending = _pending()
+    if not pending:
+        return
+    business_ids = set(pending)
+    pending.clear()
+    for business_id in business_ids:
+        rebuild_business_schedule(business_id)
+
+
+def rebuild_business_schedule(business_id):
+    """کامپایل مجدد برنامه یک کسب‌وکار (یک کوئری خواندن + یک UPDATE)"""
+    from .models import BusinessProfile, BusinessWorkingHours
+
+    weekly_hours, open_slots = compile_schedule(
+        BusinessWorkingHours.objects.filter(business_profile_id=business_id).only(
+            'weekday', 'start_time', 'end_time', 'is_closed', 'is_break'
+        )
+    )
+    BusinessProfile.objects.filter(pk=business_id).update(
+        weekly_hours=weekly_hours, open_slots=open_slots
+    )
+    return weekly_hours, open_slots
+
+
+def weekday_entries(weekly_hours, weekday):
+    """بازه‌های ثبت شده یک روز: [(شروع، پایان، تعطیل، استراحت), ...]"""
+    return [tuple(entry) for entry in (weekly_hours or {}).get('days', {}).get(str(weekday), [])]
+
+
+def render_weekly_schedule(weekly_hours):
+    """{نام روز: ["09:00 - 17:00", ...] یا ["تعطیل"]} بدون کوئری"""
+    from .models import BusinessWorkingHours
+
+    schedule = {}
+    for day_num, day_name in BusinessWorkingHours.WEEKDAY_CHOICES:
+        slots = [
+            f'{start} - {end}'
+            for start, end, is_closed, is_break in weekday_entries(weekly_hours, day_num)
+            if not is_closed
+        ]
+        schedule[day_name] = slots or [CLOSED_LABEL]
+    return schedule
+
+
+def week_minute(moment=None):
+    """دقیقه هفته (شنبه ۰۰:۰۰ = ۰) به وقت محلی کسب‌وکار"""
+    moment = moment or timezone.now()
+    if timezone.is_naive(moment):
+        moment = moment.replace(tzinfo=business_timezone())
+    local = moment.astimezone(business_timezone())
+    # datetime.weekday: دوشنبه=0 ... شنبه=5؛ اینجا شنبه=0
+    weekday = (local.weekday() + 2) % 7
+    return weekday * MINUTES_PER_DAY + local.hour * 60 + local.minute
+
+
+def is_open(weekly_hours, moment=None):
+    minute = week_minute(moment)
+    return any(start <= minute < end for start, end in (weekly_hours or {}).get('open', []))
+
+
+def open_slot_filter(queryset, moment=None, field='open_slots'):
+    """فیلتر SQL کسب‌وکارهای باز در یک لحظه روی bitmap (field مسیر open_slots است)"""
+    slot = week_minute(moment) // SLOT_MINUTES
+    return queryset.alias(open_slot=Substr(field, slot + 1, 1)).filter(open_slot='1')
+
+
+def parse_moment(value):
+    """
+    پارامتر open_at: datetime به فرمت ISO؛ بدون منطقه زمانی یعنی وقت محلی کسب‌وکار
+    خروجی None یعنی مقدار نامعتبر
+    """
+    from django.utils.dateparse import parse_datetime
+
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        return None
+    if moment is None:
+        return None
+    if timezone.is_naive(moment):
+        moment = moment.replace(tzinfo=business_timezone())
+    return moment
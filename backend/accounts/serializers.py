@@ -443,10 +443,11 @@ class FinancialManagerProfileSerializer(serializers.ModelSerializer):
 class BusinessGallerySerializer(serializers.ModelSerializer):
     """Serializer for business gallery images"""
     image_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
     
     class Meta:
         model = BusinessGallery
-        fields = ['id', 'image', 'image_url', 'title', 'description', 'is_featured', 'order', 'created_at']
+        fields = ['id', 'image', 'image_url', 'thumbnail_url', 'title', 'description', 'is_featured', 'order', 'created_at']
         read_only_fields = ['id', 'created_at']
     
     def get_image_url(self, obj):
@@ -457,6 +458,10 @@ class BusinessGallerySerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def get_thumbnail_url(self, obj):
+        from .image_pipeline import variant_url
+        return variant_url(obj.image, obj.image_variants, 'thumb', self.context.get('request'))
+
 
 class BusinessGalleryCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating business gallery images"""
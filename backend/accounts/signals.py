@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
 """
 سیگنال‌های امتیازدهی - ثبت‌نام و تکمیل پروفایل
+و زمان‌بندی ساخت نسخه‌های تصویر و شمارش ارجاع فایل‌های media
+و ابطال snapshotهای داده مرجع
+و کامپایل برنامه هفتگی کسب‌وکار
 """
 import logging
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from .models import CustomerProfile
+from .models import (
+    CustomerProfile, User, BusinessProfile, BusinessGallery, BusinessWorkingHours,
+    Club, ServiceCategory, Province, City, Amenity,
+)
+from . import image_pipeline, reference_registry, reference_snapshots, storage
 
 logger = logging.getLogger(__name__)
 
@@ -24,3 +32,100 @@ def handle_customer_profile_save(sender, instance, created, **kwargs):
             award_profile_complete(instance)
     except Exception as e:
         logger.error(f'[points signal] customer_id={instance.pk} error: {e}', exc_info=True)
+
+
+# ─── نسخه‌های تصویر ─────────────────────────────────────────────
+
+@receiver(post_save, sender=User)
+def schedule_user_image_variants(sender, instance, **kwargs):
+    image_pipeline.schedule(instance, 'image', 'image_variants')
+
+
+@receiver(post_save, sender=BusinessProfile)
+def schedule_logo_variants(sender, instance, **kwargs):
+    image_pipeline.schedule(instance, 'logo', 'logo_variants')
+
+
+@receiver(post_save, sender=BusinessGallery)
+def schedule_gallery_variants(sender, instance, **kwargs):
+    image_pipeline.schedule(instance, 'image', 'image_variants')
+
+
+# ─── ارجاع به فایل‌های media (accounts/storage.py) ─────────────────
+
+def _file_names(instance, fields):
+    # فیلد deferred (مثلاً با only()) خوانده نمی‌شود تا کوئری اضافه ایجاد نشود
+    deferred = instance.get_deferred_fields()
+    return {
+        name: None if name in deferred else (getattr(instance, name).name or '')
+        for name in fields
+    }
+
+
+def _remember_file_names(sender, instance, **kwargs):
+    instance._media_names = _file_names(instance, _TRACKED_FIELDS[sender])
+
+
+def _update_file_refs(sender, instance, **kwargs):
+    old = getattr(instance, '_media_names', {})
+    new = _file_names(instance, _TRACKED_FIELDS[sender])
+    for field_name, name in new.items():
+        previous = old.get(field_name, '')
+        if name is None or name == previous:
+            continue
+        storage.add_ref(name)
+        # مقدار قبلی نامعلوم (deferred) → اصلاح در شمارش مجدد gc_media_blobs
+        if previous:
+            storage.release_ref(previous)
+    instance._media_names = new
+
+
+def _release_file_refs(sender, instance, **kwargs):
+    for name in getattr(instance, '_media_names', {}).values():
+        if name:
+            storage.release_ref(name)
+
+
+_TRACKED_FIELDS = {}
+for _model, _fields in storage.tracked_file_fields():
+    _TRACKED_FIELDS[_model] = _fields
+    post_init.connect(_remember_file_names, sender=_model, dispatch_uid=f'media_init_{_model._meta.label}')
+    post_save.connect(_update_file_refs, sender=_model, dispatch_uid=f'media_save_{_model._meta.label}')
+    post_delete.connect(_release_file_refs, sender=_model, dispatch_uid=f'media_delete_{_model._meta.label}')
+
+
+# ─── داده مرجع: snapshotها و رجیستری داخل process ─────────────────
+
+def invalidate_reference_data(sender, **kwargs):
+    keys = reference_snapshots.keys_for_model(sender)
+    reference_snapshots.invalidate(keys)
+    # رجیستری همین process و (بعد از commit) مهر آن در cache مشترک برای بقیه workerها
+    if set(keys) & set(reference_registry.STAMP_KEYS):
+        reference_registry.registry.invalidate()
+
+
+for _model in (Club, ServiceCategory, Province, City, Amenity):
+    post_save.connect(invalidate_reference_data, sender=_model, dispatch_uid=f'reference_save_{_model._meta.label}')
+    post_delete.connect(invalidate_reference_data, sender=_model, dispatch_uid=f'reference_delete_{_model._meta.label}')
+
+
+def rebuild_category_tree(sender, **kwargs):
+    """path / باشگاه / نوع کسب‌وکار materialize شده دسته‌ها (accounts/category_tree.py)"""
+    from .category_tree import rebuild_category_tree as rebuild
+    rebuild()
+
+
+# بعد از invalidate_reference_data تا رجیستری با باشگاه‌های تازه خوانده شود
+for _model in (Club, ServiceCategory):
+    post_save.connect(rebuild_category_tree, sender=_model, dispatch_uid=f'category_tree_save_{_model._meta.label}')
+    post_delete.connect(rebuild_category_tree, sender=_model, dispatch_uid=f'category_tree_delete_{_model._meta.label}')
+
+
+# ─── برنامه هفتگی کامپایل شده (accounts/schedule.py) ─────────────────
+
+@receiver(post_save, sender=BusinessWorkingHours)
+@receiver(post_delete, sender=BusinessWorkingHours)
+def rebuild_business_schedule(sender, instance, **kwargs):
+    from .schedule import schedule_rebuild
+
+    schedule_rebuild(instance.business_profile_id)
@@ -1,28 +1,30 @@
 import random
 import requests
 from django.conf import settings
-from django.core.cache import cache
 import logging
 
+from core.cache_tier import Namespace
+
 logger = logging.getLogger(__name__)
 
+# OTPs live in the shared cache tier (core/cache_tier.py) so any worker can verify them
+otp_cache = Namespace('otp')
+
 def generate_otp():
     """Generate 6-digit OTP code"""
     return str(random.randint(100000, 999999))
 
 def store_otp(user_phone, otp, expire_time=300):
     """Store OTP in cache with expiration time (default 5 minutes)"""
-    cache_key = f"otp_{user_phone}"
-    cache.set(cache_key, otp, expire_time)
+    otp_cache.set(user_phone, value=otp, timeout=expire_time)
     logger.info(f"OTP stored for {user_phone}")
 
 def verify_otp(user_phone, otp):
-    """Verify OTP code for phone number"""
-    cache_key = f"otp_{user_phone}"
-    stored_otp = cache.get(cache_key)
+    """Verify OTP code for phone number (each code can be used once, even across workers)"""
+    stored_otp = otp_cache.get(user_phone)
     
-    if stored_otp and stored_otp == otp:
-        cache.delete(cache_key)
+    # delete only succeeds for one request, so a code verified concurrently is accepted once
+    if stored_otp and stored_otp == otp and otp_cache.delete(user_phone):
         logger.info(f"OTP verified successfully for {user_phone}")
         return True
     else:
@@ -31,6 +33,8 @@ def verify_otp(user_phone, otp):
 
 def send_sms(to, body_id, text):
     """Send SMS using Melipayamak BaseServiceNumber API"""
+    from core import metrics
+
     try:
         payload = {
             "username": settings.MELIPAYAMAK_USERNAME,
@@ -50,24 +54,31 @@ def send_sms(to, body_id, text):
         # Check if response is successful
         if response.status_code != 200:
             logger.error(f"SMS API returned status {response.status_code} for {to}")
+            metrics.SMS_FAILURES.inc(reason='http_status')
             return False, f"API returned status {response.status_code}"
         result = response.json()
         if result.get("RetStatus") != 1:
             logger.error(f"SMS failed for {to}: {result.get('StrRetStatus')}")
+            metrics.SMS_FAILURES.inc(reason='provider')
             return False, f"SMS failed: {result.get('StrRetStatus')}"
         logger.info(f"SMS sent successfully to {to}")
+        metrics.SMS_SENT.inc()
         return True, None
     except requests.exceptions.Timeout:
         logger.error(f"SMS timeout for {to}")
+        metrics.SMS_FAILURES.inc(reason='timeout')
         return False, "SMS service timeout"
     except requests.exceptions.ConnectionError:
         logger.error(f"SMS connection error for {to}")
+        metrics.SMS_FAILURES.inc(reason='connection')
         return False, "SMS service connection error"
     except requests.exceptions.RequestException as e:
         logger.error(f"SMS request error for {to}: {str(e)}")
+        metrics.SMS_FAILURES.inc(reason='request')
         return False, f"Request error: {str(e)}"
     except Exception as e:
         logger.error(f"SMS service error: {str(e)}")
+        metrics.SMS_FAILURES.inc(reason='error')
         return False, str(e)
 
 def send_activation_sms(phone_number):
@@ -102,18 +113,12 @@ class MelipayamakSMSService:
     
     def verify_otp(self, phone_number, otp_code):
         """Verify OTP code for phone number"""
-        cache_key = f"otp_{phone_number}"
-        stored_otp = cache.get(cache_key)
-        
-        if stored_otp and stored_otp == otp_code:
-            cache.delete(cache_key)
-            logger.info(f"OTP verified successfully for {phone_number}")
+        if verify_otp(phone_number, otp_code):
             return {
                 'success': True,
                 'message': 'کد تایید صحیح است'
             }
         else:
-            logger.warning(f"Invalid OTP attempt for {phone_number}")
             return {
                 'success': False,
                 'message': 'کد تایید نامعتبر یا منقضی شده است'
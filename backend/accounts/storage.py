@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+ذخیره‌سازی محتوا-محور (content-addressed) فایل‌های media
+
+نام هر فایل از sha256 محتوای آن ساخته می‌شود (blobs/ab/cd/<hash>.jpg)، پس:
+- فایل تکراری (مثلاً عکس پروفایل که لوگوی کسب‌وکار هم هست) یک بار ذخیره می‌شود
+- URL فایل هرگز تغییر محتوا نمی‌دهد و می‌توان آن را برای همیشه cache کرد
+
+تعداد ارجاع‌ها در MediaBlob با سیگنال‌های post_save/post_delete مدل‌ها نگه داشته
+می‌شود و blobهای بدون ارجاع را command gc_media_blobs بعد از یک مهلت حذف می‌کند.
+هیچ کدی نباید blob را مستقیم پاک کند.
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+
+BLOBS_DIR = 'blobs'
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(f'{BLOBS_DIR}/')
+
+
+def blob_name_for(digest, original_name):
+    ext = os.path.splitext(original_name or '')[1].lower()
+    return f'{BLOBS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage با نام‌گذاری بر اساس hash محتوا"""
+
+    def get_available_name(self, name, max_length=None):
+        # نام نهایی در _save از محتوا ساخته می‌شود و هرگز با محتوای دیگری تداخل ندارد
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            digest.update(chunk)
+            size += len(chunk)
+        name = blob_name_for(digest.hexdigest(), name)
+
+        if not self.exists(name):
+            # نوشتن در فایل موقت و جابجایی اتمیک؛ دو آپلود همزمان یک محتوا
+            # فقط همان فایل را با محتوای یکسان جایگزین می‌کنند
+            part_name = f'{name}.{uuid.uuid4().hex}.part'
+            part_name = super()._save(part_name, content)
+            os.replace(self.path(part_name), self.path(name))
+
+        register_blob(name, size)
+        return name
+
+
+def register_blob(name, size):
+    """ثبت blob تازه (بدون ارجاع تا وقتی مدلی به آن اشاره کند)"""
+    from .models import MediaBlob
+
+    MediaBlob.objects.get_or_create(
+        name=name,
+        defaults={'size': size, 'unreferenced_since': timezone.now()},
+    )
+
+
+def add_ref(name):
+    from .models import MediaBlob
+
+    if not is_blob_name(name):
+        return
+    updated = MediaBlob.objects.filter(name=name).update(
+        ref_count=F('ref_count') + 1, unreferenced_since=None
+    )
+    if not updated:
+        MediaBlob.objects.get_or_create(name=name, defaults={'ref_count': 1})
+
+
+def release_ref(name):
+    from .models import MediaBlob
+
+    if not is_blob_name(name):
+        return
+    MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    MediaBlob.objects.filter(name=name, ref_count=0, unreferenced_since__isnull=True).update(
+        unreferenced_since=timezone.now()
+    )
+
+
+def tracked_file_fields():
+    """
+    [(model, [field_name, ...])] برای همه FileFieldهایی که روی این storage هستند
+    """
+    from django.apps import apps
+    from django.db.models import FileField
+
+    result = []
+    for model in apps.get_models():
+        names = [
+            f.name for f in model._meta.get_fields()
+            if isinstance(f, FileField) and isinstance(f.storage, ContentAddressedStorage)
+        ]
+        if names:
+            result.append((model, names))
+    return result
+
+
+def referenced_names():
+    """نام همه فایل‌هایی که در حال حاضر در دیتابیس به آن‌ها ارجاع شده (mark)"""
+    names = {}
+    for model, fields in tracked_file_fields():
+        for field_name in fields:
+            values = (
+                model._base_manager.exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True)
+            )
+            for value in values.iterator():
+                names[value] = names.get(value, 0) + 1
+    return names
@@ -1,3 +1,176 @@
-from django.test import TestCase
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from .code_allocator import BUSINESS_SEQUENCE, CodeAllocator, is_valid_code
+from .models import BusinessProfile, User
+
+
+class _PerThreadAllocator:
+    """هر thread مثل یک worker جدا: بلوک رزرو شده خودش را دارد"""
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self._local = threading.local()
+
+    def next_code(self):
+        allocator = getattr(self._local, 'allocator', None)
+        if allocator is None:
+            allocator = self._local.allocator = CodeAllocator(BUSINESS_SEQUENCE, self.block_size)
+        return allocator.next_code()
+
+
+class ConcurrentBusinessRegistrationTests(TransactionTestCase):
+    """ثبت‌نام همزمان کسب‌وکارها از endpoint واقعی (stress_unique_codes برای چند process)"""
+
+    workers = 4
+    per_worker = 10
+
+    def _register(self, worker, barrier, statuses):
+        client = APIClient()
+        barrier.wait()
+        try:
+            for i in range(self.per_worker):
+                response = client.post('/api/accounts/auth/register/business/', {
+                    'username': f'biz_{worker}_{i}',
+                    'phone_number': f'0912{worker:03d}{i:04d}',
+                }, format='json')
+                statuses.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_parallel_registrations_get_distinct_valid_codes(self):
+        barrier = threading.Barrier(self.workers)
+        statuses = []
+        with mock.patch('accounts.code_allocator.business_code_allocator', _PerThreadAllocator(block_size=3)):
+            threads = [
+                threading.Thread(target=self._register, args=(worker, barrier, statuses))
+                for worker in range(self.workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(statuses, [201] * (self.workers * self.per_worker))
+        codes = list(BusinessProfile.objects.values_list('unique_code', flat=True))
+        self.assertEqual(len(codes), self.workers * self.per_worker)
+        self.assertEqual([code for code, n in Counter(codes).items() if n > 1], [])
+        self.assertTrue(all(is_valid_code(code) for code in codes))
+
+
+class _FinishedExecutor:
+    """executor ای که future را پیش از add_done_callback تمام‌شده برمی‌گرداند"""
+
+    def submit(self, fn, source_path, source_name, media_root):
+        future = Future()
+        future.set_result({'source': source_name})
+        return future
+
+
+class ImagePipelineCallbackTests(TestCase):
+    """callback روی future تمام‌شده در thread درخواست اجرا می‌شود"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='heic', phone_number='09120000002', role='customer')
+        self.user.image.name = 'profile_images/heic.jpg'
+
+    def test_process_now_in_pool_keeps_request_connection_and_saves_once(self):
+        from . import image_pipeline
+
+        with mock.patch.object(image_pipeline, '_get_executor', return_value=_FinishedExecutor()), \
+                mock.patch.object(image_pipeline, '_save_variants', wraps=image_pipeline._save_variants) as save:
+            with transaction.atomic():
+                image_pipeline.process_now(self.user, 'image', 'image_variants', in_pool=True)
+                # اتصال همان درخواست هنوز باز و داخل atomic است
+                self.assertTrue(connection.in_atomic_block)
+                self.assertEqual(User.objects.filter(pk=self.user.pk).count(), 1)
+
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(self.user.image_variants, {'source': 'profile_images/heic.jpg'})
+        self.assertEqual(image_pipeline._pending, {})
+
+    def test_callback_saves_scheduled_target_from_submitting_thread(self):
+        from . import image_pipeline
+
+        target = (User, self.user.pk, 'image', 'image_variants')
+        with mock.patch.object(image_pipeline, '_get_executor', return_value=_FinishedExecutor()), \
+                mock.patch.object(image_pipeline, '_save_variants') as save, \
+                mock.patch.object(image_pipeline, 'connection') as pipeline_connection:
+            image_pipeline._submit(self.user.image, target)
+
+        save.assert_called_once_with(*target, {'source': 'profile_images/heic.jpg'})
+        pipeline_connection.close.assert_not_called()
+
+
+class MetricsFlushTests(TestCase):
+    """snapshot metricها در cache مشترک: throttle در پایان درخواست و حذف workerهای منقضی"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_request_finished_flush_is_throttled(self):
+        from core.metrics import Registry
+
+        registry = Registry()
+        registry.add(('faydo_test_total', ()), 1)
+        with mock.patch.object(Registry, '_snapshots') as snapshots, \
+                override_settings(METRICS_FLUSH_SECONDS=60):
+            registry.flush()
+            snapshots.return_value.publish.assert_not_called()
+            self.assertTrue(registry.dirty)
+
+            registry.flush(force=True)
+            snapshots.return_value.publish.assert_called_once_with({('faydo_test_total', ()): 1})
+            self.assertFalse(registry.dirty)
+
+            registry.add(('faydo_test_total', ()), 1)
+            registry.flush()
+            self.assertEqual(snapshots.return_value.publish.call_count, 1)
+
+    def test_publish_drops_expired_workers(self):
+        from core.cache_tier import WorkerSnapshots
+
+        snapshots = WorkerSnapshots('metrics_test')
+        snapshots.namespace.set('worker', 'gone:1', value={'a': 1})
+        snapshots.namespace.set('worker', 'alive:2', value={'a': 2})
+        snapshots.namespace.set('workers', value={'gone:1', 'alive:2', 'expired:3'}, timeout=None)
+        snapshots.namespace.delete('worker', 'gone:1')
+
+        with mock.patch.object(WorkerSnapshots, 'worker_id', return_value='me:4'):
+            snapshots.publish({'a': 4})
+
+        self.assertEqual(snapshots.namespace.get('workers'), {'alive:2', 'me:4'})
+        self.assertEqual(snapshots.all(), [('alive:2', {'a': 2}), ('me:4', {'a': 4})])
+
+
+class ReferenceRegistryStampTests(TestCase):
+    """مهر نسخه رجیستری در cache مشترک، بعد از commit"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidate_bumps_shared_stamp_on_commit(self):
+        from .reference_registry import ReferenceRegistry
+
+        registry = ReferenceRegistry()
+        before = registry._current_stamp()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            registry.invalidate()
+            self.assertEqual(registry._current_stamp(), before)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(registry._current_stamp(), before + 1)
+
+    def test_evicted_stamp_does_not_repeat_an_old_version(self):
+        from .reference_registry import stamp
+
+        seen = stamp.version()
+        stamp.bump()
+        cache.delete(f'{stamp.name}:version')
+        self.assertNotIn(stamp.version(), (seen, seen + 1))
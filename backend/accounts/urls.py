@@ -8,8 +8,8 @@ from .views import (
     BusinessGalleryViewSet, register_view, business_register_view, login_view, logout_view, profile_view,
     send_otp_view, verify_otp_view, login_with_otp_view, upload_profile_image_view, 
     update_phone_view, update_business_profile_view, update_customer_profile_view,
-    get_cities_by_province_view, get_all_provinces_view, get_all_cities_view, verify_qr_code,
-    set_password_view
+    get_cities_by_province_view, get_all_provinces_view, get_all_cities_view, reference_snapshot_view, verify_qr_code,
+    set_password_view, request_metrics_view, profiles_view, profile_detail_view
 )
 
 # API Router for ViewSets
@@ -52,10 +52,19 @@ urlpatterns = [
     path('locations/provinces/', get_all_provinces_view, name='get_all_provinces'),
     path('locations/cities/', get_all_cities_view, name='get_all_cities'),
     path('locations/provinces/<int:province_id>/cities/', get_cities_by_province_view, name='get_cities_by_province'),
+
+    # Reference data snapshots
+    path('reference/<str:key>/', reference_snapshot_view, name='reference_snapshot'),
     
     # QR Code endpoints
     path('qr/verify/', verify_qr_code, name='verify_qr_code'),
     
+    # Ops endpoints (staff only)
+    path('ops/request-metrics/', request_metrics_view, name='request_metrics'),
+    path('ops/profiles/', profiles_view, name='profiles'),
+    path('ops/profiles/<str:profile_id>/', profile_detail_view, name='profile_detail'),
+    path('ops/profiles/<str:profile_id>/<str:fmt>/', profile_detail_view, name='profile_export'),
+
     # API endpoints
     path('', include(router.urls)),
 ]
@@ -1,4 +1,3 @@
-import os
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import api_view, permission_classes, action, authentication_classes
 from rest_framework.response import Response
@@ -6,6 +5,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth import login
+from core.db_router import ReplicaReadMixin
 from .models import *
 from .serializers import *
 
@@ -31,17 +31,34 @@ class RequireCompleteProfile(permissions.BasePermission):
             return False
 
 
+class IsStaffUser(permissions.BasePermission):
+    """
+    فقط کارکنان فنی: is_staff یا نقش admin / it_manager (User.is_ops_staff)
+    برای ابزارهای عملیاتی مثل آمار درخواست‌ها و profileها
+    """
+    message = 'Staff only.'
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.is_ops_staff)
+
+
 def _serialize_user_with_absolute_image(user, request):
     """Return serialized user data ensuring image field is absolute URL if present."""
+    from .image_pipeline import variant_url
+
     data = UserSerializer(user).data
     if user.image:
         try:
-            data['image'] = request.build_absolute_uri(user.image.url)
+            # Resized variant once the image pipeline has produced it (HEIC originals are not displayable)
+            data['image'] = variant_url(user.image, user.image_variants, 'full', request, ext='jpg')
         except Exception:
             # Fallback silently keeps original relative path
             pass
     return data
 from .sms_service import sms_service
+from .code_allocator import is_valid_code
+from .reference_snapshots import DATASETS, snapshot_response
 
 
 @api_view(['POST'])
@@ -289,66 +306,51 @@ def upload_profile_image_view(request):
 
     user = request.user
 
-    # Delete previous image file if exists (avoid orphaned files)
-    old_image_path = None
-    if user.image and hasattr(user.image, 'path'):
-        old_image_path = user.image.path
-
-    # HEIC conversion if needed
-    from django.core.files.base import ContentFile
-    from PIL import Image
-    import io
-    import uuid
-    converted = None
-    try:
-        if content_type in ('image/heic', 'image/heif', 'image/HEIC', 'image/HEIF'):
-            try:
-                try:
-                    from pillow_heif import register_heif_opener  # type: ignore
-                    register_heif_opener()
-                except Exception:
-                    return Response({'error': 'پشتیبانی HEIC نصب نشده (pillow-heif).'}, status=status.HTTP_501_NOT_IMPLEMENTED)
-                im = Image.open(image_file)
-                rgb_im = im.convert('RGB')
-                buffer = io.BytesIO()
-                rgb_im.save(buffer, format='JPEG', quality=85, optimize=True)
-                buffer.seek(0)
-                new_name = f"converted_{uuid.uuid4().hex}.jpg"
-                converted = ContentFile(buffer.read(), name=new_name)
-                user.image = converted
-            except Exception as e:
-                return Response({'error': f'خطا در تبدیل HEIC: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            # For regular images keep original but optionally re-save to optimize (future)
-            user.image = image_file
-        user.save()
+    is_heic = content_type in ('image/heic', 'image/heif', 'image/HEIC', 'image/HEIF')
+    if is_heic:
+        try:
+            import pillow_heif  # type: ignore  # noqa: F401
+        except Exception:
+            return Response({'error': 'پشتیبانی HEIC نصب نشده (pillow-heif).'}, status=status.HTTP_501_NOT_IMPLEMENTED)
 
-        # برای کسب‌وکار: عکس پروفایل همان لوگوی نمایشی است
-        if user.role == 'business' and user.image:
-            try:
-                bp = user.businessprofile
-                with user.image.open('rb') as f:
-                    bp.logo.save(
-                        os.path.basename(user.image.name),
-                        ContentFile(f.read()),
-                        save=True,
-                    )
-            except Exception:
-                pass
-    finally:
-        # Clean old image after successful save
-        if old_image_path and os.path.isfile(old_image_path):
-            try:
-                os.remove(old_image_path)
-            except Exception:
-                pass
+    from .image_pipeline import process_now, variant_url
 
-    absolute_url = request.build_absolute_uri(user.image.url) if user.image else None
+    # Original is stored as uploaded; large uploads arrive as temp files and are moved, not copied.
+    # Resized WebP/JPEG variants are built in the image pipeline's process pool (see signals).
+    # Files are content-addressed: the previous image is released, not deleted (gc_media_blobs).
+    previous_image = user.image.name
+    previous_variants = user.image_variants
+    user.image = image_file
+    user.image_variants = {}
+    user.save()
+
+    if is_heic:
+        # Browsers cannot display HEIC, so wait for the JPEG/WebP variants here
+        try:
+            process_now(user, 'image', 'image_variants', in_pool=True)
+        except Exception as e:
+            # Conversion failed: put the previous image back (its blob is re-referenced, the HEIC released)
+            user.image.name = previous_image
+            user.image_variants = previous_variants
+            user.save(update_fields=['image', 'image_variants'])
+            return Response({'error': f'خطا در تبدیل HEIC: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # برای کسب‌وکار: عکس پروفایل همان لوگوی نمایشی است (همان blob، بدون کپی)
+    if user.role == 'business' and user.image:
+        try:
+            bp = user.businessprofile
+            bp.logo.name = user.image.name
+            bp.logo_variants = user.image_variants
+            bp.save()
+        except Exception:
+            pass
+
+    absolute_url = variant_url(user.image, user.image_variants, 'full', request, ext='jpg')
     return Response({
         'message': 'Profile image uploaded successfully',
         'image': absolute_url,
         'original_name': original_name,
-        'converted': bool(converted)
+        'converted': is_heic
     })
 
 
@@ -526,30 +528,36 @@ def get_cities_by_province_view(request, province_id):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_all_provinces_view(request):
-    """Get all provinces with their cities"""
-    provinces = Province.objects.prefetch_related('cities').all().order_by('name')
-    serializer = ProvinceSerializer(provinces, many=True)
-    return Response(serializer.data)
+    """Get all provinces (served from the reference snapshot)"""
+    return snapshot_response(request, 'provinces')
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_all_cities_view(request):
-    """Get all cities grouped by province"""
-    provinces = Province.objects.prefetch_related('cities').all().order_by('name')
-    result = []
-    
-    for province in provinces:
-        cities = CitySerializer(province.cities.all().order_by('name'), many=True).data
-        result.append({
-            'id': province.id,
-            'name': province.name,
-            'cities': cities
-        })
-    
-    return Response(result)
-class BaseReadWriteViewSet(viewsets.ModelViewSet):
+    """Get all cities grouped by province (served from the reference snapshot)"""
+    return snapshot_response(request, 'cities')
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def reference_snapshot_view(request, key):
+    """
+    داده مرجع نسخه‌دار (clubs, service_categories, provinces, cities, amenities, vip_categories)
+    با ETag / Last-Modified؛ درخواست شرطی بدون تغییر 304 می‌گیرد.
+    """
+    dataset = DATASETS.get(key)
+    if dataset is None:
+        return Response({'error': 'Unknown dataset'}, status=status.HTTP_404_NOT_FOUND)
+    if not dataset.public and not request.user.is_authenticated:
+        return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+    return snapshot_response(request, key)
+
+
+class BaseReadWriteViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
 	permission_classes = [permissions.AllowAny]
+	# لیست‌های پنل مدیریت از replica (core/db_router.py)
+	replica_actions = ('list',)
 
 
 class UserViewSet(BaseReadWriteViewSet):
@@ -561,11 +569,22 @@ class ClubViewSet(BaseReadWriteViewSet):
 	queryset = Club.objects.all()
 	serializer_class = ClubSerializer
 
+	def list(self, request, *args, **kwargs):
+		# لیست کامل بدون پارامتر از snapshot نسخه‌دار (با ETag) خوانده می‌شود
+		if not request.query_params:
+			return snapshot_response(request, 'clubs')
+		return super().list(request, *args, **kwargs)
+
 
 class ServiceCategoryViewSet(BaseReadWriteViewSet):
 	queryset = ServiceCategory.objects.select_related('club').all()
 	serializer_class = ServiceCategorySerializer
 
+	def list(self, request, *args, **kwargs):
+		if not request.query_params:
+			return snapshot_response(request, 'service_categories')
+		return super().list(request, *args, **kwargs)
+
 
 class ProvinceViewSet(BaseReadWriteViewSet):
 	queryset = Province.objects.all()
@@ -729,23 +748,101 @@ def verify_qr_code(request):
         )
     
     try:
-        # Find business by unique code
-        business_profile = BusinessProfile.objects.select_related('user').get(unique_code=unique_code)
-        
-        # Serialize business data
-        serializer = BusinessProfileSerializer(business_profile, context={'request': request})
-        
-        # TODO: Log the scan event for analytics
-        # You can create a ScanLog model to track scans
-        
-        return Response({
-            'success': True,
-            'business': serializer.data
-        })
-        
-    except BusinessProfile.DoesNotExist:
+        unique_code = int(unique_code)
+    except (TypeError, ValueError):
+        return Response(
+            {'error': 'کد QR معتبر نیست'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    # Check digit rejects mistyped codes without hitting the database
+    if not is_valid_code(unique_code):
+        return Response(
+            {'error': 'کد QR معتبر نیست'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    from loyalty.scan_cache import get_cached_profile_data
+
+    # Serialized business profile is cached per code and invalidated by signals
+    data = get_cached_profile_data(unique_code)
+    if data is None:
         return Response(
             {'error': 'کد QR معتبر نیست'},
             status=status.HTTP_404_NOT_FOUND
         )
 
+    # Cached payload is request-independent; make the owner image absolute here
+    user_data = data.get('user') or {}
+    if user_data.get('image'):
+        data = {**data, 'user': {**user_data, 'image': request.build_absolute_uri(user_data['image'])}}
+
+    # TODO: Log the scan event for analytics
+    # You can create a ScanLog model to track scans
+
+    return Response({
+        'success': True,
+        'business': data
+    })
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsStaffUser])
+def request_metrics_view(request):
+    """
+    آمار درخواست‌ها برای هر route از همه workerها (core/request_metrics.py):
+    تعداد و زمان queryها، زمان Python، اندازه پاسخ و histogram زمان/تعداد query
+    GET /api/accounts/ops/request-metrics/?sort=total_db_ms|avg_queries|avg_ms|count
+    DELETE: صفر کردن آمار
+    """
+    from core.request_metrics import SORT_KEYS, reset, snapshot
+
+    if request.method == 'DELETE':
+        reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    sort = request.query_params.get('sort', 'total_db_ms')
+    if sort not in SORT_KEYS:
+        return Response(
+            {'error': f"sort فقط از {', '.join(SORT_KEYS)}"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(snapshot(sort))
+
+
+@api_view(['GET'])
+@permission_classes([IsStaffUser])
+def profiles_view(request):
+    """
+    آخرین profileهای ذخیره شده (core/profiling.py)
+    GET /api/accounts/ops/profiles/
+    profile گرفتن: هدر X-Profile: sample|cprofile یا ?_profile=1 روی هر درخواست
+    """
+    from core.profiling import recent
+
+    return Response({'results': recent()})
+
+
+@api_view(['GET'])
+@permission_classes([IsStaffUser])
+def profile_detail_view(request, profile_id, fmt=None):
+    """
+    GET /api/accounts/ops/profiles/<id>/          خلاصه، SQL و جدول توابع (cprofile)
+    GET /api/accounts/ops/profiles/<id>/folded/   folded stacks برای flamegraph.pl / speedscope
+    GET /api/accounts/ops/profiles/<id>/pstats/   فایل pstats برای snakeviz / flameprof
+    """
+    from django.http import HttpResponse
+    from core.profiling import get
+
+    profile = get(profile_id)
+    if profile is None:
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    if fmt == 'folded':
+        if 'folded' not in profile:
+            return Response({'error': 'Not a sampling profile'}, status=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(profile['folded'], content_type='text/plain; charset=utf-8')
+    if fmt == 'pstats':
+        if 'pstats' not in profile:
+            return Response({'error': 'Not a cprofile profile'}, status=status.HTTP_404_NOT_FOUND)
+        response = HttpResponse(profile['pstats'], content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile_id}.pstats"'
+        return response
+    return Response({key: value for key, value in profile.items() if key not in ('folded', 'pstats')})
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+لایه cache مشترک بین workerها
+
+backend با env CACHE_BACKEND انتخاب می‌شود (build_caches در settings):
+- database (پیش‌فرض): DatabaseCache روی دیتابیس اصلی؛ جدول آن را migration
+  accounts/0011 (یا manage.py createcachetable) می‌سازد. add اتمیک است (یک
+  INSERT) ولی incr/decr خواندن و نوشتن جداست؛ شمارنده‌ها باید داخل
+  transaction.atomic همان دیتابیس باشند (packages/llm_guard.py)
+- file: FileBasedCache در CACHE_LOCATION؛ add/incr روی آن اتمیک نیستند، پس
+  قفل‌ها، سهمیه‌ها و rate limitها فقط تقریبی‌اند (برای توسعه)
+- redis: RedisCache با REDIS_URL (بسته redis باید نصب باشد)
+- locmem: حافظه همان process؛ جایگزین محلی برای تست و توسعه تک process
+
+روی این لایه:
+- Namespace: کلیدهای پیشوند دار هر بخش (otp:0912...) و نسخه برای ابطال یکجا
+- WorkerSnapshots: آمار در حافظه هر worker (host:pid) که برای جمع بین workerها در
+  cache نوشته می‌شود (core/request_metrics.py، core/metrics.py)
+- get_or_compute: cache با محافظت در برابر stampede؛ بعد از انقضای نرم فقط یک
+  درخواست مقدار را از نو می‌سازد و بقیه مقدار قدیمی را می‌گیرند، و وقتی مقداری
+  نیست بقیه منتظر سازنده می‌مانند. قفل با cache.add است که روی redis و
+  database اتمیک است؛ روی file در بدترین حالت دو درخواست هم‌زمان می‌سازند.
+"""
+import os
+import random
+import socket
+import time
+
+BACKENDS = {
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'database': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+DEFAULT_TIMEOUT = 300
+# FileBasedCache و DatabaseCache بعد از این تعداد، یک سوم ورودی‌ها را حذف می‌کنند
+MAX_ENTRIES = 20000
+
+LOCK_TIMEOUT = 30
+WAIT_SECONDS = 5.0
+POLL_SECONDS = 0.05
+# snapshot workerهای قبلی (بعد از restart) تا این مدت در جمع می‌مانند
+WORKER_TTL = 24 * 60 * 60
+
+
+def build_caches(backend, base_dir, environ):
+    """تنظیم CACHES برای settings؛ backend نامعتبر خطای پیکربندی است"""
+    if backend not in BACKENDS:
+        raise ValueError(f'CACHE_BACKEND must be one of {", ".join(BACKENDS)}')
+    default = {
+        'BACKEND': BACKENDS[backend],
+        'TIMEOUT': DEFAULT_TIMEOUT,
+        'KEY_PREFIX': environ.get('CACHE_KEY_PREFIX', 'faydo'),
+    }
+    if backend == 'file':
+        default['LOCATION'] = environ.get('CACHE_LOCATION', str(base_dir / 'cache'))
+        default['OPTIONS'] = {'MAX_ENTRIES': MAX_ENTRIES}
+    elif backend == 'database':
+        default['LOCATION'] = environ.get('CACHE_LOCATION', 'django_cache')
+        default['OPTIONS'] = {'MAX_ENTRIES': MAX_ENTRIES}
+    elif backend == 'redis':
+        default['LOCATION'] = environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+    else:
+        default['LOCATION'] = environ.get('CACHE_LOCATION', 'faydo-local')
+    return {'default': default}
+
+
+def _cache(alias='default'):
+    from django.core.cache import caches
+
+    return caches[alias]
+
+
+class Namespace:
+    """
+    کلیدهای یک بخش: Namespace('otp').key('0912...') → 'otp:v<نسخه>:0912...'
+    bump() نسخه را عوض می‌کند و همه کلیدهای قبلی بی‌اثر می‌شوند.
+    """
+
+    def __init__(self, name, alias='default'):
+        self.name = name
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return _cache(self.alias)
+
+    def version(self):
+        """
+        نسخه فعلی (برای مهر نسخه مشترک بین workerها هم به کار می‌رود)
+        اگر کلید نسخه نباشد (اولین بار یا حذف از cache) از یک عدد تصادفی شروع
+        می‌شود تا با نسخه‌ای که قبل از حذف دیده شده یکی نشود.
+        """
+        version_key = f'{self.name}:version'
+        version = self.cache.get(version_key)
+        if version is None:
+            self.cache.add(version_key, random.getrandbits(48), None)
+            version = self.cache.get(version_key)
+        return version
+
+    def key(self, *parts):
+        return ':'.join([self.name, f'v{self.version()}', *(str(part) for part in parts)])
+
+    def bump(self):
+        version_key = f'{self.name}:version'
+        self.cache.set(version_key, self.version() + 1, None)
+
+    def get(self, *parts, default=None):
+        return self.cache.get(self.key(*parts), default)
+
+    def set(self, *parts, value, timeout=DEFAULT_TIMEOUT):
+        self.cache.set(self.key(*parts), value, timeout)
+
+    def add(self, *parts, value, timeout=DEFAULT_TIMEOUT):
+        return self.cache.add(self.key(*parts), value, timeout)
+
+    def delete(self, *parts):
+        return self.cache.delete(self.key(*parts))
+
+    def get_or_compute(self, *parts, compute, timeout=DEFAULT_TIMEOUT, **options):
+        return get_or_compute(self.key(*parts), compute, timeout, alias=self.alias, **options)
+
+
+class WorkerSnapshots:
+    """
+    snapshot هر worker با کلید host:pid و فهرست workerها؛ all() همه را برمی‌گرداند.
+    pid به تنهایی کافی نیست: cache مشترک (database/redis) بین چند میزبان یا
+    container است و pid آن‌ها (مثلاً 1 در container) تکراری است.
+    رقابت دو worker در به‌روزرسانی فهرست با publish بعدی جبران می‌شود.
+    workerهایی که snapshot آن‌ها منقضی شده در publish از فهرست حذف می‌شوند.
+    """
+
+    def __init__(self, name, ttl=WORKER_TTL, alias='default'):
+        self.namespace = Namespace(name, alias)
+        self.ttl = ttl
+
+    @staticmethod
+    def worker_id():
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def publish(self, value):
+        worker = self.worker_id()
+        self.namespace.set('worker', worker, value=value, timeout=self.ttl)
+        workers = self.namespace.get('workers') or set()
+        others = sorted(workers - {worker})
+        alive = self.namespace.cache.get_many([self.namespace.key('worker', other) for other in others])
+        live = {worker} | {
+            other for other in others if self.namespace.key('worker', other) in alive
+        }
+        if live != workers:
+            self.namespace.set('workers', value=live, timeout=None)
+
+    def all(self):
+        """[(host:pid, snapshot)] workerهایی که snapshot آن‌ها منقضی نشده است"""
+        snapshots = []
+        for worker in sorted(self.namespace.get('workers') or ()):
+            value = self.namespace.get('worker', worker)
+            if value is not None:
+                snapshots.append((worker, value))
+        return snapshots
+
+    def clear(self):
+        for worker in self.namespace.get('workers') or ():
+            self.namespace.delete('worker', worker)
+        self.namespace.delete('workers')
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, grace=None, lock_timeout=LOCK_TIMEOUT,
+                   wait=WAIT_SECONDS, alias='default'):
+    """
+    مقدار key یا نتیجه compute()؛ compute در هر لحظه فقط در یک درخواست اجرا می‌شود.
+
+    مقدار با زمان تازگی (timeout) و grace ثانیه مهلت اضافه ذخیره می‌شود:
+    - تازه: برگردانده می‌شود
+    - کهنه (در grace): درخواستی که قفل را بگیرد از نو می‌سازد، بقیه مقدار کهنه را می‌گیرند
+    - نبود: درخواستی که قفل را بگیرد می‌سازد، بقیه تا wait ثانیه منتظر می‌مانند و
+      بعد خودشان می‌سازند
+    """
+    cache = _cache(alias)
+    grace = timeout if grace is None else grace
+    lock_key = f'{key}:lock'
+
+    def build():
+        value = compute()
+        cache.set(key, (value, time.time() + timeout), timeout + grace)
+        return value
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until or not cache.add(lock_key, 1, lock_timeout):
+            return value
+        try:
+            return build()
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait
+    while not cache.add(lock_key, 1, lock_timeout):
+        if time.monotonic() >= deadline:
+            return compute()
+        time.sleep(POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    try:
+        # شاید سازنده قبلی درست پیش از گرفتن قفل کارش تمام شده باشد
+        entry = cache.get(key)
+        if entry is not None and time.time() < entry[1]:
+            return entry[0]
+        return build()
+    finally:
+        cache.delete(lock_key)
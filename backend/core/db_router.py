@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+مسیریابی خواندن/نوشتن دیتابیس با alias اختیاری replica
+
+- همه نوشتن‌ها (و migrate) روی default هستند.
+- خواندن فقط وقتی به replica می‌رود که مسیر آن صریحاً فعال شده باشد:
+  viewهای سنگین فقط‌خواندنی (ReplicaReadMixin / replica_reads) و گزارش‌های
+  دسته‌ای (use_replica). بقیه کد بدون تغییر روی default می‌خواند.
+- read-your-writes:
+  - در همان درخواست: بعد از اولین نوشتن یا داخل transaction.atomic، خواندن‌ها
+    به default برمی‌گردند.
+  - بین درخواست‌ها: ReplicaStickinessMiddleware کاربری را که نوشته است
+    DATABASE_REPLICA_STICKY_SECONDS ثانیه به default می‌چسباند (در cache
+    مشترک، core/cache_tier.py)؛ این مدت باید از تاخیر replica بیشتر باشد.
+- بدون DATABASES['replica'] همه چیز روی default می‌ماند.
+
+وضعیت مسیر در ContextVar است و برای هر درخواست در middleware از نو شروع می‌شود.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+DEFAULT_DB = 'default'
+REPLICA_DB = 'replica'
+DEFAULT_STICKY_SECONDS = 60
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# جدول DatabaseCache (core/cache_tier.py): همیشه default، و نوشتن در آن نوشتن
+# داده نیست؛ cache کهنه replica ابطال‌ها را نمی‌بیند و قفل cache.add نباید
+# درخواست فقط‌خواندنی را به default برگرداند یا کاربر را sticky کند
+CACHE_APP_LABEL = 'django_cache'
+
+_route = ContextVar('db_route', default=DEFAULT_DB)
+_wrote = ContextVar('db_wrote', default=False)
+
+
+def _setting(name, default):
+    from django.conf import settings
+
+    return getattr(settings, name, default)
+
+
+def replica_configured():
+    from django.conf import settings
+
+    return REPLICA_DB in settings.DATABASES
+
+
+def _sticky():
+    from core.cache_tier import Namespace
+
+    return Namespace('db_sticky')
+
+
+def is_sticky(user_id):
+    return user_id is not None and bool(_sticky().get(user_id))
+
+
+def mark_sticky(user_id):
+    _sticky().set(user_id, value=1, timeout=_setting('DATABASE_REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS))
+
+
+def wrote():
+    """آیا در این درخواست/کار چیزی نوشته شده است"""
+    return _wrote.get()
+
+
+def reset():
+    """شروع وضعیت تازه (برای هر درخواست)؛ خروجی توکن‌ها برای restore"""
+    return _route.set(DEFAULT_DB), _wrote.set(False)
+
+
+def restore(tokens):
+    route_token, wrote_token = tokens
+    _route.reset(route_token)
+    _wrote.reset(wrote_token)
+
+
+@contextmanager
+def use_replica():
+    """
+    خواندن‌های داخل بلوک از replica (اگر تعریف شده باشد)؛ برای گزارش‌ها و
+    commandهای دسته‌ای هم به شکل decorator: @use_replica()
+    """
+    token = _route.set(REPLICA_DB)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+def should_use_replica(request):
+    """درخواست فقط‌خواندنی و کاربری که اخیراً ننوشته است"""
+    if request.method not in SAFE_METHODS or not replica_configured():
+        return False
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    return not is_sticky(user_id)
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS: نوشتن روی default، خواندن روی replica فقط در مسیر فعال شده"""
+
+    def db_for_read(self, model, **hints):
+        from django.db import connections
+
+        if model._meta.app_label == CACHE_APP_LABEL:
+            return DEFAULT_DB
+        if _route.get() != REPLICA_DB or _wrote.get() or not replica_configured():
+            return DEFAULT_DB
+        if connections[DEFAULT_DB].in_atomic_block:
+            return DEFAULT_DB
+        return REPLICA_DB
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != CACHE_APP_LABEL:
+            _wrote.set(True)
+        return DEFAULT_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replica کپی همان دیتابیس است
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB
+
+
+class ReplicaStickinessMiddleware:
+    """
+    وضعیت مسیر را برای هر درخواست از نو شروع می‌کند و بعد از پاسخ، اگر
+    کاربر احراز شده چیزی نوشته باشد او را به default می‌چسباند.
+    کاربر JWT بعد از اجرای view روی request اصلی هم قرار گرفته است.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tokens = reset()
+        try:
+            response = self.get_response(request)
+            user = getattr(request, 'user', None)
+            if wrote() and replica_configured() and user is not None and user.is_authenticated:
+                mark_sticky(user.pk)
+            return response
+        finally:
+            restore(tokens)
+
+
+class ReplicaReadMixin:
+    """
+    برای ViewSetها: actionهای replica_actions در درخواست‌های فقط‌خواندنی از
+    replica می‌خوانند. تصمیم بعد از احراز هویت (initial) گرفته می‌شود.
+    """
+    replica_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions and should_use_replica(request):
+            self._replica_token = _route.set(REPLICA_DB)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _route.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def replica_reads(view):
+    """برای @api_view: زیر api_view/permission_classes قرار می‌گیرد"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not should_use_replica(request):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            return view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+شمارنده‌ها و histogramهای عملیاتی با خروجی متنی Prometheus
+
+- هر worker مقدارها را در dict همان process نگه می‌دارد (بدون قفل؛ workerهای
+  gunicorn sync تک thread هستند) و در پایان درخواستی که مقداری را تغییر داده
+  snapshot را در cache مشترک می‌نویسد (WorkerSnapshots در core/cache_tier.py)،
+  حداکثر هر METRICS_FLUSH_SECONDS یک بار تا مسیرهای پرتکرار (approve/award)
+  روی DatabaseCache هر بار یک نوشتن اضافه نداشته باشند؛ درخواست‌های بدون
+  رویداد هزینه‌ای ندارند. commandها در خروج process و /metrics پیش از جمع
+  می‌نویسند.
+- metrics_view مجموع همه workerها را در قالب text exposition 0.0.4 برمی‌گرداند؛
+  فقط برای IPهای METRICS_ALLOWED_IPS (پیش‌فرض localhost). nginx فقط /api و
+  /admin را به backend می‌دهد، پس /metrics از بیرون در دسترس نیست.
+- snapshot worker تمام شده تا WORKER_TTL در جمع می‌ماند؛ بعد از آن شمارنده‌ها
+  کم می‌شوند که Prometheus آن را reset حساب می‌کند (rate/increase درست می‌مانند).
+
+تعریف metricها در همین فایل است تا نام‌ها و labelها یک جا دیده شوند.
+"""
+import atexit
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_FLUSH_SECONDS = 10
+
+
+def _setting(name, default):
+    from django.conf import settings
+
+    return getattr(settings, name, default)
+
+
+class Registry:
+    """مقدارهای این process: {(نام، labelها): مقدار}"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.values = {}
+        self.dirty = False
+        self._flushed_at = time.monotonic()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add(self, key, amount):
+        self.values[key] = self.values.get(key, 0) + amount
+        self.dirty = True
+
+    def observe(self, key, buckets, value):
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [0] * (len(buckets) + 2)
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                entry[index] += 1
+        # دو خانه آخر: sum و count (+Inf همان count است)
+        entry[-2] += value
+        entry[-1] += 1
+        self.dirty = True
+
+    def _snapshots(self):
+        from core.cache_tier import WorkerSnapshots
+
+        return WorkerSnapshots('metrics')
+
+    def flush(self, force=False):
+        """snapshot این process در cache مشترک؛ بدون force حداکثر هر FLUSH_SECONDS یک بار"""
+        if not self.dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed_at < _setting('METRICS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS):
+            return
+        self._flushed_at = now
+        try:
+            self._snapshots().publish({
+                key: list(value) if isinstance(value, list) else value
+                for key, value in self.values.items()
+            })
+            self.dirty = False
+        except Exception:
+            logger.warning('metrics flush failed', exc_info=True)
+
+    def collect(self):
+        """مجموع مقدارهای همه workerها"""
+        self.flush(force=True)
+        totals = {}
+        for _, values in self._snapshots().all():
+            for key, value in values.items():
+                if isinstance(value, list):
+                    current = totals.get(key)
+                    totals[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+registry = Registry()
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} labels must be {", ".join(self.labelnames)}')
+        return self.name, tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        registry.add(self._key(labels), amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        registry.observe(self._key(labels), self.buckets, value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+# ─── metricها ───────────────────────────────────────────────────
+
+POINTS_AWARDED = Counter(
+    'faydo_points_awarded_total', 'Points granted by loyalty events (loyalty.services._log_event)', ['event_type'],
+)
+POINTS_EVENTS = Counter(
+    'faydo_points_events_total', 'Loyalty points events recorded', ['event_type'],
+)
+TRANSACTIONS = Counter(
+    'faydo_transactions_total', 'Loyalty transactions by action (create/approve/reject)', ['action'],
+)
+TRANSACTION_SECONDS = Histogram(
+    'faydo_transaction_duration_seconds', 'Time to create/approve/reject a loyalty transaction', ['action'],
+)
+ELITE_GIFT_CLAIMS = Counter(
+    'faydo_elite_gift_claims_total', 'Elite gift claims by action (create/approve/reject/use)', ['action'],
+)
+PACKAGE_ACTIVATIONS = Counter(
+    'faydo_package_activations_total', 'Packages activated', ['source'],
+)
+SMS_SENT = Counter(
+    'faydo_sms_sent_total', 'SMS messages accepted by the provider',
+)
+SMS_FAILURES = Counter(
+    'faydo_sms_failures_total', 'SMS sends that failed', ['reason'],
+)
+GROQ_REQUESTS = Counter(
+    'faydo_groq_requests_total', 'Groq smart-search calls by outcome', ['outcome'],
+)
+GROQ_SECONDS = Histogram(
+    'faydo_groq_request_duration_seconds', 'Groq smart-search call latency', ['outcome'],
+)
+
+
+# ─── خروجی Prometheus ───────────────────────────────────────────
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render():
+    totals = registry.collect()
+    by_metric = {}
+    for (name, labelvalues), value in totals.items():
+        by_metric.setdefault(name, []).append((labelvalues, value))
+
+    lines = []
+    for name, metric in registry.metrics.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labelvalues, value in sorted(by_metric.get(name, ())):
+            pairs = list(zip(metric.labelnames, labelvalues))
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                continue
+            for bound, count in zip(metric.buckets, value):
+                lines.append(f'{name}_bucket{_labels(pairs + [("le", _number(float(bound)))])} {count}')
+            lines.append(f'{name}_bucket{_labels(pairs + [("le", "+Inf")])} {value[-1]}')
+            lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-2])}')
+            lines.append(f'{name}_count{_labels(pairs)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """GET /metrics برای Prometheus (فقط از METRICS_ALLOWED_IPS)"""
+    from django.http import HttpResponse, HttpResponseForbidden
+
+    if request.META.get('REMOTE_ADDR') not in _setting('METRICS_ALLOWED_IPS', ('127.0.0.1', '::1')):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+def _flush_on_request_finished(**kwargs):
+    registry.flush()
+
+
+def _connect():
+    from django.core.signals import request_finished
+
+    request_finished.connect(_flush_on_request_finished, dispatch_uid='core.metrics.flush')
+    atexit.register(registry.flush, force=True)
+
+
+_connect()
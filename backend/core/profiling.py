@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+profiling یک درخواست به درخواست کارکنان فنی، بدون deploy دوباره
+
+درخواستی که هدر X-Profile یا پارامتر ?_profile دارد و کاربرش (session یا JWT)
+User.is_ops_staff است زیر profiler اجرا می‌شود؛ برای بقیه درخواست‌ها فقط
+یک جستجو در META/GET انجام می‌شود و هدر/پارامتر نادیده گرفته می‌شود.
+
+حالت‌ها (مقدار هدر/پارامتر):
+- sample (پیش‌فرض، با 1): نمونه‌برداری از stack همان thread هر
+  PROFILE_SAMPLE_INTERVAL ثانیه در یک thread جدا؛ خروجی folded stacks
+  ("a;b;c 12") که flamegraph.pl و speedscope مستقیم می‌خوانند
+- cprofile: cProfile قطعی؛ خروجی pstats (snakeviz / flameprof) و جدول
+  پرهزینه‌ترین توابع. در هر process فقط یک cProfile همزمان فعال است (در
+  Python 3.12 cProfile روی sys.monitoring سراسری process سوار است)؛ اگر
+  درخواست دیگری در حال cprofile باشد، این درخواست sample می‌شود و mode
+  ذخیره شده همان حالت واقعی است.
+
+همراه profile، SQL اجرا شده (متن و زمان، بدون پارامترها) ذخیره می‌شود.
+profileها در cache مشترک (core/cache_tier.py) با فهرست آخرین PROFILE_KEEP
+مورد نگه داشته می‌شوند؛ شناسه در هدر X-Profile-Id پاسخ برمی‌گردد و
+endpointهای /api/accounts/ops/profiles/ (accounts/views.py) آن‌ها را نشان می‌دهند.
+"""
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+MODES = ('sample', 'cprofile')
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = '_profile'
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_KEEP = 50
+PROFILE_TTL = 24 * 60 * 60
+MAX_QUERIES = 1000
+STATEMENT_CHARS = 1000
+TOP_FUNCTIONS = 40
+
+
+def _setting(name, default):
+    from django.conf import settings
+
+    return getattr(settings, name, default)
+
+
+def _namespace():
+    from core.cache_tier import Namespace
+
+    return Namespace('profiles')
+
+
+def requested_mode(request):
+    """حالت درخواست شده یا None؛ مقدار 1/true همان sample است"""
+    value = request.META.get(HEADER)
+    if value is None:
+        value = request.GET.get(QUERY_FLAG)
+        if value is None:
+            return None
+    value = value.strip().lower()
+    if value in MODES:
+        return value
+    return 'sample' if value in ('', '1', 'true', 'yes') else None
+
+
+def staff_user(request):
+    """کاربر session یا JWT اگر User.is_ops_staff باشد"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+
+        try:
+            result = JWTAuthentication().authenticate(request)
+        except Exception:
+            return None
+        user = result[0] if result else None
+    if user is None or not user.is_authenticated or not user.is_ops_staff:
+        return None
+    return user
+
+
+# ─── profilerها ─────────────────────────────────────────────────
+
+def _frame_label(frame, roots):
+    code = frame.f_code
+    filename = code.co_filename
+    for root in roots:
+        if filename.startswith(root):
+            filename = filename[len(root):].lstrip(os.sep)
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """نمونه‌برداری از stack یک thread از thread دیگر؛ خروجی folded stacks"""
+
+    def __init__(self, thread_id, interval):
+        from django.conf import settings
+
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        # مسیرها کوتاه نمایش داده می‌شوند: پروژه و site-packages
+        self._roots = sorted(
+            {str(settings.BASE_DIR), *(path for path in sys.path if path.endswith('site-packages'))},
+            key=len, reverse=True,
+        )
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame, self._roots))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def result(self):
+        folded = '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
+        return {'samples': self.samples, 'interval_s': self.interval, 'folded': folded}
+
+
+class DeterministicProfiler:
+    """
+    cProfile؛ خروجی pstats (marshal) و جدول توابع پرهزینه
+    نمونه فقط بعد از acquire() ساخته می‌شود و قفل process را در خروج آزاد می‌کند.
+    """
+    _lock = threading.Lock()
+
+    @classmethod
+    def acquire(cls):
+        """قفل cProfile این process بدون انتظار؛ False یعنی درخواست دیگری profile می‌شود"""
+        return cls._lock.acquire(blocking=False)
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        try:
+            self.profile.enable()
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.profile.disable()
+        finally:
+            self._lock.release()
+
+    def result(self):
+        output = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=output)
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        self.profile.create_stats()
+        return {'pstats': marshal.dumps(self.profile.stats), 'top': output.getvalue()}
+
+
+class SQLTrace:
+    """execute_wrapper: متن و زمان هر query به ترتیب اجرا"""
+
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    'alias': context['connection'].alias,
+                    'ms': round(elapsed * 1000, 3),
+                    'many': many,
+                    'sql': sql[:STATEMENT_CHARS],
+                })
+
+    def repeated(self, limit=10):
+        counts = Counter(query['sql'] for query in self.queries)
+        return [{'count': count, 'sql': sql} for sql, count in counts.most_common(limit) if count > 1]
+
+
+# ─── ذخیره ──────────────────────────────────────────────────────
+
+def _store(profile):
+    namespace = _namespace()
+    namespace.set('item', profile['id'], value=profile, timeout=PROFILE_TTL)
+    summary = {key: profile[key] for key in (
+        'id', 'created_at', 'mode', 'method', 'path', 'status', 'user_id', 'total_ms', 'db_ms', 'queries',
+    )}
+    index = namespace.get('index') or []
+    keep = _setting('PROFILE_KEEP', DEFAULT_KEEP)
+    namespace.set('index', value=[summary, *index][:keep], timeout=PROFILE_TTL)
+
+
+def recent():
+    """خلاصه آخرین profileها (جدیدترین اول)"""
+    return _namespace().get('index') or []
+
+
+def get(profile_id):
+    return _namespace().get('item', profile_id)
+
+
+class ProfilingMiddleware:
+    """
+    بعد از AuthenticationMiddleware؛ فقط درخواست‌های علامت‌خورده کارکنان فنی
+    profile می‌شوند.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        user = staff_user(request)
+        if user is None:
+            return self.get_response(request)
+        return self._profile(request, mode, user)
+
+    def _profile(self, request, mode, user):
+        from contextlib import ExitStack
+        from django.db import connections
+        from django.utils import timezone
+
+        requested = mode
+        if mode == 'cprofile' and DeterministicProfiler.acquire():
+            profiler = DeterministicProfiler()
+        else:
+            mode = 'sample'
+            profiler = Sampler(
+                threading.get_ident(), _setting('PROFILE_SAMPLE_INTERVAL', DEFAULT_SAMPLE_INTERVAL)
+            )
+        trace = SQLTrace()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            # اول profiler تا قفل cProfile در هر حالتی آزاد شود
+            stack.enter_context(profiler)
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(trace))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        profile = {
+            'id': uuid.uuid4().hex[:12],
+            'created_at': timezone.now().isoformat(),
+            'mode': mode,
+            'requested_mode': requested,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user_id': user.pk,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(trace.seconds * 1000, 2),
+            'queries': trace.count,
+            'repeated_sql': trace.repeated(),
+            'sql': trace.queries,
+            **profiler.result(),
+        }
+        try:
+            _store(profile)
+        except Exception:
+            logger.warning('storing request profile failed', exc_info=True)
+            return response
+        response['X-Profile-Id'] = profile['id']
+        return response
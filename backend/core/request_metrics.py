@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+اندازه‌گیری هر درخواست: تعداد و زمان queryها، زمان Python و اندازه پاسخ
+
+- RequestMetricsMiddleware با connection.execute_wrapper روی همه aliasها
+  (default و replica) queryها را می‌شمارد؛ هزینه آن برای هر query یک
+  perf_counter و یک جمع در dict است.
+- آمار هر route (الگوی url، نه مسیر واقعی؛ برای تعداد محدود کلیدها) در حافظه
+  همان worker با histogram ثابت جمع می‌شود و هر REQUEST_METRICS_FLUSH_SECONDS
+  یک بار در cache مشترک (core/cache_tier.py) نوشته می‌شود. snapshot() آمار
+  همه workerها را با هم جمع می‌کند (endpoint مدیریتی در accounts/views.py).
+- درخواست کند (بیش از REQUEST_SLOW_MS یا REQUEST_SLOW_QUERIES query) با
+  پرتکرارترین statementهایش در log می‌آید؛ N+1 همان statement با تعداد بالاست.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+logger = logging.getLogger(__name__)
+
+# مرز بالای bucketها؛ آخری برای بیشتر از همه است
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+DEFAULT_SLOW_MS = 1000
+DEFAULT_SLOW_QUERIES = 50
+DEFAULT_FLUSH_SECONDS = 10
+TOP_STATEMENTS = 5
+STATEMENT_CHARS = 300
+UNRESOLVED_ROUTE = '<unresolved>'
+
+
+def _setting(name, default):
+    from django.conf import settings
+
+    return getattr(settings, name, default)
+
+
+def _bucket(bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+def _snapshots():
+    from core.cache_tier import WorkerSnapshots
+
+    return WorkerSnapshots('request_metrics')
+
+
+class QueryTrace:
+    """execute_wrapper: تعداد، زمان و تکرار هر statement در یک درخواست"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            entry = self.statements.get(sql)
+            if entry is None:
+                self.statements[sql] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def top(self, limit=TOP_STATEMENTS):
+        """[(تعداد، میلی‌ثانیه، sql)] به ترتیب تکرار و بعد زمان"""
+        ranked = sorted(self.statements.items(), key=lambda item: (item[1][0], item[1][1]), reverse=True)
+        return [(count, round(seconds * 1000, 2), sql[:STATEMENT_CHARS]) for sql, (count, seconds) in ranked[:limit]]
+
+
+def _empty_stats():
+    return {
+        'count': 0,
+        'errors': 0,
+        'queries': 0,
+        'db_ms': 0.0,
+        'python_ms': 0.0,
+        'total_ms': 0.0,
+        'bytes': 0,
+        'max_ms': 0.0,
+        'max_queries': 0,
+        'latency_buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        'query_buckets': [0] * (len(QUERY_BUCKETS) + 1),
+    }
+
+
+def _merge(target, stats):
+    for name in ('count', 'errors', 'queries', 'db_ms', 'python_ms', 'total_ms', 'bytes'):
+        target[name] += stats[name]
+    target['max_ms'] = max(target['max_ms'], stats['max_ms'])
+    target['max_queries'] = max(target['max_queries'], stats['max_queries'])
+    for name in ('latency_buckets', 'query_buckets'):
+        target[name] = [a + b for a, b in zip(target[name], stats[name])]
+
+
+class RouteStats:
+    """آمار تجمعی routeها در همین process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._flushed_at = time.monotonic()
+
+    def record(self, route, status_code, queries, db_ms, total_ms, size):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = _empty_stats()
+            stats['count'] += 1
+            stats['errors'] += status_code >= 500
+            stats['queries'] += queries
+            stats['db_ms'] += db_ms
+            stats['python_ms'] += total_ms - db_ms
+            stats['total_ms'] += total_ms
+            stats['bytes'] += size
+            stats['max_ms'] = max(stats['max_ms'], total_ms)
+            stats['max_queries'] = max(stats['max_queries'], queries)
+            stats['latency_buckets'][_bucket(LATENCY_BUCKETS_MS, total_ms)] += 1
+            stats['query_buckets'][_bucket(QUERY_BUCKETS, queries)] += 1
+
+    def copy(self):
+        with self._lock:
+            return {route: {**stats, 'latency_buckets': list(stats['latency_buckets']),
+                            'query_buckets': list(stats['query_buckets'])}
+                    for route, stats in self._routes.items()}
+
+    def flush(self, force=False):
+        """snapshot این worker در cache مشترک؛ بدون force حداکثر هر FLUSH_SECONDS یک بار"""
+        now = time.monotonic()
+        if not force and now - self._flushed_at < _setting('REQUEST_METRICS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS):
+            return
+        self._flushed_at = now
+        try:
+            _snapshots().publish(self.copy())
+        except Exception:
+            logger.warning('request metrics flush failed', exc_info=True)
+
+
+stats = RouteStats()
+
+
+def _percentile(bounds, buckets, pct):
+    """مرز بالای bucketی که صدک در آن است (None یعنی بیشتر از آخرین مرز)"""
+    total = sum(buckets)
+    if not total:
+        return 0
+    threshold = total * pct / 100
+    running = 0
+    for index, count in enumerate(buckets):
+        running += count
+        if running >= threshold:
+            return bounds[index] if index < len(bounds) else None
+    return None
+
+
+def _summary(route_stats):
+    count = route_stats['count'] or 1
+    latency = route_stats['latency_buckets']
+    return {
+        'count': route_stats['count'],
+        'errors': route_stats['errors'],
+        'avg_queries': round(route_stats['queries'] / count, 2),
+        'max_queries': route_stats['max_queries'],
+        'avg_db_ms': round(route_stats['db_ms'] / count, 2),
+        'avg_python_ms': round(route_stats['python_ms'] / count, 2),
+        'avg_ms': round(route_stats['total_ms'] / count, 2),
+        'max_ms': round(route_stats['max_ms'], 2),
+        'p50_ms': _percentile(LATENCY_BUCKETS_MS, latency, 50),
+        'p95_ms': _percentile(LATENCY_BUCKETS_MS, latency, 95),
+        'p99_ms': _percentile(LATENCY_BUCKETS_MS, latency, 99),
+        'p95_queries': _percentile(QUERY_BUCKETS, route_stats['query_buckets'], 95),
+        'avg_bytes': round(route_stats['bytes'] / count),
+        'total_db_ms': round(route_stats['db_ms'], 2),
+        'latency_histogram': dict(zip([*map(str, LATENCY_BUCKETS_MS), 'inf'], latency)),
+        'query_histogram': dict(zip([*map(str, QUERY_BUCKETS), 'inf'], route_stats['query_buckets'])),
+    }
+
+
+SORT_KEYS = {
+    'total_db_ms': lambda item: item['total_db_ms'],
+    'avg_queries': lambda item: item['avg_queries'],
+    'avg_ms': lambda item: item['avg_ms'],
+    'count': lambda item: item['count'],
+}
+
+
+def snapshot(sort='total_db_ms'):
+    """آمار همه workerها؛ routeها به ترتیب sort (نزولی)"""
+    stats.flush(force=True)
+    merged = {}
+    alive = []
+    for worker, worker_stats in _snapshots().all():
+        alive.append(worker)
+        for route, route_stats in worker_stats.items():
+            _merge(merged.setdefault(route, _empty_stats()), route_stats)
+    routes = [{'route': route, **_summary(route_stats)} for route, route_stats in merged.items()]
+    routes.sort(key=SORT_KEYS.get(sort, SORT_KEYS['total_db_ms']), reverse=True)
+    return {
+        'workers': alive,
+        'latency_buckets_ms': list(LATENCY_BUCKETS_MS),
+        'query_buckets': list(QUERY_BUCKETS),
+        'routes': routes,
+    }
+
+
+def reset():
+    """پاک کردن آمار همه workerها (آمار در حافظه بقیه workerها با flush بعدی برمی‌گردد)"""
+    _snapshots().clear()
+    with stats._lock:
+        stats._routes.clear()
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED_ROUTE
+    # الگوهای regex روتر DRF (^packages/$) بدون لنگرها
+    return f"{request.method} /{match.route.replace('^', '').replace('$', '')}"
+
+
+def _size(response):
+    if getattr(response, 'streaming', False):
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    """
+    تعداد و زمان queryها، زمان Python و اندازه پاسخ هر درخواست؛
+    با REQUEST_METRICS_ENABLED=False غیرفعال می‌شود.
+    """
+
+    def __init__(self, get_response):
+        from django.core.exceptions import MiddlewareNotUsed
+
+        if not _setting('REQUEST_METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = _setting('REQUEST_SLOW_MS', DEFAULT_SLOW_MS)
+        self.slow_queries = _setting('REQUEST_SLOW_QUERIES', DEFAULT_SLOW_QUERIES)
+
+    def __call__(self, request):
+        from django.db import connections
+
+        trace = QueryTrace()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(trace))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = trace.seconds * 1000
+        route = _route(request)
+        size = _size(response)
+
+        stats.record(route, response.status_code, trace.count, db_ms, total_ms, size)
+        if total_ms >= self.slow_ms or trace.count >= self.slow_queries:
+            logger.warning(
+                'slow request %s %s: %.0fms queries=%d db=%.0fms python=%.0fms bytes=%d\n%s',
+                route, request.get_full_path(), total_ms, trace.count, db_ms, total_ms - db_ms, size,
+                '\n'.join(f'  {count}x {ms}ms {sql}' for count, ms, sql in trace.top()),
+            )
+        stats.flush()
+        return response
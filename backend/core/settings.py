@@ -15,6 +15,8 @@ import os
 from dotenv import load_dotenv
 from datetime import timedelta
 
+from core.cache_tier import build_caches
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -101,10 +103,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.request_metrics.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.db_router.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -134,13 +139,59 @@ AUTH_USER_MODEL = 'accounts.User'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# SQLite production profile (core/sqlite_backend): WAL so readers don't block the writer,
+# BEGIN IMMEDIATE for atomic blocks so concurrent writers queue on busy_timeout instead of
+# failing with "database is locked". Measure with `manage.py benchmark_write_contention`.
+# WAL keeps db.sqlite3-wal/-shm next to the database file, so mount the directory
+# (not just the file) when the database lives on a volume.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '20000')),
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,  # KiB
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': SQLITE_PRAGMAS,
+        },
+        # a file, not shared-cache memory, so tests see WAL locking and busy_timeout
+        # like production (accounts/tests.py registers businesses from parallel threads)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Optional read replica (core/db_router.py): designated read-only views and batch reports
+# read from it, everything else (and every write) uses default. Users who wrote stay on
+# default for DATABASE_REPLICA_STICKY_SECONDS, which must exceed the replica lag.
+# Locally: DATABASE_REPLICA_NAME=replica.sqlite3 refreshed by `manage.py sync_replica`,
+# or a second PostgreSQL with DATABASE_REPLICA_ENGINE=django.db.backends.postgresql.
+if os.getenv('DATABASE_REPLICA_NAME'):
+    _replica_engine = os.getenv('DATABASE_REPLICA_ENGINE', DATABASES['default']['ENGINE'])
+    _replica_sqlite = _replica_engine == DATABASES['default']['ENGINE']
+    DATABASES['replica'] = {
+        'ENGINE': _replica_engine,
+        # a relative SQLite path is resolved against BASE_DIR, like db.sqlite3
+        'NAME': BASE_DIR / os.getenv('DATABASE_REPLICA_NAME') if _replica_sqlite
+        else os.getenv('DATABASE_REPLICA_NAME'),
+        'HOST': os.getenv('DATABASE_REPLICA_HOST', ''),
+        'PORT': os.getenv('DATABASE_REPLICA_PORT', ''),
+        'USER': os.getenv('DATABASE_REPLICA_USER', ''),
+        'PASSWORD': os.getenv('DATABASE_REPLICA_PASSWORD', ''),
+        'OPTIONS': (
+            {'pragmas': {**SQLITE_PRAGMAS, 'query_only': 'ON'}} if _replica_sqlite else {}
+        ),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', '60'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -183,6 +234,52 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media files are named by content hash and shared between fields (accounts/storage.py);
+# unreferenced blobs are removed by the gc_media_blobs command
+STORAGES = {
+    'default': {
+        'BACKEND': 'accounts.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Uploads larger than this are streamed to a temp file instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 512 * 1024
+
+# Image variants (thumb/card/full) are generated in a process pool (accounts/image_pipeline.py)
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', '2'))
+IMAGE_PIPELINE_SYNC = os.getenv('IMAGE_PIPELINE_SYNC', 'False').lower() == 'true'
+
+# Shared cache tier (core/cache_tier.py): database (default; its table is created by
+# migration accounts/0011 or `manage.py createcachetable`; add is atomic, incr is a
+# get+set and needs an atomic block, see packages/llm_guard.py), redis (REDIS_URL, needs the
+# redis package), file (add/incr are not atomic, so locks and rate limits are best-effort)
+# or locmem (per-process, for tests)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'database')
+CACHES = build_caches(CACHE_BACKEND, BASE_DIR, os.environ)
+
+# Per-request query count / DB time / Python time / response size, aggregated per route
+# across workers through the cache (core/request_metrics.py, /api/accounts/ops/request-metrics/).
+# Requests slower than REQUEST_SLOW_MS or with REQUEST_SLOW_QUERIES queries are logged with
+# their most repeated SQL statements.
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'True').lower() == 'true'
+REQUEST_SLOW_MS = int(os.getenv('REQUEST_SLOW_MS', '1000'))
+REQUEST_SLOW_QUERIES = int(os.getenv('REQUEST_SLOW_QUERIES', '50'))
+REQUEST_METRICS_FLUSH_SECONDS = int(os.getenv('REQUEST_METRICS_FLUSH_SECONDS', '10'))
+
+# Prometheus metrics for loyalty, package, SMS and Groq events (core/metrics.py), summed
+# across workers through the cache (each worker writes at most every METRICS_FLUSH_SECONDS)
+# and served at /metrics to these addresses only
+METRICS_FLUSH_SECONDS = int(os.getenv('METRICS_FLUSH_SECONDS', '10'))
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+
+# On-demand profiling (core/profiling.py): staff send `X-Profile: sample|cprofile` or
+# ?_profile=1; the profile and SQL trace are kept in the cache, listed at /api/accounts/ops/profiles/
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+backend SQLite پروژه: همان django.db.backends.sqlite3 با دو گزینه اضافه در OPTIONS
+
+- pragmas: {نام: مقدار} که روی هر اتصال جدید اجرا می‌شود (journal_mode=WAL،
+  synchronous، busy_timeout، mmap_size، cache_size ...)
+- transaction_mode: حالت BEGIN برای transaction.atomic (DEFERRED / IMMEDIATE /
+  EXCLUSIVE). با IMMEDIATE هر atomic قفل نوشتن را از ابتدا می‌گیرد؛ در حالت
+  DEFERRED تراکنشی که اول می‌خواند و بعد می‌نویسد هنگام ارتقای قفل بلافاصله
+  "database is locked" می‌گیرد و busy_timeout کمکی نمی‌کند.
+
+(Django 5.1 گزینه transaction_mode و init_command را خودش دارد؛ با ارتقا این
+backend را می‌شود با OPTIONS همان نسخه جایگزین کرد)
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+EXTRA_OPTIONS = ('pragmas', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _option(self, name, default=None):
+        return self.settings_dict['OPTIONS'].get(name, default)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for name in EXTRA_OPTIONS:
+            params.pop(name, None)
+        mode = self._option('transaction_mode')
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}"
+            )
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in (self._option('pragmas') or {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self._option('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode.upper()}' if mode else 'BEGIN')
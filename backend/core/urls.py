@@ -19,11 +19,15 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/accounts/', include('accounts.urls')),
     path('api/packages/', include('packages.urls')),
     path('api/loyalty/', include('loyalty.urls')),
+    # Prometheus scrape endpoint (local only, see core/metrics.py)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files during development
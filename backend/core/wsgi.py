@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# index حافظه‌ای typeahead هر worker قبل از اولین درخواست ساخته شود
+if os.environ.get('TYPEAHEAD_WARM', '1') == '1':
+    from packages.typeahead import warm
+    warm()
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import CustomerLoyalty, Transaction, EliteGiftClaim, PointsEvent, CustomerFavorite
+from .comment_cleanup import delete_transactions
 
 
 @admin.register(PointsEvent)
@@ -49,6 +50,10 @@ class TransactionAdmin(admin.ModelAdmin):
         }),
     )
 
+    def delete_queryset(self, request, queryset):
+        """حذف گروهی: نظرات همه تراکنش‌های انتخاب شده با یک DELETE"""
+        delete_transactions(queryset)
+
 
 @admin.register(EliteGiftClaim)
 class EliteGiftClaimAdmin(admin.ModelAdmin):
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+حذف نظرات مرتبط با تراکنش‌ها به صورت مجموعه‌ای
+
+نظر مشتری روی اجزای پکیج (DiscountAll / SpecificDiscount / EliteGift / VipExperience)
+یا مستقیم روی Transaction ذخیره می‌شود. به جای یک DELETE برای هر جزء و هر تراکنش،
+همه نظرات مرتبط با یک queryset از تراکنش‌ها با یک DELETE (با EXISTS روی تراکنش‌ها)
+حذف می‌شوند؛ تعداد کوئری‌ها به تعداد تراکنش‌ها بستگی ندارد.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction as db_transaction
+from django.db.models import Exists, OuterRef, Q
+
+
+def _component_lookups():
+    """جزء پکیج → مسیر lookup از Transaction به id آن جزء"""
+    from packages.models import DiscountAll, SpecificDiscount, EliteGift, VipExperience
+
+    return {
+        DiscountAll: 'package__discount_all__id',
+        SpecificDiscount: 'package__specific_discount__id',
+        EliteGift: 'package__elite_gift__id',
+        VipExperience: 'package__experiences__id',
+    }
+
+
+def all_package_comments():
+    """queryset همه نظرات روی اجزای پکیج و تراکنش‌ها (بدون محدود کردن به تراکنش خاص)"""
+    from packages.models import Comment
+    from .models import Transaction
+
+    content_types = ContentType.objects.get_for_models(Transaction, *_component_lookups())
+    return Comment.objects.filter(content_type__in=content_types.values())
+
+
+def transaction_comments(transactions):
+    """
+    queryset نظرات مرتبط با تراکنش‌های داده شده:
+    نظرات همان مشتری روی اجزای پکیج تراکنش + نظرات ثبت شده روی خود تراکنش
+    """
+    from packages.models import Comment
+    from .models import Transaction
+
+    component_lookups = _component_lookups()
+    content_types = ContentType.objects.get_for_models(Transaction, *component_lookups)
+
+    transactions = transactions.order_by()
+    condition = Q(
+        content_type=content_types[Transaction],
+        object_id__in=transactions.values('pk'),
+    )
+    for model, lookup in component_lookups.items():
+        condition |= Q(content_type=content_types[model]) & Exists(
+            transactions.filter(customer_id=OuterRef('user_id'), **{lookup: OuterRef('object_id')})
+        )
+    return Comment.objects.filter(condition)
+
+
+def _delete_comments(comments):
+    from packages.models import Comment
+
+    _, per_model = comments.delete()
+    return per_model.get(Comment._meta.label, 0)
+
+
+def delete_transaction_comments(transactions):
+    """
+    حذف همه نظرات مرتبط با queryset تراکنش‌ها
+    خروجی: تعداد نظرات حذف شده
+    """
+    return _delete_comments(transaction_comments(transactions))
+
+
+def delete_all_package_comments():
+    """حذف همه نظرات اجزای پکیج و تراکنش‌ها با یک DELETE؛ خروجی: تعداد"""
+    return _delete_comments(all_package_comments())
+
+
+def delete_transactions(transactions):
+    """
+    حذف گروهی تراکنش‌ها همراه با نظراتشان (مثلاً حذف گروهی ادمین)
+    سیگنال pre_delete با دیدن پرچم _comments_deleted دوباره نظرات را حذف نمی‌کند.
+    """
+    with db_transaction.atomic():
+        delete_transaction_comments(transactions)
+        transactions._comments_deleted = True
+        return transactions.delete()
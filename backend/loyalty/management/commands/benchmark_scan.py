@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+management command: benchmark_scan
+اندازه‌گیری زمان پاسخ مسیر اسکن QR (business-by-code) در حالت cache سرد و گرم
+
+داده‌های آزمایشی داخل یک transaction ساخته می‌شوند و در پایان rollback می‌شوند،
+پس روی دیتابیس اثری باقی نمی‌ماند.
+"""
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'بنچمارک مسیر اسکن QR (business-by-code) با cache سرد و گرم'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='تعداد درخواست‌ها در هر حالت'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        try:
+            with transaction.atomic():
+                self._run(iterations)
+                raise _Rollback
+        except _Rollback:
+            pass
+        cache.clear()
+
+    def _run(self, iterations):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from accounts.models import User, BusinessProfile, CustomerProfile
+        from packages.models import Package, DiscountAll, EliteGift
+        from loyalty.models import CustomerLoyalty, Transaction
+        from loyalty.views import get_business_by_code
+
+        today = timezone.now().date()
+        business_user = User.objects.create(
+            username='bench_scan_business', phone_number='09000000001', role='business'
+        )
+        business = BusinessProfile.objects.create(user=business_user, name='بنچمارک')
+        customer_user = User.objects.create(
+            username='bench_scan_customer', phone_number='09000000002', role='customer'
+        )
+        customer = CustomerProfile.objects.create(user=customer_user)
+
+        package = Package(
+            business=business,
+            start_date=today - timedelta(days=10),
+            end_date=today + timedelta(days=20),
+            status='approved',
+        )
+        package._signal_processing = True
+        package.save()
+        DiscountAll.objects.create(package=package, percentage=10)
+        EliteGift.objects.create(package=package, gift='قهوه رایگان', amount=500000, count=5)
+        Package.objects.filter(pk=package.pk).update(is_active=True)
+
+        loyalty = CustomerLoyalty.objects.create(customer=customer, business=business)
+        Transaction.objects.bulk_create([
+            Transaction(
+                customer=customer,
+                business=business,
+                package=package,
+                loyalty=loyalty,
+                original_amount=100000,
+                final_amount=90000,
+                status='approved',
+            )
+            for _ in range(20)
+        ])
+
+        factory = APIRequestFactory()
+
+        def call():
+            request = factory.get('/loyalty/business-by-code/', {'code': business.unique_code})
+            force_authenticate(request, user=customer_user)
+            start = time.perf_counter()
+            response = get_business_by_code(request)
+            elapsed = (time.perf_counter() - start) * 1000
+            assert response.status_code == 200, response.data
+            return elapsed
+
+        results = {}
+        for mode in ('cold', 'warm'):
+            cache.clear()
+            if mode == 'warm':
+                call()
+            samples = []
+            with CaptureQueriesContext(connection) as ctx:
+                for _ in range(iterations):
+                    if mode == 'cold':
+                        cache.clear()
+                    samples.append(call())
+            results[mode] = (samples, len(ctx.captured_queries) / iterations)
+
+        self.stdout.write(f'iterations: {iterations}')
+        for mode, (samples, queries) in results.items():
+            self.stdout.write(
+                f'{mode:>5}: p50={_percentile(samples, 50):.2f}ms '
+                f'p99={_percentile(samples, 99):.2f}ms '
+                f'queries/request={queries:.1f}'
+            )
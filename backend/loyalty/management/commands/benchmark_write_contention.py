@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+management command: benchmark_write_contention
+اندازه‌گیری throughput نوشتن هم‌زمان روی SQLite: چند process (مثل workerهای
+gunicorn) هم‌زمان تراکنش (loyalty.Transaction) می‌سازند و تایید می‌کنند.
+
+دو پروفایل اتصال مقایسه می‌شوند:
+- before: پیش‌فرض Django (journal_mode=DELETE، synchronous=FULL، BEGIN
+  DEFERRED، timeout پنج ثانیه)
+- after: پروفایل settings (SQLITE_PRAGMAS با WAL و BEGIN IMMEDIATE)
+
+روی کپی دیتابیس در یک پوشه موقت اجرا می‌شود (backup API خود SQLite)، پس
+دیتابیس اصلی دست نمی‌خورد. به fork نیاز دارد (لینوکس).
+"""
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+PROFILES = {
+    'before': {'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'}, 'timeout': 5},
+    'after': {'pragmas': settings.SQLITE_PRAGMAS, 'transaction_mode': 'IMMEDIATE'},
+}
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _use_database(path, options):
+    """اتصال default این process را به فایل و پروفایل داده شده می‌برد"""
+    connection = connections['default']
+    connection.close()
+    connection.settings_dict['NAME'] = path
+    connection.settings_dict['OPTIONS'] = dict(options)
+
+
+def _seed(workers):
+    """یک کسب‌وکار با پکیج فعال و برای هر worker یک مشتری؛ خروجی: [(customer, loyalty), ...]"""
+    from datetime import timedelta
+    from django.utils import timezone
+    from accounts.models import BusinessProfile, CustomerProfile, User
+    from loyalty.models import CustomerLoyalty
+    from packages.models import DiscountAll, Package
+
+    today = timezone.now().date()
+    business_user = User.objects.create(
+        username='bench_write_business', phone_number='09000000101', role='business'
+    )
+    business = BusinessProfile.objects.create(user=business_user, name='بنچمارک نوشتن')
+    package = Package(
+        business=business,
+        start_date=today - timedelta(days=1),
+        end_date=today + timedelta(days=30),
+        status='approved',
+    )
+    package._signal_processing = True
+    package.save()
+    DiscountAll.objects.create(package=package, percentage=10)
+    Package.objects.filter(pk=package.pk).update(is_active=True)
+
+    pairs = []
+    for index in range(workers):
+        user = User.objects.create(
+            username=f'bench_write_customer_{index}',
+            phone_number=f'0900000{index + 200:04d}',
+            role='customer',
+        )
+        customer = CustomerProfile.objects.create(user=user)
+        loyalty = CustomerLoyalty.objects.create(customer=customer, business=business)
+        pairs.append((customer.pk, loyalty.pk))
+    return business.pk, package.pk, pairs
+
+
+def _worker(path, options, business_id, package_id, customer_id, loyalty_id, seconds, barrier, results):
+    from loyalty.models import Transaction
+
+    _use_database(path, options)
+    latencies = []
+    errors = 0
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            item = Transaction.objects.create(
+                customer_id=customer_id,
+                business_id=business_id,
+                package_id=package_id,
+                loyalty_id=loyalty_id,
+                original_amount=100000,
+                final_amount=90000,
+            )
+            item.approve()
+        except OperationalError:
+            # database is locked
+            errors += 1
+            connections['default'].close()
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+    connections['default'].close()
+    results.put((latencies, errors))
+
+
+class Command(BaseCommand):
+    help = 'بنچمارک نوشتن هم‌زمان (ساخت و تایید تراکنش) با پروفایل پیش‌فرض و WAL/IMMEDIATE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='تعداد process های هم‌زمان')
+        parser.add_argument('--seconds', type=float, default=5.0, help='مدت هر اجرا')
+        parser.add_argument('--profile', choices=['both', *PROFILES], default='both')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            raise CommandError('این بنچمارک فقط برای SQLite است')
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('این بنچمارک به fork نیاز دارد')
+
+        original = (connection.settings_dict['NAME'], dict(connection.settings_dict['OPTIONS']))
+        profiles = list(PROFILES) if options['profile'] == 'both' else [options['profile']]
+        workers = options['workers']
+        seconds = options['seconds']
+        self.stdout.write(f'workers={workers} seconds={seconds}')
+        with tempfile.TemporaryDirectory(prefix='faydo_bench_') as directory:
+            try:
+                for name in profiles:
+                    self._run(
+                        name, original[0], os.path.join(directory, f'{name}.sqlite3'), workers, seconds,
+                    )
+            finally:
+                _use_database(*original)
+
+    def _copy_database(self, source_path, path):
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+    def _run(self, name, source_path, path, workers, seconds):
+        self._copy_database(source_path, path)
+        profile = PROFILES[name]
+        _use_database(path, profile)
+        business_id, package_id, pairs = _seed(workers)
+        journal = connections['default'].cursor().execute('PRAGMA journal_mode').fetchone()[0]
+        connections['default'].close()
+
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(workers)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_worker,
+                args=(path, profile, business_id, package_id, customer_id, loyalty_id,
+                      seconds, barrier, results),
+            )
+            for customer_id, loyalty_id in pairs
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        latencies = [value for samples, _ in collected for value in samples]
+        errors = sum(count for _, count in collected)
+        # هر عملیات دو transaction نوشتنی دارد: ساخت و تایید
+        self.stdout.write(
+            f'{name:>6} (journal={journal}): ops={len(latencies)} '
+            f'write_tx/s={2 * len(latencies) / seconds:.1f} locked_errors={errors} '
+            f'p50={_percentile(latencies, 50):.1f}ms p99={_percentile(latencies, 99):.1f}ms'
+        )
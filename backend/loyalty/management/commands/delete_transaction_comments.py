@@ -1,60 +1,41 @@
 from django.core.management.base import BaseCommand
-from django.contrib.contenttypes.models import ContentType
-from packages.models import Comment, DiscountAll, SpecificDiscount, EliteGift, VipExperience
 from loyalty.models import Transaction
+from loyalty.comment_cleanup import delete_all_package_comments, delete_transaction_comments
 
 
 class Command(BaseCommand):
     help = 'حذف تمام نظرات مربوط به پکیج‌ها (که از طریق تراکنش‌ها ثبت شده‌اند)'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--business-id',
+            type=int,
+            default=None,
+            help='فقط نظرات تراکنش‌های یک کسب‌وکار خاص (id)'
+        )
+        parser.add_argument(
+            '--customer-id',
+            type=int,
+            default=None,
+            help='فقط نظرات تراکنش‌های یک مشتری خاص (id)'
+        )
+
     def handle(self, *args, **options):
-        total_deleted = 0
-        
-        # Delete comments on DiscountAll
-        discount_all_ct = ContentType.objects.get_for_model(DiscountAll)
-        discount_all_comments = Comment.objects.filter(content_type=discount_all_ct)
-        count = discount_all_comments.count()
-        if count > 0:
-            discount_all_comments.delete()
-            total_deleted += count
-            self.stdout.write(f'  حذف {count} نظر از DiscountAll')
-        
-        # Delete comments on SpecificDiscount
-        specific_discount_ct = ContentType.objects.get_for_model(SpecificDiscount)
-        specific_discount_comments = Comment.objects.filter(content_type=specific_discount_ct)
-        count = specific_discount_comments.count()
-        if count > 0:
-            specific_discount_comments.delete()
-            total_deleted += count
-            self.stdout.write(f'  حذف {count} نظر از SpecificDiscount')
-        
-        # Delete comments on EliteGift
-        elite_gift_ct = ContentType.objects.get_for_model(EliteGift)
-        elite_gift_comments = Comment.objects.filter(content_type=elite_gift_ct)
-        count = elite_gift_comments.count()
-        if count > 0:
-            elite_gift_comments.delete()
-            total_deleted += count
-            self.stdout.write(f'  حذف {count} نظر از EliteGift')
-        
-        # Delete comments on VipExperience
-        vip_experience_ct = ContentType.objects.get_for_model(VipExperience)
-        vip_experience_comments = Comment.objects.filter(content_type=vip_experience_ct)
-        count = vip_experience_comments.count()
-        if count > 0:
-            vip_experience_comments.delete()
-            total_deleted += count
-            self.stdout.write(f'  حذف {count} نظر از VipExperience')
-        
-        # Delete comments on Transaction (if any)
-        transaction_ct = ContentType.objects.get_for_model(Transaction)
-        transaction_comments = Comment.objects.filter(content_type=transaction_ct)
-        count = transaction_comments.count()
-        if count > 0:
-            transaction_comments.delete()
-            total_deleted += count
-            self.stdout.write(f'  حذف {count} نظر از Transaction')
-        
+        business_id = options.get('business_id')
+        customer_id = options.get('customer_id')
+
+        if business_id or customer_id:
+            transactions = Transaction.objects.all()
+            if business_id:
+                transactions = transactions.filter(business_id=business_id)
+            if customer_id:
+                transactions = transactions.filter(customer_id=customer_id)
+            # نظرات مرتبط با همین تراکنش‌ها (اجزای پکیج + خود تراکنش) با یک DELETE
+            total_deleted = delete_transaction_comments(transactions)
+        else:
+            # بدون فیلتر: همه نظرات اجزای پکیج و تراکنش‌ها، حتی بدون تراکنش مرتبط
+            total_deleted = delete_all_package_comments()
+
         if total_deleted == 0:
             self.stdout.write(
                 self.style.WARNING('هیچ نظری یافت نشد.')
@@ -417,40 +417,58 @@ class Transaction(BaseModel):
     def approve(self):
         """
         تایید تراکنش، ثبت امتیاز از طریق PointsService
+        همه نوشتن‌ها در یک transaction (BEGIN IMMEDIATE روی SQLite)؛ وضعیت بعد از
+        گرفتن قفل دوباره خوانده می‌شود تا دو تایید هم‌زمان فقط یک بار امتیاز بدهند.
         """
+        from django.db import transaction as db_transaction
         from django.utils import timezone
         from datetime import timedelta
+        from core import metrics
         from loyalty import services as pts_svc
 
         if self.status == 'approved':
             return
 
-        self.status = 'approved'
+        with metrics.TRANSACTION_SECONDS.time(action='approve'), db_transaction.atomic():
+            if self.pk and type(self).objects.filter(pk=self.pk, status='approved').exists():
+                self.status = 'approved'
+                return
 
-        # امتیازدهی از طریق سرویس (شامل اول/تکراری، تولد، ...)
-        try:
-            customer_profile = self.customer
-            earned = pts_svc.award_purchase(customer_profile, self)
-            self.points_earned = earned
-            # هم در loyalty قدیمی هم در CustomerProfile ثبت می‌شود
-            self.loyalty.add_points(earned)
-        except Exception:
-            # fallback به محاسبه قدیمی در صورت خطا
-            self.points_earned = self.calculate_points()
-            self.loyalty.add_points(self.points_earned)
-
-        # فعال کردن امکان کامنت‌گذاری برای 12 ساعت
-        self.can_comment = True
-        self.comment_deadline = timezone.now() + timedelta(hours=12)
+            self.status = 'approved'
 
-        self.save()
+            # امتیازدهی از طریق سرویس (شامل اول/تکراری، تولد، ...)؛ savepoint تا
+            # نوشتن‌های نیمه‌کاره سرویس در صورت خطا برگردانده شوند
+            try:
+                with db_transaction.atomic():
+                    customer_profile = self.customer
+                    earned = pts_svc.award_purchase(customer_profile, self)
+                    self.points_earned = earned
+                    # هم در loyalty قدیمی هم در CustomerProfile ثبت می‌شود
+                    self.loyalty.add_points(earned)
+            except Exception:
+                # fallback به محاسبه قدیمی در صورت خطا
+                self.points_earned = self.calculate_points()
+                self.loyalty.add_points(self.points_earned)
+
+            # فعال کردن امکان کامنت‌گذاری برای 12 ساعت
+            self.can_comment = True
+            self.comment_deadline = timezone.now() + timedelta(hours=12)
+
+            self.save()
+            db_transaction.on_commit(lambda: metrics.TRANSACTIONS.inc(action='approve'))
 
     def reject(self):
         """
         رد تراکنش
         """
-        self.status = 'rejected'
-        self.save()
+        from django.db import transaction as db_transaction
+        from core import metrics
+
+        with metrics.TRANSACTION_SECONDS.time(action='reject'):
+            self.status = 'rejected'
+            self.save()
+        # مثل approve: فقط اگر transaction بیرونی commit شود شمرده می‌شود
+        db_transaction.on_commit(lambda: metrics.TRANSACTIONS.inc(action='reject'))
     
     def can_add_comment(self):
         """
@@ -480,13 +498,21 @@ class Transaction(BaseModel):
         """
         محاسبه خودکار مبالغ قبل از ذخیره
         """
-        if not self.pk:  # فقط برای تراکنش‌های جدید
+        from django.db import transaction as db_transaction
+        from core import metrics
+
+        if self.pk:
+            super().save(*args, **kwargs)
+            return
+
+        # فقط برای تراکنش‌های جدید
+        with metrics.TRANSACTION_SECONDS.time(action='create'):
             discount_all_amount, special_discount_amount = self.calculate_discount()
             self.discount_all_amount = discount_all_amount
             self.special_discount_amount = special_discount_amount
             self.final_amount = self.calculate_final_amount()
-        
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
+        db_transaction.on_commit(lambda: metrics.TRANSACTIONS.inc(action='create'))
 
 
 class EliteGiftClaim(BaseModel):
@@ -575,6 +601,8 @@ class EliteGiftClaim(BaseModel):
         تا سیستم نظردهی trigger شود
         """
         from django.utils import timezone
+        from django.db import transaction as db_transaction
+        from core import metrics
         
         if self.status != 'pending':
             raise ValueError('فقط درخواست‌های در انتظار قابل تایید هستند')
@@ -584,6 +612,7 @@ class EliteGiftClaim(BaseModel):
         if note:
             self.business_note = note
         self.save()
+        db_transaction.on_commit(lambda: metrics.ELITE_GIFT_CLAIMS.inc(action='approve'))
         
         # پیدا کردن یا ایجاد loyalty (CustomerLoyalty فقط customer و business دارد)
         loyalty, _ = CustomerLoyalty.objects.get_or_create(
@@ -615,17 +644,22 @@ class EliteGiftClaim(BaseModel):
         """
         if self.status != 'pending':
             raise ValueError('فقط درخواست‌های در انتظار قابل رد هستند')
+        from django.db import transaction as db_transaction
+        from core import metrics
         
         self.status = 'rejected'
         if note:
             self.business_note = note
         self.save()
+        db_transaction.on_commit(lambda: metrics.ELITE_GIFT_CLAIMS.inc(action='reject'))
     
     def mark_as_used(self):
         """
         علامت‌گذاری به عنوان استفاده شده
         """
         from django.utils import timezone
+        from django.db import transaction as db_transaction
+        from core import metrics
         
         if self.status != 'approved':
             raise ValueError('فقط هدایای تایید شده قابل استفاده هستند')
@@ -633,6 +667,7 @@ class EliteGiftClaim(BaseModel):
         self.status = 'used'
         self.used_at = timezone.now()
         self.save()
+        db_transaction.on_commit(lambda: metrics.ELITE_GIFT_CLAIMS.inc(action='use'))
 
 
 class CustomerFavorite(BaseModel):
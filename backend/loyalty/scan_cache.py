@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Cache مسیر اسکن QR در فروشگاه
+
+هر اسکن (get_business_by_code / verify_qr_code) قبلاً کسب‌وکار، پکیج فعال،
+اجزای پکیج و پیشرفت هدیه ویژه را مستقیم از دیتابیس می‌خواند.
+این ماژول سه لایه cache نگه می‌دارد:
+
+- snapshot: داده‌های کسب‌وکار + پکیج فعال بر اساس unique_code
+- profile: خروجی BusinessProfileSerializer برای verify_qr_code
+- progress: شمارنده‌های پیشرفت هدیه ویژه برای هر (مشتری، پکیج)
+
+ابطال از طریق سیگنال‌ها (loyalty/signals.py) و متدهای فعال‌سازی پکیج انجام
+می‌شود؛ profile به کاربر صاحب کسب‌وکار، دسته و باشگاه آن هم وابسته است و با
+تغییر آن‌ها هم باطل می‌شود. TTL فقط برای داده‌هایی است که سیگنال مستقیم ندارند (مثل امتیاز نظرات).
+"""
+from django.core.cache import cache
+
+SNAPSHOT_TTL = 300
+PROGRESS_TTL = 600
+MISSING_TTL = 30
+
+# برای cache کردن «کد وجود ندارد» بدون برخورد با None (= cache miss)
+_MISSING = 'missing'
+
+
+def _snapshot_key(code):
+    return f"scan_snapshot_{code}"
+
+
+def _profile_key(code):
+    return f"scan_profile_{code}"
+
+
+def _progress_key(customer_id, package_id):
+    return f"elite_progress_{customer_id}_{package_id}"
+
+
+def build_snapshot(business):
+    """ساخت snapshot قابل cache از کسب‌وکار و پکیج فعال آن"""
+    from accounts.image_pipeline import variant_url
+
+    package = (
+        business.packages.filter(is_active=True, status='approved')
+        .select_related('discount_all', 'specific_discount', 'elite_gift')
+        .first()
+    )
+
+    package_data = None
+    if package:
+        discount_all = package.discount_all if hasattr(package, 'discount_all') else None
+        specific = package.specific_discount if hasattr(package, 'specific_discount') else None
+        elite_gift = package.elite_gift if hasattr(package, 'elite_gift') else None
+        package_data = {
+            'id': package.id,
+            'has_dates': bool(package.start_date and package.end_date),
+            'discount_all_percentage': discount_all.percentage if discount_all else None,
+            'specific_discount': {
+                'title': specific.title,
+                'percentage': specific.percentage,
+            } if specific else None,
+            'elite_gift': {
+                'id': elite_gift.id,
+                'gift': elite_gift.gift,
+                'amount': elite_gift.amount,
+                'count': elite_gift.count,
+            } if elite_gift else None,
+        }
+
+    return {
+        'business_id': business.id,
+        'business_name': business.name,
+        'business_logo': variant_url(business.logo, business.logo_variants, 'thumb'),
+        'business_description': business.description or '',
+        'service_category': business.category.name if business.category else '',
+        'package': package_data,
+    }
+
+
+def get_scan_snapshot(code):
+    """
+    دریافت snapshot کسب‌وکار با unique_code
+    None یعنی کسب‌وکاری با این کد وجود ندارد.
+    """
+    from accounts.models import BusinessProfile
+
+    key = _snapshot_key(code)
+    snapshot = cache.get(key)
+    if snapshot == _MISSING:
+        return None
+    if snapshot is not None:
+        return snapshot
+
+    business = (
+        BusinessProfile.objects.select_related('category')
+        .filter(unique_code=code)
+        .first()
+    )
+    if business is None:
+        cache.set(key, _MISSING, MISSING_TTL)
+        return None
+
+    snapshot = build_snapshot(business)
+    cache.set(key, snapshot, SNAPSHOT_TTL)
+    return snapshot
+
+
+def get_cached_profile_data(code):
+    """
+    خروجی BusinessProfileSerializer (بدون request) برای verify_qr_code
+    None یعنی کسب‌وکاری با این کد وجود ندارد.
+    """
+    from accounts.models import BusinessProfile
+    from accounts.serializers import BusinessProfileSerializer
+
+    key = _profile_key(code)
+    data = cache.get(key)
+    if data == _MISSING:
+        return None
+    if data is not None:
+        return data
+
+    business = (
+        BusinessProfile.objects.select_related(
+            'user', 'category', 'category__club', 'city', 'city__province'
+        )
+        .filter(unique_code=code)
+        .first()
+    )
+    if business is None:
+        cache.set(key, _MISSING, MISSING_TTL)
+        return None
+
+    data = BusinessProfileSerializer(business).data
+    cache.set(key, data, SNAPSHOT_TTL)
+    return data
+
+
+def _get_counters(elite_gift, customer):
+    key = _progress_key(customer.pk, elite_gift.package_id)
+    counters = cache.get(key)
+    if counters is None:
+        counters = elite_gift.get_progress_counters(customer)
+        cache.set(key, counters, PROGRESS_TTL)
+    return counters
+
+
+def get_cached_progress(elite_gift, customer):
+    """
+    همان خروجی EliteGift.get_customer_progress ولی با شمارنده‌های cache شده
+    """
+    package = elite_gift.package
+    if not package.start_date or not package.end_date:
+        # این حالت بدون کوئری محاسبه می‌شود
+        return elite_gift.get_customer_progress(customer)
+    return elite_gift.build_progress(_get_counters(elite_gift, customer))
+
+
+def is_elite_gift_eligible(snapshot, customer):
+    """
+    بررسی واجد شرایط بودن مشتری برای هدیه ویژه پکیج فعال snapshot
+    فقط در cache miss شمارنده‌ها به دیتابیس می‌رود.
+    """
+    from packages.models import EliteGift
+
+    package_data = snapshot.get('package')
+    gift = package_data['elite_gift'] if package_data else None
+    if not gift or not package_data['has_dates']:
+        return False
+
+    counters = cache.get(_progress_key(customer.pk, package_data['id']))
+    if counters is None:
+        elite_gift = EliteGift.objects.select_related('package').get(pk=gift['id'])
+        counters = _get_counters(elite_gift, customer)
+
+    unsaved = EliteGift(amount=gift['amount'], count=gift['count'])
+    return unsaved.build_progress(counters).get('eligible', False)
+
+
+# ─── ابطال ───────────────────────────────────────────────────────
+
+def invalidate_code(code):
+    if code is None:
+        return
+    cache.delete_many([_snapshot_key(code), _profile_key(code)])
+
+
+def invalidate_codes(codes):
+    keys = []
+    for code in codes:
+        if code is not None:
+            keys += [_snapshot_key(code), _profile_key(code)]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate_businesses(**filters):
+    """ابطال snapshot همه کسب‌وکارهای منطبق (مثلاً category_id=... یا user_id=...)"""
+    from accounts.models import BusinessProfile
+
+    invalidate_codes(BusinessProfile.objects.filter(**filters).values_list('unique_code', flat=True))
+
+
+def invalidate_business(business_id):
+    """ابطال snapshot یک کسب‌وکار بر اساس شناسه"""
+    from accounts.models import BusinessProfile
+
+    if not business_id:
+        return
+    code = (
+        BusinessProfile.objects.filter(pk=business_id)
+        .values_list('unique_code', flat=True)
+        .first()
+    )
+    invalidate_code(code)
+
+
+def invalidate_package(package_id):
+    """ابطال snapshot کسب‌وکار صاحب یک پکیج"""
+    from packages.models import Package
+
+    if not package_id:
+        return
+    code = (
+        Package.objects.filter(pk=package_id)
+        .values_list('business__unique_code', flat=True)
+        .first()
+    )
+    invalidate_code(code)
+
+
+def invalidate_progress(customer_id, package_id):
+    if not customer_id or not package_id:
+        return
+    cache.delete(_progress_key(customer_id, package_id))
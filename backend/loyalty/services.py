@@ -4,7 +4,7 @@
 منطق کامل محاسبه و ثبت امتیاز بر اساس مستندات طراحی
 """
 from django.utils import timezone
-from django.db import transaction as db_transaction
+from django.db import models, transaction as db_transaction
 from django.db.models import Sum
 from datetime import timedelta, date
 
@@ -96,6 +96,7 @@ def _log_event(customer, event_type, points_delta, active_score_delta=0,
     """ثبت رویداد امتیازی و بروزرسانی CustomerProfile"""
     from loyalty.models import PointsEvent
     from django.db.models import F
+    from core import metrics
 
     PointsEvent.objects.create(
         customer=customer,
@@ -127,6 +128,14 @@ def _log_event(customer, event_type, points_delta, active_score_delta=0,
     # بروزرسانی سطح
     _recalculate_tier(customer)
 
+    def count_event():
+        metrics.POINTS_EVENTS.inc(event_type=event_type)
+        if points_delta > 0:
+            metrics.POINTS_AWARDED.inc(points_delta, event_type=event_type)
+
+    # رویدادی که rollback شود شمرده نمی‌شود
+    db_transaction.on_commit(count_event)
+
 
 def _recalculate_tier(customer):
     """بروزرسانی سطح مشتری بر اساس امتیاز 6 ماه اخیر"""
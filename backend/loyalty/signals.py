@@ -1,57 +1,95 @@
-from django.db.models.signals import pre_delete
+from django.db.models import QuerySet
+from django.db.models.signals import pre_delete, post_init, post_save, post_delete
 from django.dispatch import receiver
-from django.contrib.contenttypes.models import ContentType
-from .models import Transaction
-from packages.models import Comment, DiscountAll, SpecificDiscount, EliteGift
+from .models import Transaction, EliteGiftClaim
+from . import comment_cleanup, scan_cache
+from accounts.models import BusinessProfile, Club, ServiceCategory, User
+from packages.models import DiscountAll, SpecificDiscount, EliteGift, Package
 
 
 @receiver(pre_delete, sender=Transaction)
-def delete_transaction_comments(sender, instance, **kwargs):
+def delete_transaction_comments(sender, instance, origin=None, **kwargs):
     """
     وقتی یک Transaction پاک می‌شود، نظرات مرتبط با آن را هم پاک کن
     
     نظرات روی DiscountAll/SpecificDiscount/EliteGift/VipExperience ذخیره می‌شوند
     پس باید نظرات آن customer برای آن package را پاک کنیم
+
+    در حذف گروهی (queryset.delete، حذف گروهی ادمین) این سیگنال برای هر ردیف
+    صدا زده می‌شود؛ نظرات کل queryset فقط یک بار و با یک DELETE حذف می‌شوند.
     """
-    if not instance.package:
+    if isinstance(origin, QuerySet) and origin.model is Transaction:
+        if not getattr(origin, '_comments_deleted', False):
+            comment_cleanup.delete_transaction_comments(origin)
+            origin._comments_deleted = True
         return
-    
-    customer = instance.customer
-    package = instance.package
-    
-    # حذف نظرات customer روی DiscountAll این package
-    if hasattr(package, 'discount_all'):
-        discount_all_ct = ContentType.objects.get_for_model(DiscountAll)
-        Comment.objects.filter(
-            content_type=discount_all_ct,
-            object_id=package.discount_all.id,
-            user=customer
-        ).delete()
-    
-    # حذف نظرات customer روی SpecificDiscount این package
-    if hasattr(package, 'specific_discount'):
-        specific_discount_ct = ContentType.objects.get_for_model(SpecificDiscount)
-        Comment.objects.filter(
-            content_type=specific_discount_ct,
-            object_id=package.specific_discount.id,
-            user=customer
-        ).delete()
-    
-    # حذف نظرات customer روی EliteGift این package
-    if hasattr(package, 'elite_gift'):
-        elite_gift_ct = ContentType.objects.get_for_model(EliteGift)
-        Comment.objects.filter(
-            content_type=elite_gift_ct,
-            object_id=package.elite_gift.id,
-            user=customer
-        ).delete()
-    
-    # حذف نظرات customer روی VipExperience های این package
-    for vip_exp in package.experiences.all():
-        from packages.models import VipExperience
-        vip_experience_ct = ContentType.objects.get_for_model(VipExperience)
-        Comment.objects.filter(
-            content_type=vip_experience_ct,
-            object_id=vip_exp.id,
-            user=customer
-        ).delete()
+
+    if not instance.package_id:
+        return
+    comment_cleanup.delete_transaction_comments(Transaction.objects.filter(pk=instance.pk))
+
+
+# ─── ابطال cache اسکن QR ─────────────────────────────────────────
+
+@receiver(post_init, sender=BusinessProfile)
+def remember_business_unique_code(sender, instance, **kwargs):
+    # فیلد deferred خوانده نمی‌شود تا کوئری اضافه ایجاد نشود
+    instance._scan_code = instance.__dict__.get('unique_code')
+
+
+@receiver(post_save, sender=BusinessProfile)
+@receiver(post_delete, sender=BusinessProfile)
+def invalidate_business_scan_cache(sender, instance, **kwargs):
+    """تغییر اطلاعات کسب‌وکار → snapshot اسکن QR باطل شود (کد قبلی هم، اگر عوض شده باشد)"""
+    scan_cache.invalidate_codes({getattr(instance, '_scan_code', None), instance.unique_code})
+    instance._scan_code = instance.unique_code
+
+
+@receiver(post_save, sender=User)
+def invalidate_owner_scan_cache(sender, instance, created=False, **kwargs):
+    """کاربر صاحب کسب‌وکار در profile اسکن (verify_qr_code) هست"""
+    if not created and instance.role == 'business':
+        scan_cache.invalidate_businesses(user_id=instance.pk)
+
+
+# حذف با pre_delete: بعد از حذف، ارجاع کسب‌وکارها (SET_NULL) دیگر پیدا نمی‌شود
+@receiver(post_save, sender=ServiceCategory)
+@receiver(pre_delete, sender=ServiceCategory)
+def invalidate_category_scan_cache(sender, instance, created=False, **kwargs):
+    """نام دسته در snapshot و دسته/باشگاه آن در profile اسکن هست"""
+    if not created:
+        scan_cache.invalidate_businesses(category_id=instance.pk)
+
+
+@receiver(post_save, sender=Club)
+@receiver(pre_delete, sender=Club)
+def invalidate_club_scan_cache(sender, instance, created=False, **kwargs):
+    if not created:
+        scan_cache.invalidate_businesses(category__club_id=instance.pk)
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+def invalidate_package_scan_cache(sender, instance, **kwargs):
+    """تغییر پکیج (فعال/غیرفعال، تاریخ‌ها) → snapshot کسب‌وکار باطل شود"""
+    scan_cache.invalidate_business(instance.business_id)
+
+
+@receiver(post_save, sender=DiscountAll)
+@receiver(post_delete, sender=DiscountAll)
+@receiver(post_save, sender=SpecificDiscount)
+@receiver(post_delete, sender=SpecificDiscount)
+@receiver(post_save, sender=EliteGift)
+@receiver(post_delete, sender=EliteGift)
+def invalidate_package_component_scan_cache(sender, instance, **kwargs):
+    """تغییر اجزای پکیج → snapshot کسب‌وکار صاحب پکیج باطل شود"""
+    scan_cache.invalidate_package(instance.package_id)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=EliteGiftClaim)
+@receiver(post_delete, sender=EliteGiftClaim)
+def invalidate_elite_progress_cache(sender, instance, **kwargs):
+    """تراکنش یا درخواست هدیه جدید → شمارنده‌های پیشرفت مشتری باطل شود"""
+    scan_cache.invalidate_progress(instance.customer_id, instance.package_id)
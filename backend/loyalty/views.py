@@ -10,6 +10,9 @@ from .serializers import (
     TransactionCommentSerializer, CustomerFavoriteSerializer,
 )
 from accounts.models import BusinessProfile
+from accounts.code_allocator import is_valid_code
+from core.db_router import replica_reads
+from . import scan_cache
 
 
 class CustomerLoyaltyViewSet(viewsets.ReadOnlyModelViewSet):
@@ -226,29 +229,45 @@ def get_business_by_code(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # دریافت کسب‌وکار
-    business = get_object_or_404(BusinessProfile, unique_code=unique_code)
+    # رقم کنترلی: کد اشتباه تایپ شده بدون کوئری رد می‌شود
+    if not is_valid_code(unique_code):
+        return Response(
+            {'error': 'کد یکتا معتبر نیست، لطفاً دوباره بررسی کنید'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    # دریافت پکیج فعال
-    package = business.packages.filter(is_active=True, status='approved').first()
+    # دریافت snapshot کسب‌وکار و پکیج فعال از cache
+    snapshot = scan_cache.get_scan_snapshot(unique_code)
+    if snapshot is None:
+        return Response(
+            {'detail': 'کسب‌وکاری با این کد یافت نشد'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    package = snapshot['package']
     
-    # دریافت یا ایجاد CustomerLoyalty
+    # CustomerLoyalty فقط هنگام ثبت تراکنش ساخته می‌شود (TransactionCreateSerializer)
     customer = request.user.customerprofile
-    loyalty, created = CustomerLoyalty.objects.get_or_create(
+    loyalty = CustomerLoyalty.objects.filter(
         customer=customer,
-        business=business
-    )
+        business_id=snapshot['business_id']
+    ).only(
+        'points', 'vip_status', 'elite_gift_target_reached', 'elite_gift_used'
+    ).first()
+    customer_points = loyalty.points if loyalty else 0
+    vip_status = loyalty.vip_status if loyalty else 'none'
+    target_reached = loyalty.elite_gift_target_reached if loyalty else False
+    gift_used = loyalty.elite_gift_used if loyalty else False
     
     # ساخت داده‌های پاسخ
     data = {
-        'business_id': business.id,
-        'business_name': business.name,
-        'business_logo': business.logo.url if business.logo else None,
-        'business_description': business.description or '',
-        'service_category': business.category.name if business.category else '',
+        'business_id': snapshot['business_id'],
+        'business_name': snapshot['business_name'],
+        'business_logo': snapshot['business_logo'],
+        'business_description': snapshot['business_description'],
+        'service_category': snapshot['service_category'],
         
         # اطلاعات پکیج
-        'package_id': package.id if package else None,
+        'package_id': package['id'] if package else None,
         'has_active_package': package is not None,
         'discount_all_percentage': None,
         'has_specific_discount': False,
@@ -259,45 +278,41 @@ def get_business_by_code(request):
         'elite_gift_description': None,
         
         # اطلاعات مشتری
-        'customer_points': loyalty.points,
-        'customer_vip_status': loyalty.vip_status,
-        'elite_gift_target_reached': loyalty.elite_gift_target_reached,
-        'elite_gift_used': loyalty.elite_gift_used,
+        'customer_points': customer_points,
+        'customer_vip_status': vip_status,
+        'elite_gift_target_reached': target_reached,
+        'elite_gift_used': gift_used,
         
         # دسترسی به ویژگی‌ها
-        'can_use_elite_gift': loyalty.elite_gift_target_reached and not loyalty.elite_gift_used,
-        'can_use_vip': loyalty.vip_status in ['vip', 'vip_plus'],
-        'can_use_vip_plus': loyalty.vip_status == 'vip_plus',
+        'can_use_elite_gift': target_reached and not gift_used,
+        'can_use_vip': vip_status in ['vip', 'vip_plus'],
+        'can_use_vip_plus': vip_status == 'vip_plus',
     }
     
     # اگر پکیج فعال دارد
     if package:
-        if hasattr(package, 'discount_all'):
-            data['discount_all_percentage'] = package.discount_all.percentage
+        data['discount_all_percentage'] = package['discount_all_percentage']
         
-        if hasattr(package, 'specific_discount'):
+        if package['specific_discount']:
             data['has_specific_discount'] = True
-            data['specific_discount_title'] = package.specific_discount.title
-            data['specific_discount_percentage'] = package.specific_discount.percentage
+            data['specific_discount_title'] = package['specific_discount']['title']
+            data['specific_discount_percentage'] = package['specific_discount']['percentage']
         
-        if hasattr(package, 'elite_gift'):
+        elite_gift = package['elite_gift']
+        if elite_gift:
             data['has_elite_gift'] = True
-            elite_gift = package.elite_gift
-            data['elite_gift_title'] = elite_gift.gift
+            data['elite_gift_title'] = elite_gift['gift']
             
-            # محاسبه پیشرفت برای بررسی eligible بودن
-            progress = elite_gift.get_customer_progress(customer)
-            
-            # بروزرسانی can_use_elite_gift بر اساس eligible
-            data['can_use_elite_gift'] = progress.get('eligible', False)
+            # بروزرسانی can_use_elite_gift بر اساس eligible (از شمارنده‌های cache شده)
+            data['can_use_elite_gift'] = scan_cache.is_elite_gift_eligible(snapshot, customer)
             
             # ساخت توضیحات هدیه
-            if elite_gift.amount:
-                data['elite_gift_description'] = f"هدیه به ارزش {elite_gift.amount:,} تومان"
-            elif elite_gift.count:
-                data['elite_gift_description'] = f"تعداد {elite_gift.count} عدد"
+            if elite_gift['amount']:
+                data['elite_gift_description'] = f"هدیه به ارزش {elite_gift['amount']:,} تومان"
+            elif elite_gift['count']:
+                data['elite_gift_description'] = f"تعداد {elite_gift['count']} عدد"
             else:
-                data['elite_gift_description'] = elite_gift.gift
+                data['elite_gift_description'] = elite_gift['gift']
     
     serializer = BusinessInfoSerializer(data, context={'request': request})
     return Response(serializer.data)
@@ -338,7 +353,7 @@ def elite_gift_progress(request, package_id):
     # محاسبه پیشرفت
     elite_gift = package.elite_gift
     customer = request.user.customerprofile
-    progress = elite_gift.get_customer_progress(customer)
+    progress = scan_cache.get_cached_progress(elite_gift, customer)
     
     # اضافه کردن اطلاعات هدیه
     progress['gift_name'] = elite_gift.gift
@@ -516,9 +531,12 @@ class EliteGiftClaimViewSet(viewsets.ModelViewSet):
         """
         from .serializers import EliteGiftClaimCreateSerializer, EliteGiftClaimSerializer
         
+        from core import metrics
+        
         serializer = EliteGiftClaimCreateSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         claim = serializer.save()
+        metrics.ELITE_GIFT_CLAIMS.inc(action='create')
         
         # برگرداندن با serializer کامل
         output_serializer = EliteGiftClaimSerializer(claim)
@@ -660,6 +678,7 @@ def points_summary(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@replica_reads
 def points_history(request):
     """
     تاریخچه رویدادهای امتیازی مشتری
@@ -840,7 +859,7 @@ def elite_gift_progress(request, package_id):
     customer = request.user.customerprofile
     
     # دریافت پیشرفت
-    progress = elite_gift.get_customer_progress(customer)
+    progress = scan_cache.get_cached_progress(elite_gift, customer)
     
     # اضافه کردن اطلاعات هدیه و پکیج
     progress['gift_name'] = elite_gift.gift
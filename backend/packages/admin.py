@@ -115,11 +115,6 @@ class CommentAdmin(admin.ModelAdmin):
             return obj.text[:50] + ('...' if len(obj.text) > 50 else '')
         return '-'
     text_preview.short_description = 'متن کامنت'
-    
-    def likes_count(self, obj):
-        """تعداد لایک‌ها"""
-        return obj.likes.count()
-    likes_count.short_description = 'تعداد لایک'
 
 
 @admin.register(CommentLike)
@@ -1,6 +1,8 @@
 """Shared helpers for resolving Faydo clubs from business categories."""
 
 from accounts.models import Club
+from accounts.persian_text import first_in_order, normalize_compact as normalize_persian, scan
+from accounts.reference_registry import registry
 
 
 DEFAULT_CLUBS = [
@@ -37,57 +39,61 @@ CATEGORY_CLUB_KEYWORDS = {
 }
 
 
-def normalize_persian(text: str) -> str:
-    if not text:
-        return ''
-    return (
-        text.replace('\u200c', '')
-        .replace('\u200d', '')
-        .replace('ي', 'ی')
-        .replace('ك', 'ک')
-        .replace(' ', '')
-        .strip()
-        .lower()
-    )
+# کلمات get_club_match_key (در automaton مشترک accounts/persian_text.py)
+CLUB_MATCH_KEYWORDS = ('طعم', 'تندرست', 'سلامت', 'سبک', 'زندگی')
 
 
 def get_club_match_key(name: str) -> str:
     """Map any club label to one of taste / wellness / lifestyle."""
     n = normalize_persian(name)
-    if 'طعم' in n:
+    found = scan(n).get('club_key', frozenset())
+    if 'طعم' in found:
         return 'taste'
-    if 'تندرست' in n or ('سلامت' in n and 'سبک' not in n):
+    if 'تندرست' in found or ('سلامت' in found and 'سبک' not in found):
         return 'wellness'
-    if 'سبک' in n and 'زندگی' in n:
+    if 'سبک' in found and 'زندگی' in found:
         return 'lifestyle'
     return n
 
 
+def _clubs_by_match_key(data):
+    index = {}
+    for candidate in data.clubs:
+        index.setdefault(get_club_match_key(candidate.name), []).append(candidate)
+    return index
+
+
+def _canonical_by_match_key(data):
+    index = {}
+    for club_data in DEFAULT_CLUBS:
+        canonical = _find_club(data, club_data['name'])
+        if canonical:
+            index.setdefault(get_club_match_key(club_data['name']), canonical)
+    return index
+
+
+def _find_club(data, name):
+    return data.clubs_by_name.get(name) or data.clubs_by_normalized.get(normalize_persian(name))
+
+
 def resolve_canonical_club(club):
     """Map duplicate club rows (e.g. 'طعم‌ها') to the PDF canonical club."""
     if not club:
         return None
-    key = get_club_match_key(club.name)
-    for data in DEFAULT_CLUBS:
-        if get_club_match_key(data['name']) == key:
-            canonical = find_club_by_name(data['name'])
-            if canonical:
-                return canonical
-    return club
+    canonical_by_key = registry.get().derived('canonical_clubs', _canonical_by_match_key)
+    return canonical_by_key.get(get_club_match_key(club.name)) or club
 
 
 def club_ids_for_lookup(club):
     """All club PKs that should share the same VIP hint set."""
     if not club:
         return []
-    key = get_club_match_key(club.name)
     ids = {club.pk}
     canonical = resolve_canonical_club(club)
     if canonical:
         ids.add(canonical.pk)
-    for candidate in Club.objects.all():
-        if get_club_match_key(candidate.name) == key:
-            ids.add(candidate.pk)
+    by_key = registry.get().derived('clubs_by_match_key', _clubs_by_match_key)
+    ids.update(candidate.pk for candidate in by_key.get(get_club_match_key(club.name), []))
     return list(ids)
 
 
@@ -95,14 +101,7 @@ def find_club_by_name(name: str):
     """Find club by exact or normalized Persian name."""
     if not name:
         return None
-    club = Club.objects.filter(name=name).first()
-    if club:
-        return club
-    target = normalize_persian(name)
-    for candidate in Club.objects.all():
-        if normalize_persian(candidate.name) == target:
-            return candidate
-    return None
+    return _find_club(registry.get(), name)
 
 
 def ensure_default_clubs():
@@ -112,12 +111,12 @@ def ensure_default_clubs():
     for data in DEFAULT_CLUBS:
         club = find_club_by_name(data["name"])
         if not club:
-            key = get_club_match_key(data["name"])
-            for candidate in Club.objects.all():
-                if get_club_match_key(candidate.name) == key:
-                    club = candidate
-                    break
+            by_key = registry.get().derived('clubs_by_match_key', _clubs_by_match_key)
+            candidates = by_key.get(get_club_match_key(data["name"]))
+            club = candidates[0] if candidates else None
         if club:
+            # نمونه رجیستری مشترک است؛ ویرایش روی نمونه تازه
+            club = Club.objects.get(pk=club.pk)
             changed = False
             if club.name != data["name"] and not Club.objects.filter(name=data["name"]).exclude(pk=club.pk).exists():
                 club.name = data["name"]
@@ -183,42 +182,48 @@ def consolidate_duplicate_clubs():
 
 
 def category_name_chain(category) -> str:
-    names = []
-    cat = category
-    visited = set()
-    while cat and cat.pk not in visited:
-        visited.add(cat.pk)
-        if cat.name:
-            names.append(cat.name)
-        cat = cat.parent
-    return ' '.join(names)
+    from accounts.category_tree import category_name_chain as name_chain
+    return name_chain(category)
+
+
+def _infer_club_from_names(combined: str):
+    """First club (in CATEGORY_CLUB_KEYWORDS order) with a keyword in the names; one automaton pass."""
+    club_name = first_in_order(scan(combined).get('club', frozenset()), CATEGORY_CLUB_KEYWORDS)
+    return find_club_by_name(club_name) if club_name else None
 
 
 def infer_club_from_category_name(category):
-    combined = category_name_chain(category)
-    combined_lower = combined.lower()
-    for club_name, keywords in CATEGORY_CLUB_KEYWORDS.items():
-        if any(kw in combined or kw in combined_lower for kw in keywords):
-            return find_club_by_name(club_name)
-    return None
+    return _infer_club_from_names(category_name_chain(category))
+
+
+def club_for_category_chain(chain, names: str):
+    """
+    Club for a category given its ancestor chain (self → root) and their names:
+    nearest club FK, otherwise name keywords. Used to materialize effective_club_id.
+    """
+    clubs_by_id = registry.get().clubs_by_id
+    for cat in chain:
+        if cat.club_id:
+            club = clubs_by_id.get(cat.club_id) or Club.objects.filter(pk=cat.club_id).first()
+            if club:
+                return resolve_canonical_club(club)
+    club = _infer_club_from_names(names)
+    return resolve_canonical_club(club) if club else None
 
 
 def resolve_business_club(business_profile):
-    """Resolve club from category FK, parent chain, or category name keywords."""
+    """Resolve club from the category's precomputed effective club (FK chain or name keywords)."""
     if not business_profile or not business_profile.category_id:
         return None
 
-    category = business_profile.category
-    cat = category
-    visited = set()
-    while cat and cat.pk not in visited:
-        visited.add(cat.pk)
-        if cat.club_id:
-            return resolve_canonical_club(cat.club)
-        cat = cat.parent
-
-    club = infer_club_from_category_name(category)
-    return resolve_canonical_club(club) if club else None
+    from accounts.category_tree import get_category
+    category = get_category(business_profile.category_id)
+    if not category or not category.effective_club_id:
+        return None
+    return (
+        registry.get().clubs_by_id.get(category.effective_club_id)
+        or Club.objects.filter(pk=category.effective_club_id).first()
+    )
 
 
 def assign_club_to_service_category(service_category):
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+فیلترهای feed پکیج‌ها و شمارش facet ها
+
+فیلترها (query params لیست مشتری و /packages/packages/facets/):
+- club: باشگاه (نسخه canonical؛ روی ServiceCategory.effective_club_id)
+- category: دسته و همه زیرمجموعه‌هایش (range روی path؛ ServiceCategory.subtree_q)
+- city
+- discount_min / discount_max: درصد تخفیف کلی (DiscountAll)
+- vip: VIP یا VIP+ (پکیج حداقل یک تجربه از آن نوع دارد)
+- amenities: id امکانات با کاما (یا لیست JSON)؛ کسب‌وکار باید همه را داشته باشد
+
+همه فیلترها در SQL اعمال می‌شوند. شمارش هر facet با یک کوئری GROUP BY روی
+feed با همه فیلترها به جز فیلتر خود آن facet انجام می‌شود (تا گزینه‌های دیگر
+همان facet هم تعداد داشته باشند). نتیجه برای هر ترکیب فیلتر FACET_TTL ثانیه
+در cache مشترک (core/cache_tier.get_or_compute) می‌ماند.
+"""
+import hashlib
+
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, Q, Value, When
+from rest_framework.exceptions import ValidationError
+
+from core.cache_tier import get_or_compute
+
+FACET_TTL = 30
+MAX_AMENITIES = 20
+VIP_TYPES = ('VIP', 'VIP+')
+
+# (برچسب، حداقل، سقف) درصد تخفیف کلی؛ سقف شامل نمی‌شود
+DISCOUNT_BUCKETS = [
+    ('1-10', 1, 10),
+    ('10-20', 10, 20),
+    ('20-30', 20, 30),
+    ('30-50', 30, 50),
+    ('50+', 50, None),
+]
+NO_DISCOUNT = 'none'
+
+FILTER_PARAMS = ('club', 'category', 'city', 'discount_min', 'discount_max', 'vip', 'amenities')
+
+
+def _int(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'عدد صحیح لازم است.'})
+
+
+def _number(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'عدد لازم است.'})
+
+
+def parse_filters(params):
+    """query params → dict فیلترهای معتبر (فقط فیلترهای داده شده)"""
+    from accounts.reference_registry import registry
+    from .club_utils import resolve_canonical_club
+
+    filters = {}
+    club_id = _int(params, 'club')
+    if club_id is not None:
+        canonical = resolve_canonical_club(registry.get().clubs_by_id.get(club_id))
+        filters['club'] = canonical.pk if canonical else club_id
+
+    category_id = _int(params, 'category')
+    if category_id is not None:
+        filters['category'] = category_id
+
+    city_id = _int(params, 'city')
+    if city_id is not None:
+        filters['city'] = city_id
+
+    discount = (_number(params, 'discount_min'), _number(params, 'discount_max'))
+    if discount != (None, None):
+        filters['discount'] = discount
+
+    vip = params.get('vip')
+    if vip:
+        if vip not in VIP_TYPES:
+            raise ValidationError({'vip': 'مقدار باید VIP یا VIP+ باشد.'})
+        filters['vip'] = vip
+
+    amenities = params.get('amenities')
+    if amenities:
+        # query string: "1,2"؛ بدنه JSON جستجوی هوشمند: [1, 2] هم قبول است
+        values = amenities.split(',') if isinstance(amenities, str) else amenities
+        if not isinstance(values, (list, tuple)):
+            raise ValidationError({'amenities': 'لیست id ها با کاما لازم است.'})
+        try:
+            ids = sorted({int(value) for value in values if str(value).strip()})
+        except (TypeError, ValueError):
+            raise ValidationError({'amenities': 'لیست id ها با کاما لازم است.'})
+        if len(ids) > MAX_AMENITIES:
+            raise ValidationError({'amenities': f'حداکثر {MAX_AMENITIES} امکان.'})
+        if ids:
+            filters['amenities'] = ids
+    return filters
+
+
+def _vip_exists(vip_type):
+    from .models import VipExperience
+
+    return Exists(VipExperience.objects.filter(
+        package=OuterRef('pk'), vip_experience_category__vip_type=vip_type
+    ))
+
+
+def _condition(name, value):
+    from accounts.category_tree import get_category
+    from accounts.models import BusinessAmenity
+
+    if name == 'club':
+        return Q(business__category__effective_club_id=value)
+    if name == 'category':
+        category = get_category(value)
+        if category is None:
+            return Q(pk__in=[])
+        return category.subtree_q('business__category__')
+    if name == 'city':
+        return Q(business__city_id=value)
+    if name == 'discount':
+        low, high = value
+        condition = Q()
+        if low is not None:
+            condition &= Q(discount_all__percentage__gte=low)
+        if high is not None:
+            condition &= Q(discount_all__percentage__lte=high)
+        return condition
+    if name == 'vip':
+        return Q(_vip_exists(value))
+    if name == 'amenities':
+        condition = Q()
+        for amenity_id in value:
+            condition &= Q(Exists(BusinessAmenity.objects.filter(
+                business_profile=OuterRef('business_id'), amenity_id=amenity_id, is_enabled=True
+            )))
+        return condition
+    raise KeyError(name)
+
+
+def apply_filters(queryset, filters, exclude=None):
+    for name, value in filters.items():
+        if name != exclude:
+            queryset = queryset.filter(_condition(name, value))
+    return queryset
+
+
+def _grouped(queryset, field):
+    return {
+        row[field]: row['count']
+        for row in queryset.order_by().values(field).annotate(count=Count('id'))
+        if row[field] is not None
+    }
+
+
+def _club_facet(queryset, data):
+    counts = _grouped(queryset, 'business__category__effective_club_id')
+    return [
+        {'id': club_id, 'name': getattr(data.clubs_by_id.get(club_id), 'name', None), 'count': count}
+        for club_id, count in sorted(counts.items(), key=lambda item: -item[1])
+    ]
+
+
+def _category_facet(queryset, data):
+    """تعداد مستقیم هر دسته با GROUP BY؛ جمع زیرمجموعه‌ها در حافظه از روی path"""
+    counts = _grouped(queryset, 'business__category_id')
+    totals = {}
+    for category_id, count in counts.items():
+        category = data.categories_by_id.get(category_id)
+        ancestors = [int(pk) for pk in category.path.strip('/').split('/')] if category and category.path else [category_id]
+        for ancestor_id in ancestors:
+            totals[ancestor_id] = totals.get(ancestor_id, 0) + count
+    facet = []
+    for category_id, count in totals.items():
+        category = data.categories_by_id.get(category_id)
+        facet.append({
+            'id': category_id,
+            'name': getattr(category, 'name', None),
+            'parent_id': getattr(category, 'parent_id', None),
+            'count': count,
+        })
+    facet.sort(key=lambda item: -item['count'])
+    return facet
+
+
+def _city_facet(queryset, data):
+    from accounts.models import City
+
+    counts = _grouped(queryset, 'business__city_id')
+    names = dict(City.objects.filter(pk__in=counts).values_list('id', 'name'))
+    return [
+        {'id': city_id, 'name': names.get(city_id), 'count': count}
+        for city_id, count in sorted(counts.items(), key=lambda item: -item[1])
+    ]
+
+
+def _discount_facet(queryset, data):
+    whens = [
+        When(
+            Q(discount_all__percentage__gte=low) & (Q(discount_all__percentage__lt=high) if high else Q()),
+            then=Value(index),
+        )
+        for index, (label, low, high) in enumerate(DISCOUNT_BUCKETS)
+    ]
+    counts = _grouped(
+        queryset.annotate(discount_bucket=Case(*whens, default=Value(-1), output_field=IntegerField())),
+        'discount_bucket',
+    )
+    facet = [{'key': NO_DISCOUNT, 'min': None, 'max': None, 'count': counts.get(-1, 0)}]
+    facet += [
+        {'key': label, 'min': low, 'max': high, 'count': counts.get(index, 0)}
+        for index, (label, low, high) in enumerate(DISCOUNT_BUCKETS)
+    ]
+    return facet
+
+
+def _vip_facet(queryset, data):
+    """هر دو نوع در یک aggregate شرطی"""
+    counts = queryset.order_by().aggregate(**{
+        vip_type: Count('id', filter=Q(_vip_exists(vip_type))) for vip_type in VIP_TYPES
+    })
+    return [{'key': vip_type, 'count': counts[vip_type]} for vip_type in VIP_TYPES]
+
+
+def _amenity_facet(queryset, data):
+    rows = (
+        queryset.order_by()
+        .filter(business__selected_amenities__is_enabled=True)
+        .values('business__selected_amenities__amenity_id')
+        .annotate(count=Count('id', distinct=True))
+    )
+    facet = []
+    for row in rows:
+        amenity = data.amenities_by_id.get(row['business__selected_amenities__amenity_id'])
+        if amenity is None:
+            # امکان غیرفعال از کاتالوگ
+            continue
+        facet.append({'id': amenity.pk, 'name': amenity.name, 'count': row['count']})
+    facet.sort(key=lambda item: -item['count'])
+    return facet
+
+
+FACETS = {
+    'club': _club_facet,
+    'category': _category_facet,
+    'city': _city_facet,
+    'discount': _discount_facet,
+    'vip': _vip_facet,
+    'amenities': _amenity_facet,
+}
+
+
+def cache_key(filters, scope=''):
+    raw = repr((sorted(filters.items()), scope))
+    return 'package_facets_' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def facet_counts(base, filters, scope=''):
+    """
+    base: queryset feed پیش از فیلترهای facet؛ scope: هر چیز دیگری که base به آن
+    بستگی دارد (مثلاً خانه برنامه هفتگی در فیلتر open_now) و باید در کلید cache باشد
+    """
+    from accounts.reference_registry import registry
+
+    def compute():
+        data = registry.get()
+        return {
+            'total': apply_filters(base, filters).order_by().count(),
+            'facets': {
+                name: builder(apply_filters(base, filters, exclude=name), data)
+                for name, builder in FACETS.items()
+            },
+        }
+
+    # هم‌زمان فقط یک درخواست شمارش را می‌سازد؛ بعد از FACET_TTL تا یک دوره دیگر
+    # مقدار قبلی برگردانده می‌شود تا ساخت مجدد تمام شود
+    return get_or_compute(cache_key(filters, scope), compute, FACET_TTL)
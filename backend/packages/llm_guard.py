@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+محافظ فراخوانی‌های Groq جستجوی هوشمند
+
+۱. single-flight: درخواست‌های هم‌زمان با کلید یکسان (عبارت نرمال شده + نسخه
+   کاتالوگ ارسالی) فقط یک فراخوانی provider دارند. اولی قفل را با cache.add
+   می‌گیرد و نتیجه را در cache می‌گذارد؛ بقیه تا آزاد شدن قفل منتظر همان نتیجه
+   می‌مانند. نتیجه موفق provider تا RESULT_TTL ثانیه برای درخواست‌های بعدی هم
+   می‌ماند و شکست provider (خطا، timeout) FAILURE_TTL ثانیه، تا هنگام قطعی Groq
+   منتظرها و درخواست‌های بعدی دوباره آن را صدا نزنند. رتبه‌بندی محلی (نبود
+   بودجه) cache نمی‌شود چون به بودجه همان لحظه/کاربر بستگی دارد.
+   قفل و نتیجه در cache پیش‌فرض Django است؛ با cache مشترک بین workerها
+   (نه LocMem) هماهنگی بین process ها هم برقرار است.
+
+۲. بودجه توکن: شمارنده توکن در پنجره‌های یک دقیقه‌ای، یکی سراسری
+   (LLM_TOKENS_PER_MINUTE) و یکی برای هر کاربر (LLM_USER_TOKENS_PER_MINUTE).
+   پیش از فراخوانی تخمین prompt + سقف پاسخ رزرو می‌شود و بعد از پاسخ با usage
+   واقعی Groq اصلاح می‌شود. اگر بودجه نباشد فراخوانی انجام نمی‌شود و
+   smart_search به رتبه‌بندی محلی برمی‌گردد.
+   incr در DatabaseCache (و file) خواندن و نوشتن جداست و در workerهای هم‌زمان
+   افزایش‌ها گم می‌شوند؛ برای همین خواندن-بررسی-افزایش در transaction.atomic
+   روی دیتابیس همان cache است (BEGIN IMMEDIATE در SQLite آن را سریال می‌کند).
+   incr در redis و LocMem خودش اتمیک است.
+"""
+import hashlib
+import json
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+
+from accounts.persian_text import normalize
+
+DEFAULT_TOKENS_PER_MINUTE = 6000
+DEFAULT_USER_TOKENS_PER_MINUTE = 2500
+WINDOW_SECONDS = 60
+RESULT_TTL = 60
+FAILURE_TTL = 5
+POLL_SECONDS = 0.05
+GLOBAL_SCOPE = 'global'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ─── single-flight ───────────────────────────────────────────────
+
+def flight_key(query, catalog):
+    raw = json.dumps([normalize(query), catalog], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _result_key(key):
+    return f'llm_flight_result_{key}'
+
+
+def _lock_key(key):
+    return f'llm_flight_lock_{key}'
+
+
+def cached_result(key):
+    return cache.get(_result_key(key))
+
+
+def single_flight(key, func, timeout):
+    """
+    (نتیجه، shared): shared یعنی نتیجه از فراخوانی درخواست دیگری آمده است.
+    func فقط برای درخواستی که قفل را گرفته اجرا می‌شود. نتیجه provider (نه
+    local) cache می‌شود: موفق RESULT_TTL و ناموفق FAILURE_TTL ثانیه.
+    اگر زمان انتظار بگذرد (صاحب قفل از بین رفته)، func دوباره اجرا نمی‌شود و
+    نتیجه ناموفق provider_busy برمی‌گردد.
+    """
+    result = cached_result(key)
+    if result is not None:
+        return result, True
+
+    lock_key = _lock_key(key)
+    deadline = time.monotonic() + timeout
+    while not cache.add(lock_key, 1, timeout):
+        if time.monotonic() >= deadline:
+            return {'ok': False, 'reason': 'provider_busy'}, False
+        time.sleep(POLL_SECONDS)
+        result = cached_result(key)
+        if result is not None:
+            return result, True
+    try:
+        result = func()
+        if result.get('provider') != 'local':
+            cache.set(_result_key(key), result, RESULT_TTL if result.get('ok') else FAILURE_TTL)
+        return result, False
+    finally:
+        cache.delete(lock_key)
+
+
+# ─── بودجه توکن ─────────────────────────────────────────────────
+
+def _window():
+    return int(time.time() // WINDOW_SECONDS)
+
+
+def retry_after():
+    return WINDOW_SECONDS - int(time.time() % WINDOW_SECONDS)
+
+
+def _counter_key(scope, window):
+    return f'llm_tokens_{scope}_{window}'
+
+
+def _limits(user_id):
+    limits = {GLOBAL_SCOPE: _setting('LLM_TOKENS_PER_MINUTE', DEFAULT_TOKENS_PER_MINUTE)}
+    if user_id is not None:
+        limits[f'user_{user_id}'] = _setting('LLM_USER_TOKENS_PER_MINUTE', DEFAULT_USER_TOKENS_PER_MINUTE)
+    return limits
+
+
+def used(scope):
+    return cache.get(_counter_key(scope, _window()), 0)
+
+
+def remaining(user_id=None):
+    """کمترین بودجه باقی‌مانده این دقیقه بین سراسری و کاربر"""
+    return min(limit - used(scope) for scope, limit in _limits(user_id).items())
+
+
+def _counters_atomic():
+    """transaction روی دیتابیس DatabaseCache؛ برای backendهای دیگر بدون اثر"""
+    from django.db import router, transaction
+
+    model = getattr(cache, 'cache_model_class', None)
+    if model is None:
+        return nullcontext()
+    return transaction.atomic(using=router.db_for_write(model))
+
+
+class Reservation:
+    """توکن‌های رزرو شده یک فراخوانی؛ settle مقدار را با usage واقعی اصلاح می‌کند"""
+
+    def __init__(self, keys, tokens):
+        self.keys = keys
+        self.tokens = tokens
+
+    def settle(self, actual):
+        if actual is None:
+            return
+        delta = actual - self.tokens
+        if not delta:
+            return
+        with _counters_atomic():
+            for key in self.keys:
+                try:
+                    cache.incr(key, delta)
+                except ValueError:
+                    # پنجره منقضی شده است
+                    pass
+        self.tokens = actual
+
+
+def reserve(user_id, tokens):
+    """
+    Reservation یا None اگر بودجه سراسری یا کاربر برای این تعداد توکن کافی نیست
+    (رزرو هیچ‌کدام باقی نمی‌ماند)
+    """
+    window = _window()
+    taken = []
+    with _counters_atomic():
+        for scope, limit in _limits(user_id).items():
+            key = _counter_key(scope, window)
+            cache.add(key, 0, WINDOW_SECONDS * 2)
+            try:
+                total = cache.incr(key, tokens)
+            except ValueError:
+                cache.set(key, tokens, WINDOW_SECONDS * 2)
+                total = tokens
+            taken.append(key)
+            if total > limit:
+                for key in taken:
+                    try:
+                        cache.decr(key, tokens)
+                    except ValueError:
+                        pass
+                return None
+    return Reservation(taken, tokens)
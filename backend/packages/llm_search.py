@@ -3,6 +3,7 @@
 import json
 import logging
 import re
+import time
 
 import requests
 from django.conf import settings
@@ -10,6 +11,9 @@ from django.conf import settings
 logger = logging.getLogger(__name__)
 
 GROQ_URL = 'https://api.groq.com/openai/v1/chat/completions'
+MAX_COMPLETION_TOKENS = 700
+# تخمین محافظه‌کارانه توکن برای متن فارسی/JSON (llm_guard)
+CHARS_PER_TOKEN = 3
 ALLOWED_INTENTS = {
     'birthday', 'welcome', 'gift', 'friend', 'early', 'taste', 'wellness', 'lifestyle',
 }
@@ -53,30 +57,43 @@ def _parse_json(text):
             return None
 
 
-def rank_catalog(query, catalog):
+def _user_content(query, catalog):
+    return json.dumps(
+        {'query': query, 'catalog': catalog},
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+
+
+def estimate_tokens(query, catalog):
+    """(توکن‌های prompt، سقف توکن‌های پاسخ) پیش از فراخوانی"""
+    chars = len(SYSTEM_PROMPT) + len(_user_content(query, catalog))
+    return chars // CHARS_PER_TOKEN + 1, MAX_COMPLETION_TOKENS
+
+
+def rank_catalog(query, catalog, timeout=12):
     """
     catalog: list of {id, name, club, category, city, gold, vip}
+    (فیلدهای خالی می‌توانند حذف شوند؛ smart_search.summarize)
     """
     if not groq_configured():
         return {'ok': False, 'reason': 'missing_key'}
 
+    from core import metrics
+
     allowed_ids = {item.get('id') for item in catalog if item.get('id') is not None}
     payload = {
         'model': getattr(settings, 'GROQ_MODEL', 'llama-3.3-70b-versatile'),
         'temperature': 0.15,
-        'max_tokens': 700,
+        'max_tokens': MAX_COMPLETION_TOKENS,
         'response_format': {'type': 'json_object'},
         'messages': [
             {'role': 'system', 'content': SYSTEM_PROMPT},
-            {
-                'role': 'user',
-                'content': json.dumps(
-                    {'query': query, 'catalog': catalog},
-                    ensure_ascii=False,
-                ),
-            },
+            {'role': 'user', 'content': _user_content(query, catalog)},
         ],
     }
+    started = time.perf_counter()
+    outcome = 'ok'
     try:
         response = requests.post(
             GROQ_URL,
@@ -85,17 +102,27 @@ def rank_catalog(query, catalog):
                 'Content-Type': 'application/json',
             },
             json=payload,
-            timeout=12,
+            timeout=timeout,
         )
         if response.status_code >= 400:
             logger.warning('Groq search failed: %s %s', response.status_code, response.text[:300])
+            outcome = 'rate_limited' if response.status_code == 429 else 'http_error'
             return {'ok': False, 'reason': 'provider_error'}
         body = response.json()
         content = (body.get('choices') or [{}])[0].get('message', {}).get('content', '')
         data = _parse_json(content) or {}
+        usage = body.get('usage') or {}
+    except requests.exceptions.Timeout:
+        outcome = 'timeout'
+        logger.warning('Groq search request timed out')
+        return {'ok': False, 'reason': 'provider_error'}
     except Exception:
+        outcome = 'error'
         logger.exception('Groq search request failed')
         return {'ok': False, 'reason': 'provider_error'}
+    finally:
+        metrics.GROQ_REQUESTS.inc(outcome=outcome)
+        metrics.GROQ_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
 
     ranked = []
     for value in data.get('ranked_ids') or []:
@@ -118,4 +145,8 @@ def rank_catalog(query, catalog):
         'prefer_tab': prefer,
         'keywords': keywords,
         'ranked_ids': ranked,
+        'usage': {
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'completion_tokens': usage.get('completion_tokens'),
+        },
     }
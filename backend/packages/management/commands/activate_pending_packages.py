@@ -75,7 +75,7 @@ class Command(BaseCommand):
                         self.stdout.write(
                             f'Activating package {package_to_activate.id} for business {package_to_activate.business.name} (start date: {package_to_activate.start_date})'
                         )
-                        package_to_activate.activate_package()
+                        package_to_activate.activate_package(source='schedule')
                         activated_count += 1
                         self.stdout.write(
                             self.style.SUCCESS(
@@ -116,7 +116,7 @@ class Command(BaseCommand):
                 self.stdout.write(
                     f'Found delayed package {delayed_package.id} for business {delayed_package.business.name} (start date: {delayed_package.start_date})'
                 )
-                delayed_package.activate_package()
+                delayed_package.activate_package(source='schedule')
                 activated_count += 1
                 self.stdout.write(
                     self.style.SUCCESS(
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+management command: benchmark_nearby
+مقایسه جستجوی «نزدیک من» (/packages/nearby/) با روش قبلی کلاینت
+(خواندن همه پکیج‌های فعال و مرتب‌سازی بر اساس فاصله در حافظه)
+
+داده‌های آزمایشی (پیش‌فرض ۱۰۰ هزار کسب‌وکار در محدوده تهران) داخل یک
+transaction ساخته و در پایان rollback می‌شوند.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# محدوده تقریبی تهران
+LAT_RANGE = (35.55, 35.85)
+LNG_RANGE = (51.15, 51.65)
+
+
+class Command(BaseCommand):
+    help = 'بنچمارک endpoint نزدیک‌ترین پکیج‌ها روی داده آزمایشی بزرگ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--businesses', type=int, default=100_000, help='تعداد کسب‌وکارهای آزمایشی')
+        parser.add_argument('--iterations', type=int, default=50, help='تعداد درخواست‌ها')
+        parser.add_argument('--radius', type=float, default=3, help='شعاع جستجو (کیلومتر)')
+        parser.add_argument('--naive-iterations', type=int, default=3, help='تعداد اجرای روش قبلی')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, count):
+        from decimal import Decimal
+        from accounts.geo import encode_geohash
+        from accounts.models import User, BusinessProfile
+        from packages.models import Package
+
+        rng = random.Random(42)
+        started = time.perf_counter()
+        users = User.objects.bulk_create(
+            [
+                User(username=f'bench_nearby_{i}', phone_number=f'08{i:09d}', role='business')
+                for i in range(count)
+            ],
+            batch_size=2000,
+        )
+        businesses = []
+        for i, user in enumerate(users):
+            lat = round(rng.uniform(*LAT_RANGE), 6)
+            lng = round(rng.uniform(*LNG_RANGE), 6)
+            businesses.append(BusinessProfile(
+                user=user,
+                name=f'کسب‌وکار {i}',
+                business_location_latitude=Decimal(str(lat)),
+                business_location_longitude=Decimal(str(lng)),
+                geohash=encode_geohash(lat, lng),
+            ))
+        businesses = BusinessProfile.objects.bulk_create(businesses, batch_size=2000)
+        Package.objects.bulk_create(
+            [
+                Package(business=business, is_active=True, status='approved', is_complete=True)
+                for business in businesses
+            ],
+            batch_size=2000,
+        )
+        self.stdout.write(f'seeded {count} businesses in {time.perf_counter() - started:.1f}s')
+
+    def _run(self, options):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from accounts.geo import haversine_km
+        from accounts.models import User
+        from packages.models import Package
+        from packages.views import nearby_packages
+
+        self._seed(options['businesses'])
+        customer = User.objects.create(
+            username='bench_nearby_customer', phone_number='09000000099', role='customer'
+        )
+        rng = random.Random(7)
+        points = [
+            (rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)) for _ in range(options['iterations'])
+        ]
+        radius = options['radius']
+
+        # روش قبلی: همه پکیج‌های فعال + مرتب‌سازی در حافظه
+        naive = []
+        for lat, lng in points[:options['naive_iterations']]:
+            started = time.perf_counter()
+            rows = Package.objects.filter(
+                is_active=True, status='approved', is_complete=True
+            ).values_list('id', 'business__business_location_latitude', 'business__business_location_longitude')
+            ranked = sorted(
+                (haversine_km(lat, lng, row_lat, row_lng), pk)
+                for pk, row_lat, row_lng in rows
+                if row_lat is not None and row_lng is not None
+            )
+            [pk for distance, pk in ranked if distance <= radius][:20]
+            naive.append((time.perf_counter() - started) * 1000)
+
+        factory = APIRequestFactory()
+        timings = []
+        queries = []
+        returned = []
+        for lat, lng in points:
+            request = factory.get('/api/packages/nearby/', {'lat': lat, 'lng': lng, 'radius': radius})
+            force_authenticate(request, user=customer)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = nearby_packages(request)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            returned.append(len(response.data['results']))
+
+        self.stdout.write(
+            f'naive (load all + sort): p50={_percentile(naive, 50):.1f}ms max={max(naive):.1f}ms'
+        )
+        self.stdout.write(
+            f'nearby endpoint:         p50={_percentile(timings, 50):.1f}ms '
+            f'p95={_percentile(timings, 95):.1f}ms queries={max(queries)} '
+            f'avg results={sum(returned) / len(returned):.1f}'
+        )
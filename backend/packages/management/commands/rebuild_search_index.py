@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+management command: rebuild_search_index
+ساخت کامل جدول FTS5 جستجوی کسب‌وکارها و پکیج‌ها (packages/search_index.py)
+(بعد از migrate یا تغییرات گروهی بدون سیگنال مثل queryset.update)
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'ساخت مجدد index جستجوی متنی کسب‌وکارها'
+
+    def handle(self, *args, **options):
+        from packages.search_index import available, rebuild_index
+
+        if not available():
+            self.stdout.write(self.style.WARNING('index متنی فقط روی SQLite ساخته می‌شود.'))
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'کسب‌وکارهای index شده: {count}'))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+خوشه‌بندی marker های نقشه در سرور بر اساس zoom
+
+هر zoom به یک دقت geohash نگاشت می‌شود و پکیج‌های فعال با GROUP BY روی پیشوند
+geohash کسب‌وکار (BusinessProfile.geohash) خوشه می‌شوند: تعداد، مرکز (میانگین
+مختصات) و یک کسب‌وکار نماینده.
+
+نتیجه در «کاشی»ها cache می‌شود: هر کاشی یک سلول geohash با دو کاراکتر کمتر از
+دقت خوشه‌ها است (حداکثر ۱۰۲۴ خوشه). viewport با چند کاشی پوشانده می‌شود و
+فعال/غیرفعال شدن پکیج یا تغییر مکان کسب‌وکار فقط کاشی‌های شامل آن نقطه را در
+همه zoom ها باطل می‌کند.
+"""
+from django.core.cache import cache
+from django.db.models import Avg, Count, FloatField, Min
+from django.db.models.functions import Cast, Substr
+
+from accounts.geo import cells_for_bbox, geohash_prefilter
+from core.cache_tier import get_or_compute
+
+# (کمترین zoom، دقت geohash خوشه‌ها) — سلول‌ها تقریباً هم‌اندازه ۴۰ تا ۸۰ پیکسل
+ZOOM_PRECISION = [
+    (0, 1),
+    (3, 2),
+    (5, 3),
+    (8, 4),
+    (10, 5),
+    (13, 6),
+    (15, 7),
+    (17, 8),
+]
+PRECISIONS = sorted({precision for _, precision in ZOOM_PRECISION})
+
+TILE_TTL = 120
+# بعد از TILE_TTL تا این مدت کاشی قبلی داده می‌شود تا یک درخواست آن را از نو بسازد
+TILE_GRACE = 30
+MAX_TILES = 64
+
+
+def precision_for_zoom(zoom):
+    result = ZOOM_PRECISION[0][1]
+    for min_zoom, precision in ZOOM_PRECISION:
+        if zoom >= min_zoom:
+            result = precision
+    return result
+
+
+def tile_precision(precision):
+    return max(0, precision - 2)
+
+
+def _tile_key(precision, tile):
+    return f"map_tile_{precision}_{tile or 'world'}"
+
+
+def build_tile(precision, tile):
+    """خوشه‌های یک کاشی با یک GROUP BY"""
+    from .models import Package
+
+    packages = Package.objects.filter(
+        is_active=True, status='approved', is_complete=True,
+    ).exclude(business__geohash='')
+    if tile:
+        packages = packages.filter(geohash_prefilter([tile], 'business__geohash'))
+
+    rows = list(
+        packages.annotate(cell=Substr('business__geohash', 1, precision))
+        .values('cell')
+        .annotate(
+            count=Count('id'),
+            lat=Avg(Cast('business__business_location_latitude', FloatField())),
+            lng=Avg(Cast('business__business_location_longitude', FloatField())),
+            package_id=Min('id'),
+        )
+        .order_by('cell')
+    )
+
+    # کسب‌وکار نماینده هر خوشه (کمترین id پکیج) با یک کوئری
+    representatives = {
+        package_id: (business_id, name)
+        for package_id, business_id, name in Package.objects.filter(
+            id__in=[row['package_id'] for row in rows]
+        ).values_list('id', 'business_id', 'business__name')
+    }
+    clusters = []
+    for row in rows:
+        business_id, name = representatives.get(row['package_id'], (None, None))
+        clusters.append({
+            'geohash': row['cell'],
+            'count': row['count'],
+            'lat': round(row['lat'], 6),
+            'lng': round(row['lng'], 6),
+            'business': {'id': business_id, 'name': name, 'package_id': row['package_id']},
+        })
+    return clusters
+
+
+def get_tile(precision, tile):
+    # کاشی‌های پرطرفدار (zoom های پایین) هم‌زمان فقط یک بار ساخته می‌شوند
+    return get_or_compute(
+        _tile_key(precision, tile), lambda: build_tile(precision, tile), TILE_TTL, grace=TILE_GRACE,
+    )
+
+
+def clusters_for_viewport(bbox, zoom):
+    """
+    خوشه‌های داخل viewport؛ bbox = (min_lat, max_lat, min_lng, max_lng)
+    اگر viewport برای این zoom بیش از حد بزرگ باشد None برگردانده می‌شود.
+    """
+    precision = precision_for_zoom(zoom)
+    tiles = cells_for_bbox(bbox, tile_precision(precision), MAX_TILES)
+    if tiles is None:
+        return precision, None
+    min_lat, max_lat, min_lng, max_lng = bbox
+    clusters = [
+        cluster
+        for tile in tiles
+        for cluster in get_tile(precision, tile)
+        if min_lat <= cluster['lat'] <= max_lat and min_lng <= cluster['lng'] <= max_lng
+    ]
+    return precision, clusters
+
+
+def invalidate_point(geohash):
+    """ابطال کاشی‌های همه zoom ها که این نقطه (geohash کسب‌وکار) در آن‌هاست"""
+    if not geohash:
+        return
+    cache.delete_many([
+        _tile_key(precision, geohash[:tile_precision(precision)]) for precision in PRECISIONS
+    ])
+
+
+def invalidate_business(business_id):
+    from accounts.models import BusinessProfile
+
+    geohash = BusinessProfile.objects.filter(pk=business_id).values_list('geohash', flat=True).first()
+    invalidate_point(geohash)
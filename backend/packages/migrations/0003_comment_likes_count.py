@@ -0,0 +1,35 @@
+# Generated by Django 5.0.7 on 2026-10-19 12:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_likes_count(apps, schema_editor):
+    Comment = apps.get_model('packages', 'Comment')
+    CommentLike = apps.get_model('packages', 'CommentLike')
+
+    counts = (
+        CommentLike.objects.filter(comment=OuterRef('pk'))
+        .order_by()
+        .values('comment')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Comment.objects.update(likes_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0002_comment_service_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='تعداد لایک'),
+        ),
+        migrations.RunPython(backfill_likes_count, migrations.RunPython.noop),
+    ]
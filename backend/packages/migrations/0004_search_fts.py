@@ -0,0 +1,29 @@
+# Generated by Django 5.0.7 on 2026-10-19 17:10
+
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    from packages.search_index import CREATE_SQL
+
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_search_table(apps, schema_editor):
+    from packages.search_index import TABLE
+
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+    """جدول FTS5 جستجو؛ پر کردن با python manage.py rebuild_search_index"""
+
+    dependencies = [
+        ('packages', '0003_comment_likes_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -47,6 +47,9 @@ class Comment(BaseModel):
         blank=True,
         verbose_name='نوع سرویس'
     )
+
+    # شمارنده لایک‌ها (با F expression در سیگنال‌های CommentLike به‌روز می‌شود)
+    likes_count = models.PositiveIntegerField(default=0, verbose_name='تعداد لایک')
     
     class Meta:
         verbose_name = 'کامنت'
@@ -69,6 +72,40 @@ class CommentLike(BaseModel):
     
     def __str__(self):
         return f'{self.user} liked {self.comment.id}'
+
+    @staticmethod
+    def liked_comment_ids(customer_profile, comment_ids):
+        """
+        مجموعه id کامنت‌هایی (از بین comment_ids) که این مشتری لایک کرده
+        برای یک صفحه کامنت فقط یک کوئری
+        """
+        if customer_profile is None or not comment_ids:
+            return set()
+        return set(
+            CommentLike.objects.filter(
+                user=customer_profile,
+                comment_id__in=comment_ids
+            ).values_list('comment_id', flat=True)
+        )
+
+    @staticmethod
+    def toggle(comment, customer_profile):
+        """
+        لایک/برداشتن لایک کامنت
+        خروجی: True اگر لایک شد، False اگر لایک برداشته شد
+        """
+        from django.db import IntegrityError, transaction
+
+        deleted, _ = CommentLike.objects.filter(comment=comment, user=customer_profile).delete()
+        if deleted:
+            return False
+        try:
+            with transaction.atomic():
+                CommentLike.objects.create(comment=comment, user=customer_profile)
+        except IntegrityError:
+            # درخواست همزمان همین کاربر زودتر لایک را ثبت کرده است
+            pass
+        return True
     
 
 #Business Package
@@ -214,10 +251,14 @@ class Package(BaseModel):
         # اگر پکیج فعالی وجود دارد اما کمتر از ۱۰ روز به پایان آن مانده، نمی‌تواند فعال شود
         return False
     
-    def activate_package(self):
+    def activate_package(self, source='manual'):
         """
         فعال کردن پکیج
+        source فقط برای metric است: approval | schedule | manual
         """
+        from django.db import transaction as db_transaction
+        from core import metrics
+
         # ابتدا تمام پکیج‌های فعال کسب‌وکار را غیرفعال کن
         self.deactivate_all_business_packages()
         
@@ -225,6 +266,8 @@ class Package(BaseModel):
         self.is_active = True
         # استفاده از update برای جلوگیری از signal recursion
         Package.objects.filter(id=self.id).update(is_active=True)
+        self._invalidate_activation_caches()
+        db_transaction.on_commit(lambda: metrics.PACKAGE_ACTIVATIONS.inc(source=source))
 
     def deactivate_package(self):
         """
@@ -232,6 +275,7 @@ class Package(BaseModel):
         """
         # استفاده از update برای جلوگیری از signal recursion
         Package.objects.filter(id=self.id).update(is_active=False)
+        self._invalidate_activation_caches()
     
     def deactivate_all_business_packages(self):
         """
@@ -242,6 +286,17 @@ class Package(BaseModel):
             is_active=True,
             status='approved'
         ).update(is_active=False)
+        self._invalidate_activation_caches()
+
+    def _invalidate_activation_caches(self):
+        """
+        ابطال cache اسکن QR و کاشی‌های نقشه کسب‌وکار
+        update() سیگنال post_save ارسال نمی‌کند، پس باید دستی انجام شود
+        """
+        from loyalty.scan_cache import invalidate_business
+        from .map_clusters import invalidate_business as invalidate_map_tiles
+        invalidate_business(self.business_id)
+        invalidate_map_tiles(self.business_id)
     
     @classmethod
     def activate_pending_packages_for_expired(cls):
@@ -274,7 +329,7 @@ class Package(BaseModel):
             
             if next_pending_package:
                 # فعال کردن پکیج بعدی
-                next_pending_package.activate_package()
+                next_pending_package.activate_package(source='schedule')
                 activated_count += 1
         
         return activated_count
@@ -386,9 +441,6 @@ class EliteGift(BaseModel):
                 'transactions_count': تعداد تراکنش‌های محاسبه شده
             }
         """
-        from loyalty.models import Transaction, EliteGiftClaim
-        from django.db.models import Sum, Count
-        
         # بررسی اینکه پکیج تاریخ شروع و پایان دارد
         if not self.package.start_date or not self.package.end_date:
             return {
@@ -401,36 +453,57 @@ class EliteGift(BaseModel):
                 'transactions_count': 0,
                 'error': 'پکیج فاقد تاریخ شروع یا پایان است'
             }
-        
+
+        return self.build_progress(self.get_progress_counters(customer))
+
+    def get_progress_counters(self, customer):
+        """
+        شمارنده‌های خام پیشرفت مشتری در بازه زمانی پکیج:
+        مجموع مبلغ و تعداد تراکنش‌های تایید شده + تعداد Elite Gift های تایید شده
+
+        خروجی فقط شامل اعداد است تا بتوان آن را cache کرد
+        (loyalty.scan_cache) و درصد پیشرفت را بدون کوئری محاسبه کرد.
+        """
+        from loyalty.models import Transaction, EliteGiftClaim
+        from django.db.models import Sum, Count
+
         # فیلتر تراکنش‌های تایید شده در بازه زمانی پکیج
-        transactions = Transaction.objects.filter(
+        totals = Transaction.objects.filter(
             customer=customer,
-            business=self.package.business,
-            package=self.package,
+            business_id=self.package.business_id,
+            package_id=self.package_id,
             status='approved',
             created_at__gte=self.package.start_date,
             created_at__lte=self.package.end_date
-        )
-        
+        ).aggregate(total=Sum('final_amount'), count=Count('id'))
+
         # تعداد Elite Gift های تایید شده
         approved_claims_count = EliteGiftClaim.objects.filter(
             customer=customer,
-            package=self.package,
+            package_id=self.package_id,
             elite_gift=self,
             status='approved'
         ).count()
-        
+
+        return {
+            'total_amount': float(totals['total'] or 0),
+            'transactions_count': totals['count'] or 0,
+            'approved_claims': approved_claims_count,
+        }
+
+    def build_progress(self, counters):
+        """
+        محاسبه پیشرفت از روی شمارنده‌های get_progress_counters
+        """
+        approved_claims_count = counters['approved_claims']
+
         if self.amount:
             # محاسبه بر اساس مبلغ
-            total_amount = transactions.aggregate(
-                total=Sum('final_amount')
-            )['total'] or 0
-            
             target = float(self.amount)
             
             # کسر مقدار Elite Gift های تایید شده
             total_deducted = target * approved_claims_count
-            current = float(total_amount) - total_deducted
+            current = counters['total_amount'] - total_deducted
             
             # اطمینان از اینکه current منفی نمی‌شود
             current = max(0, current)
@@ -446,14 +519,14 @@ class EliteGift(BaseModel):
                 'remaining': remaining,
                 'percentage': round(percentage, 1),
                 'eligible': eligible,
-                'transactions_count': transactions.count(),
+                'transactions_count': counters['transactions_count'],
                 'approved_claims': approved_claims_count,
                 'total_deducted': total_deducted
             }
         
         elif self.count:
             # محاسبه بر اساس تعداد
-            total_count = transactions.count()
+            total_count = counters['transactions_count']
             
             target = self.count
             
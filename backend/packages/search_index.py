@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+جستجوی متنی کسب‌وکارها و پکیج‌ها با SQLite FTS5
+
+جدول مجازی search_fts یک ردیف برای هر کسب‌وکار دارد (rowid = id پروفایل):
+- name, description, address
+- category: زنجیره نام دسته تا ریشه
+- club: نام باشگاه (effective_club_id دسته)
+- offers: عنوان/توضیح تخفیف ویژه، متن هدیه الیت و نام و توضیحات تجربه‌های
+  VIP پکیج‌های فعال
+
+متن‌ها و عبارت جستجو با همان قواعد نرمال‌سازی پروژه (حذف نیم‌فاصله، ی/ک
+عربی → فارسی؛ accounts/persian_text.py) یکسان می‌شوند.
+tokenizer جدول unicode61 است و هر کلمه عبارت جستجو به صورت پیشوندی ("کلمه"*)
+جستجو می‌شود. رتبه‌بندی با bm25 و وزن بیشتر برای نام.
+
+همگام‌سازی: سیگنال‌های accounts و packages بعد از commit ردیف کسب‌وکارهای
+تغییر کرده را بازسازی می‌کنند؛ command rebuild_search_index کل جدول را
+می‌سازد. روی دیتابیس غیر SQLite جدول وجود ندارد و search به icontains
+برمی‌گردد.
+"""
+import logging
+import threading
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+
+from accounts.persian_text import normalize, tokenize
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'search_fts'
+COLUMNS = ('name', 'description', 'category', 'club', 'address', 'offers')
+# وزن bm25 به ترتیب ستون‌ها
+WEIGHTS = (10.0, 2.0, 4.0, 3.0, 1.0, 2.0)
+MAX_QUERY_TERMS = 8
+
+# کسب‌وکارهای منتظر index شدن در transaction جاری (هر thread اتصال خودش را دارد)
+_local = threading.local()
+
+
+def _pending():
+    if not hasattr(_local, 'pending'):
+        _local.pending = set()
+    return _local.pending
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    + ', '.join(COLUMNS)
+    + ", tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def ensure_table():
+    """CREATE ... IF NOT EXISTS یک بار در هر process (دیتابیس‌های ساخته شده بدون migration)"""
+    if getattr(_local, 'table_ready', False):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_SQL)
+    _local.table_ready = True
+
+
+def _join(values):
+    return normalize(' '.join(value for value in values if value))
+
+
+def _offers(business):
+    texts = []
+    for package in business.packages.all():
+        if not (package.is_active and package.status == 'approved'):
+            continue
+        specific = getattr(package, 'specific_discount', None)
+        if specific:
+            texts += [specific.title, specific.description]
+        gift = getattr(package, 'elite_gift', None)
+        if gift:
+            texts.append(gift.gift)
+        for experience in package.experiences.all():
+            texts += [experience.vip_experience_category.name, experience.description]
+    return texts
+
+
+def document(business):
+    """مقادیر ستون‌های FTS برای یک کسب‌وکار"""
+    from accounts.category_tree import category_name_chain, get_category
+    from accounts.reference_registry import registry
+
+    category = get_category(business.category_id) if business.category_id else None
+    club = registry.get().clubs_by_id.get(category.effective_club_id) if category else None
+    return (
+        normalize(business.name),
+        normalize(business.description),
+        normalize(category_name_chain(category)),
+        normalize(club.name if club else ''),
+        normalize(business.address),
+        _join(_offers(business)),
+    )
+
+
+def _businesses(ids=None):
+    from accounts.models import BusinessProfile
+
+    queryset = BusinessProfile.objects.only(
+        'id', 'name', 'description', 'address', 'category_id'
+    ).prefetch_related(
+        'packages__specific_discount', 'packages__elite_gift',
+        'packages__experiences__vip_experience_category',
+    )
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return queryset
+
+
+def index_businesses(business_ids):
+    """بازسازی ردیف کسب‌وکارهای داده شده (حذف شده‌ها فقط حذف می‌شوند)"""
+    if not available():
+        return
+    business_ids = list(business_ids)
+    if not business_ids:
+        return
+    rows = [(business.pk, *document(business)) for business in _businesses(business_ids)]
+    placeholders = ', '.join(['%s'] * len(business_ids))
+    try:
+        ensure_table()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', business_ids)
+            _insert(rows)
+    except DatabaseError:
+        # خطای index نباید ذخیره اصلی را خراب کند؛ rebuild_search_index بعداً همه را می‌سازد
+        logger.warning('search index update failed for businesses %s', business_ids, exc_info=True)
+
+
+def schedule_reindex(business_ids):
+    """
+    بازسازی بعد از commit؛ id های یک transaction جمع و یک بار index می‌شوند
+    (اگر transaction rollback شود، id ها در flush بعدی index می‌شوند که بی‌ضرر است)
+    """
+    business_ids = {business_id for business_id in business_ids if business_id}
+    if not business_ids:
+        return
+    _pending().update(business_ids)
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    pending = _pending()
+    if not pending:
+        return
+    business_ids = set(pending)
+    pending.clear()
+    index_businesses(business_ids)
+
+
+def rebuild_index(batch_size=500):
+    """ساخت کامل جدول؛ خروجی: تعداد ردیف‌ها"""
+    if not available():
+        return 0
+    ensure_table()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    count = 0
+    batch = []
+    for business in _businesses().iterator(chunk_size=batch_size):
+        batch.append((business.pk, *document(business)))
+        if len(batch) >= batch_size:
+            count += _insert(batch)
+            batch = []
+    count += _insert(batch)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def _insert(rows):
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, {', '.join(COLUMNS)}) VALUES (%s{', %s' * len(COLUMNS)})",
+                rows,
+            )
+    return len(rows)
+
+
+def match_expression(query, any_terms=False):
+    """
+    عبارت MATCH: همه کلمات (AND) یا با any_terms هر کدام (OR)، هر کلمه پیشوندی؛
+    None یعنی عبارت خالی
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return (' OR ' if any_terms else ' ').join(f'"{term}"*' for term in terms)
+
+
+def search(query, limit=20, offset=0, any_terms=False):
+    """
+    [(business_id, score), ...] برای کسب‌وکارهایی که پکیج فعال دارند؛
+    score بزرگ‌تر = مرتبط‌تر. any_terms: کافی است یکی از کلمات بیاید (bm25
+    کسب‌وکارهایی با کلمات بیشتر را بالاتر می‌برد)
+    """
+    from accounts.models import BusinessProfile
+    from .models import Package
+
+    expression = match_expression(query, any_terms)
+    if expression is None:
+        return []
+    if not available():
+        if any_terms:
+            condition = Q()
+            for term in tokenize(query)[:MAX_QUERY_TERMS]:
+                condition |= Q(name__icontains=term)
+        else:
+            condition = Q(name__icontains=query.strip())
+        ids = BusinessProfile.objects.filter(
+            packages__is_active=True, packages__status='approved', packages__is_complete=True,
+        ).filter(condition).distinct().order_by('id').values_list('id', flat=True)
+        return [(business_id, 0.0) for business_id in ids[offset:offset + limit]]
+
+    ensure_table()
+    package_table = Package._meta.db_table
+    weights = ', '.join(str(weight) for weight in WEIGHTS)
+    sql = (
+        f'SELECT {TABLE}.rowid, -bm25({TABLE}, {weights}) AS score FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s AND {TABLE}.rowid IN ('
+        f'  SELECT business_id FROM {package_table}'
+        f"  WHERE is_active = 1 AND status = 'approved' AND is_complete = 1"
+        f') ORDER BY score DESC LIMIT %s OFFSET %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [expression, limit, offset])
+        return [(row[0], row[1]) for row in cursor.fetchall()]
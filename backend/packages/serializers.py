@@ -1,3 +1,4 @@
+from django.db import models
 from rest_framework import serializers
 from .models import (
     Package, DiscountAll, SpecificDiscount, EliteGift, 
@@ -6,29 +7,53 @@ from .models import (
 from accounts.models import BusinessProfile
 
 
+def get_request_customer_profile(request):
+    """CustomerProfile کاربر درخواست یا None"""
+    if request and request.user.is_authenticated:
+        try:
+            return request.user.customerprofile
+        except Exception:
+            return None
+    return None
+
+
+class CommentListSerializer(serializers.ListSerializer):
+    """
+    لیست کامنت‌ها با دو کوئری ثابت: کامنت‌ها (با user) + لایک‌های کاربر جاری
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        if isinstance(data, models.QuerySet):
+            data = data.select_related('user__user')
+        comments = list(data)
+        customer_profile = get_request_customer_profile(self.context.get('request'))
+        self.child.liked_ids = CommentLike.liked_comment_ids(
+            customer_profile, [c.id for c in comments]
+        )
+        return super().to_representation(comments)
+
+
 class CommentSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.user.first_name', read_only=True)
     user_last_name = serializers.CharField(source='user.user.last_name', read_only=True)
-    likes_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
     
     class Meta:
         model = Comment
         fields = ['id', 'text', 'score', 'service_type', 'user_name', 'user_last_name', 'created_at', 'likes_count', 'is_liked']
-        read_only_fields = ['id', 'created_at']
-    
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+        read_only_fields = ['id', 'created_at', 'likes_count']
+        list_serializer_class = CommentListSerializer
     
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                customer_profile = request.user.customerprofile
-                return obj.likes.filter(user=customer_profile).exists()
-            except:
-                return False
-        return False
+        liked_ids = getattr(self, 'liked_ids', None)
+        if liked_ids is not None:
+            return obj.id in liked_ids
+        customer_profile = get_request_customer_profile(self.context.get('request'))
+        if customer_profile is None:
+            return False
+        return obj.likes.filter(user=customer_profile).exists()
 
 
 class DiscountAllSerializer(serializers.ModelSerializer):
@@ -274,21 +299,17 @@ class PackageListSerializer(serializers.ModelSerializer):
         """تعداد کل نظرات پکیج"""
         return obj.get_total_comments_count()
     
-    def _absolute_media_url(self, request, file_field):
-        if not file_field:
-            return None
-        try:
-            url = file_field.url
-            return request.build_absolute_uri(url) if request else url
-        except Exception:
-            return None
+    def _variant_media_url(self, request, file_field, variants, slot):
+        """نسخه کوچک‌شده متناسب با جایگاه در فید (در صورت آماده بودن)"""
+        from accounts.image_pipeline import variant_url
+        return variant_url(file_field, variants, slot, request)
 
-    def _get_business_owner_image(self, business_profile, request):
+    def _get_business_owner_image(self, business_profile, request, slot='thumb'):
         """عکس پروفایل صاحب کسب‌وکار (همان تصویری که در پروفایل آپلود می‌شود)"""
         try:
             user = getattr(business_profile, 'user', None)
             if user and user.image:
-                return self._absolute_media_url(request, user.image)
+                return self._variant_media_url(request, user.image, user.image_variants, slot)
         except Exception:
             pass
         return None
@@ -301,7 +322,9 @@ class PackageListSerializer(serializers.ModelSerializer):
                 return None
             request = self.context.get('request')
             if business_profile.logo:
-                return self._absolute_media_url(request, business_profile.logo)
+                return self._variant_media_url(
+                    request, business_profile.logo, business_profile.logo_variants, 'thumb'
+                )
             return self._get_business_owner_image(business_profile, request)
         except Exception as e:
             print(f"Error getting business logo: {e}")
@@ -317,16 +340,20 @@ class PackageListSerializer(serializers.ModelSerializer):
 
             featured = business_profile.get_featured_image()
             if featured and featured.image:
-                return self._absolute_media_url(request, featured.image)
+                return self._variant_media_url(request, featured.image, featured.image_variants, 'card')
 
             first_gallery = business_profile.gallery_images.first()
             if first_gallery and first_gallery.image:
-                return self._absolute_media_url(request, first_gallery.image)
+                return self._variant_media_url(
+                    request, first_gallery.image, first_gallery.image_variants, 'card'
+                )
 
             if business_profile.logo:
-                return self._absolute_media_url(request, business_profile.logo)
+                return self._variant_media_url(
+                    request, business_profile.logo, business_profile.logo_variants, 'card'
+                )
 
-            return self._get_business_owner_image(business_profile, request)
+            return self._get_business_owner_image(business_profile, request, slot='card')
         except Exception as e:
             print(f"Error getting business image: {e}")
         return None
@@ -388,9 +415,8 @@ class PackageListSerializer(serializers.ModelSerializer):
             result = []
             for img in images:
                 if img.image:
-                    url = img.image.url
                     result.append(
-                        request.build_absolute_uri(url) if request else url
+                        self._variant_media_url(request, img.image, img.image_variants, 'card')
                     )
             return result
         except Exception as e:
@@ -1,7 +1,12 @@
-from django.db.models.signals import post_save
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Package
+from accounts.models import BusinessProfile, City, Club, ServiceCategory
+from .models import (
+    Package, Comment, CommentLike, VipExperienceCategory,
+    SpecificDiscount, EliteGift, VipExperience,
+)
 
 
 @receiver(post_save, sender=Package)
@@ -25,7 +30,7 @@ def handle_package_activation(sender, instance, created, **kwargs):
                 # علامت‌گذاری برای جلوگیری از recursion
                 instance._signal_processing = True
                 try:
-                    instance.activate_package()
+                    instance.activate_package(source='approval')
                 finally:
                     if hasattr(instance, '_signal_processing'):
                         delattr(instance, '_signal_processing')
@@ -39,3 +44,121 @@ def handle_package_activation(sender, instance, created, **kwargs):
                 finally:
                     if hasattr(instance, '_signal_processing'):
                         delattr(instance, '_signal_processing')
+
+
+@receiver(post_save, sender=CommentLike)
+def increment_comment_likes(sender, instance, created, **kwargs):
+    """
+    افزایش اتمیک شمارنده لایک کامنت
+    """
+    if created:
+        Comment.objects.filter(pk=instance.comment_id).update(likes_count=F('likes_count') + 1)
+
+
+@receiver(post_delete, sender=CommentLike)
+def decrement_comment_likes(sender, instance, origin=None, **kwargs):
+    """
+    کاهش اتمیک شمارنده لایک کامنت (شامل حذف از inline ادمین و cascade)
+    """
+    # خود کامنت در حال حذف است؛ به‌روزرسانی شمارنده لازم نیست
+    if isinstance(origin, Comment) or (isinstance(origin, QuerySet) and origin.model is Comment):
+        return
+    Comment.objects.filter(pk=instance.comment_id, likes_count__gt=0).update(
+        likes_count=F('likes_count') - 1
+    )
+
+
+@receiver(post_save, sender=VipExperienceCategory)
+@receiver(post_delete, sender=VipExperienceCategory)
+def invalidate_vip_categories(sender, **kwargs):
+    """ابطال snapshot و رجیستری دسته‌بندی‌های VIP (accounts/signals.py)"""
+    from accounts.signals import invalidate_reference_data
+    invalidate_reference_data(sender)
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+def invalidate_package_map_tiles(sender, instance, **kwargs):
+    """فعال/غیرفعال شدن پکیج → کاشی‌های خوشه نقشه در محل کسب‌وکار باطل شوند"""
+    from .map_clusters import invalidate_business
+    invalidate_business(instance.business_id)
+
+
+# ─── index جستجوی متنی (packages/search_index.py) ─────────────────
+
+@receiver(post_save, sender=BusinessProfile)
+@receiver(post_delete, sender=BusinessProfile)
+def reindex_business(sender, instance, **kwargs):
+    from .search_index import schedule_reindex
+    schedule_reindex([instance.pk])
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+def reindex_package_business(sender, instance, **kwargs):
+    from .search_index import schedule_reindex
+    schedule_reindex([instance.business_id])
+
+
+@receiver(post_save, sender=SpecificDiscount)
+@receiver(post_delete, sender=SpecificDiscount)
+@receiver(post_save, sender=EliteGift)
+@receiver(post_delete, sender=EliteGift)
+@receiver(post_save, sender=VipExperience)
+@receiver(post_delete, sender=VipExperience)
+def reindex_offer_business(sender, instance, **kwargs):
+    from .search_index import schedule_reindex
+    # در حذف آبشاری پکیج، سیگنال خود Package کسب‌وکار را index می‌کند
+    schedule_reindex(
+        Package.objects.filter(pk=instance.package_id).values_list('business_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=ServiceCategory)
+@receiver(post_save, sender=Club)
+def reindex_category_businesses(sender, instance, **kwargs):
+    """نام دسته/باشگاه در ستون‌های category و club کسب‌وکارهای زیرمجموعه است"""
+    from django.db.models import Q
+    from .search_index import schedule_reindex
+
+    if sender is Club:
+        condition = Q(category__effective_club_id=instance.pk) | Q(category__club_id=instance.pk)
+    else:
+        condition = Q(category_id=instance.pk) | Q(category__path__contains=f'/{instance.pk}/')
+    schedule_reindex(BusinessProfile.objects.filter(condition).values_list('id', flat=True))
+
+
+# ─── index typeahead همین process (packages/typeahead.py) ─────────────────
+
+@receiver(post_save, sender=BusinessProfile)
+@receiver(post_delete, sender=BusinessProfile)
+def refresh_typeahead_business(sender, instance, **kwargs):
+    from django.db import transaction
+    from .typeahead import refresh
+    transaction.on_commit(lambda: refresh('business', instance.pk))
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+def refresh_typeahead_package_business(sender, instance, **kwargs):
+    from django.db import transaction
+    from .typeahead import refresh
+    business_id = instance.business_id
+    transaction.on_commit(lambda: refresh('business', business_id))
+
+
+_TYPEAHEAD_KINDS = {Club: 'club', ServiceCategory: 'category', City: 'city'}
+
+
+def refresh_typeahead_reference(sender, instance, **kwargs):
+    from django.db import transaction
+    from .typeahead import refresh
+    # مثل کسب‌وکارها بعد از commit؛ تغییر rollback شده نباید index را عوض کند
+    kind, pk = _TYPEAHEAD_KINDS[sender], instance.pk
+    label = None if kwargs.get('signal') is post_delete else instance.name
+    transaction.on_commit(lambda: refresh(kind, pk, label))
+
+
+for _model in _TYPEAHEAD_KINDS:
+    post_save.connect(refresh_typeahead_reference, sender=_model, dispatch_uid=f'typeahead_save_{_model._meta.label}')
+    post_delete.connect(refresh_typeahead_reference, sender=_model, dispatch_uid=f'typeahead_delete_{_model._meta.label}')
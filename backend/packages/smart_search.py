@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+جستجوی هوشمند باشگاه در دو مرحله (retrieve → rerank)
+
+۱. retrieve (محلی، چند میلی‌ثانیه): از کل کاتالوگ سمت سرور (پکیج‌های فعال، با
+   فیلترهای facets.parse_filters) حداکثر SMART_SEARCH_TOP_K نامزد انتخاب می‌شود:
+   - متنی: search_index.search با OR کلمات عبارت (bm25؛ نام، دسته، باشگاه و
+     متن پیشنهادها/تجربه‌ها)
+   - باشگاه: کلمات کلیدی باشگاه در عبارت (persian_text.scan) → پکیج‌های آن باشگاه
+   - تکمیل: اگر هنوز جا هست، جدیدترین پکیج‌ها تا LLM برای عبارت‌های توصیفی
+     بی‌کلمه مشترک هم گزینه داشته باشد
+۲. rerank: فقط خلاصه فشرده نامزدها (فیلدهای خالی حذف، متن تجربه‌ها کوتاه شده،
+   حداکثر SMART_SEARCH_PROMPT_CHARS کاراکتر) به llm_search.rank_catalog می‌رود.
+
+فراخوانی‌های هم‌زمان یکسان یکی می‌شوند و بودجه توکن دقیقه‌ای سراسری/کاربر
+رعایت می‌شود (llm_guard.py): با بودجه کم، نامزدها کمتر می‌شوند و بدون بودجه
+ترتیب retrieve به عنوان رتبه‌بندی محلی برمی‌گردد (provider=local، ok=False).
+بدون کلید Groq یا با شکست provider بودجه‌ای مصرف نمی‌شود.
+
+بودجه هر مرحله و زمان‌ها در پاسخ (pipeline) برمی‌گردد.
+"""
+import json
+import time
+
+from django.conf import settings
+
+from accounts.persian_text import scan, tokenize
+
+DEFAULT_TOP_K = 24
+MAX_TOP_K = 60
+DEFAULT_PROMPT_CHARS = 6000
+DEFAULT_RERANK_TIMEOUT = 8
+# حداقل نامزد وقتی به خاطر بودجه توکن کم می‌شوند
+MIN_DEGRADED_ITEMS = 8
+# طول متن هر تجربه (gold/vip) در خلاصه
+SUMMARY_TEXT_CHARS = 90
+# کلمات پرتکرار عبارت‌های توصیفی که در bm25 فقط نویز می‌سازند (به شکل نرمال شده)
+STOP_WORDS = frozenset({
+    'و', 'یا', 'با', 'برای', 'به', 'از', 'در', 'که', 'این', 'اون', 'آن', 'یه', 'یک',
+    'جای', 'جایی', 'میخوام', 'خوب', 'خیلی', 'هم', 'رو', 'را',
+    'کجا', 'چی', 'چه', 'تا', 'من', 'ما', 'مون', 'بریم', 'برم',
+})
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def feed(filters=None):
+    """کاتالوگ سمت سرور: پکیج‌های فعال (همان شرط feed مشتری) با فیلترها"""
+    from .facets import apply_filters
+    from .models import Package
+
+    queryset = Package.objects.filter(is_active=True, status='approved', is_complete=True)
+    return apply_filters(queryset, filters or {})
+
+
+def query_terms(query):
+    return [term for term in tokenize(query) if len(term) > 1 and term not in STOP_WORDS]
+
+
+def _query_club_ids(query):
+    """id باشگاه‌هایی که کلمات کلیدی‌شان در عبارت آمده (نسخه canonical و تکراری‌ها)"""
+    from accounts.reference_registry import registry
+    from .club_utils import club_ids_for_lookup
+
+    data = registry.get()
+    ids = set()
+    for club_name in scan(query).get('club', ()):
+        club = data.clubs_by_name.get(club_name)
+        if club:
+            ids.update(club_ids_for_lookup(club))
+    return ids
+
+
+def retrieve(query, filters=None, top_k=DEFAULT_TOP_K):
+    """
+    [(package_id, source), ...] به ترتیب ارتباط؛ source: text | club | fill
+    """
+    from .search_index import search
+
+    catalog = feed(filters)
+    candidates = []
+    seen = set()
+
+    def extend(package_ids, source):
+        for package_id in package_ids:
+            if len(candidates) >= top_k:
+                return
+            if package_id not in seen:
+                seen.add(package_id)
+                candidates.append((package_id, source))
+
+    terms = query_terms(query)
+    if terms:
+        ranked = search(' '.join(terms), limit=top_k * 2, any_terms=True)
+        if ranked:
+            order = {business_id: index for index, (business_id, _) in enumerate(ranked)}
+            rows = catalog.filter(business_id__in=order).values_list('id', 'business_id')
+            extend(
+                (package_id for package_id, business_id in sorted(rows, key=lambda row: (order[row[1]], -row[0]))),
+                'text',
+            )
+
+    if len(candidates) < top_k:
+        club_ids = _query_club_ids(query)
+        if club_ids:
+            extend(
+                catalog.filter(business__category__effective_club_id__in=club_ids)
+                .exclude(pk__in=seen).order_by('-id').values_list('id', flat=True)[:top_k],
+                'club',
+            )
+
+    if len(candidates) < top_k:
+        extend(catalog.exclude(pk__in=seen).order_by('-id').values_list('id', flat=True)[:top_k], 'fill')
+    return candidates
+
+
+def _clip(text, limit=SUMMARY_TEXT_CHARS):
+    text = ' '.join((text or '').split())
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def _experience_text(package, vip_type):
+    for experience in package.experiences.all():
+        category = experience.vip_experience_category
+        if category.vip_type == vip_type:
+            description = experience.description or category.description
+            return _clip(f'{category.name}: {description}' if description else category.name)
+    return ''
+
+
+def summarize(packages):
+    """خلاصه فشرده هر پکیج برای prompt؛ فیلدهای خالی حذف می‌شوند"""
+    from accounts.category_tree import get_category
+    from accounts.reference_registry import registry
+
+    data = registry.get()
+    summaries = []
+    for package in packages:
+        business = package.business
+        category = get_category(business.category_id) if business.category_id else None
+        club = data.clubs_by_id.get(category.effective_club_id) if category else None
+        item = {
+            'id': package.pk,
+            'name': business.name,
+            'club': club.name if club else '',
+            'category': category.name if category else '',
+            'city': business.city.name if business.city_id else '',
+            'gold': _experience_text(package, 'VIP'),
+            'vip': _experience_text(package, 'VIP+'),
+        }
+        summaries.append({key: value for key, value in item.items() if value})
+    return summaries
+
+
+def _load(package_ids):
+    from .models import Package
+
+    packages = Package.objects.filter(pk__in=package_ids).select_related(
+        'business', 'business__city'
+    ).prefetch_related('experiences__vip_experience_category')
+    by_id = {package.pk: package for package in packages}
+    return [by_id[package_id] for package_id in package_ids if package_id in by_id]
+
+
+def _within_budget(summaries, budget):
+    """تا جایی که طول JSON خلاصه‌ها از بودجه کاراکتر prompt بیشتر نشود"""
+    kept = []
+    used = 2
+    for item in summaries:
+        size = len(json.dumps(item, ensure_ascii=False, separators=(',', ':'))) + 1
+        if kept and used + size > budget:
+            break
+        kept.append(item)
+        used += size
+    return kept, used
+
+
+def _local_result(query, candidates, reason):
+    """رتبه‌بندی محلی (ترتیب retrieve) وقتی LLM فراخوانی نمی‌شود؛ نامزدهای تکمیلی حذف می‌شوند"""
+    from .llm_guard import retry_after
+
+    ranked = [package_id for package_id, source in candidates if source != 'fill']
+    # ok=False: frontend نتیجه را رتبه‌بندی هوش مصنوعی نشان ندهد
+    return {
+        'ok': False,
+        'provider': 'local',
+        'reason': reason,
+        'intents': [],
+        'prefer_tab': 'gold',
+        'keywords': query_terms(query)[:12],
+        'ranked_ids': ranked,
+        'retry_after': retry_after(),
+    }
+
+
+def _fit_tokens(query, summaries, available):
+    """کم کردن نامزدها تا تخمین توکن در بودجه باقی‌مانده جا شود؛ None یعنی جا نمی‌شود"""
+    from .llm_search import estimate_tokens
+
+    count = len(summaries)
+    while count >= min(MIN_DEGRADED_ITEMS, len(summaries)):
+        prompt_tokens, completion_tokens = estimate_tokens(query, summaries[:count])
+        if prompt_tokens + completion_tokens <= available:
+            return summaries[:count], prompt_tokens + completion_tokens
+        count -= max(1, count // 4)
+    return None, None
+
+
+def smart_search(query, filters=None, top_k=None, user_id=None):
+    """
+    خروجی: نتیجه rank_catalog (یا رتبه‌بندی محلی وقتی بودجه توکن تمام شده) به
+    اضافه candidate_ids و pipeline (بودجه و زمان‌ها)
+    """
+    from . import llm_guard
+    from .llm_search import groq_configured, rank_catalog
+
+    top_k = top_k or _setting('SMART_SEARCH_TOP_K', DEFAULT_TOP_K)
+    top_k = max(1, min(top_k, MAX_TOP_K))
+    prompt_budget = _setting('SMART_SEARCH_PROMPT_CHARS', DEFAULT_PROMPT_CHARS)
+    rerank_timeout = _setting('SMART_SEARCH_RERANK_TIMEOUT', DEFAULT_RERANK_TIMEOUT)
+    timings = {}
+    started = time.perf_counter()
+
+    stage = time.perf_counter()
+    candidates = retrieve(query, filters, top_k)
+    timings['retrieve'] = _elapsed_ms(stage)
+
+    stage = time.perf_counter()
+    summaries, prompt_chars = _within_budget(
+        summarize(_load([package_id for package_id, _ in candidates])), prompt_budget
+    )
+    timings['summarize'] = _elapsed_ms(stage)
+
+    guard = {'shared': False, 'degraded': False, 'estimated_tokens': None}
+    stage = time.perf_counter()
+    if not summaries:
+        result = {'ok': False, 'reason': 'empty_catalog'}
+    elif not groq_configured():
+        # بدون کلید فراخوانی‌ای نیست که بودجه رزرو کند
+        result = {'ok': False, 'reason': 'missing_key'}
+    else:
+        key = llm_guard.flight_key(query, summaries)
+        result = llm_guard.cached_result(key)
+        if result is not None:
+            guard['shared'] = True
+        else:
+            fitted, estimate = _fit_tokens(query, summaries, llm_guard.remaining(user_id))
+            if fitted is None:
+                result = _local_result(query, candidates, 'budget_exhausted')
+            else:
+                guard['degraded'] = len(fitted) < len(summaries)
+                guard['estimated_tokens'] = estimate
+                summaries = fitted
+                key = llm_guard.flight_key(query, summaries)
+
+                def call():
+                    reservation = llm_guard.reserve(user_id, estimate)
+                    if reservation is None:
+                        return _local_result(query, candidates, 'budget_exhausted')
+                    try:
+                        response = rank_catalog(query, summaries, timeout=rerank_timeout)
+                    except Exception:
+                        reservation.settle(0)
+                        raise
+                    if not response.get('ok'):
+                        # خطا، timeout یا پاسخ غیر 2xx: توکنی مصرف حساب نمی‌شود
+                        reservation.settle(0)
+                        return response
+                    usage = response.get('usage') or {}
+                    if usage.get('prompt_tokens') is not None:
+                        reservation.settle(usage['prompt_tokens'] + (usage.get('completion_tokens') or 0))
+                    return response
+
+                result, guard['shared'] = llm_guard.single_flight(key, call, rerank_timeout + 2)
+        # نتیجه مشترک cache شده است؛ pipeline هر درخواست جداست
+        result = dict(result)
+    timings['rerank'] = _elapsed_ms(stage)
+    timings['total'] = _elapsed_ms(started)
+    guard['budget_remaining'] = llm_guard.remaining(user_id)
+
+    sources = {}
+    for _, source in candidates:
+        sources[source] = sources.get(source, 0) + 1
+    result['candidate_ids'] = [item['id'] for item in summaries]
+    result['pipeline'] = {
+        'retrieve': {'top_k': top_k, 'candidates': len(candidates), 'sources': sources},
+        'rerank': {
+            'sent': len(summaries),
+            'prompt_chars': prompt_chars,
+            'prompt_budget': prompt_budget,
+            'timeout_s': rerank_timeout,
+            **guard,
+        },
+        'timings_ms': timings,
+    }
+    return result
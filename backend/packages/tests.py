@@ -1,3 +1,122 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from core import db_router
+from core.cache_tier import Namespace
+
+
+@api_view(['GET'])
+@db_router.replica_reads
+def _cached_count_view(request):
+    # مثل facets: نتیجه با get_or_compute (قفل cache.add + cache.set) در cache مشترک
+    count = Namespace('replica_test').get_or_compute('users', compute=lambda: User.objects.count())
+    return Response({'count': count, 'wrote': db_router.wrote()})
+
+
+urlpatterns = [path('cached-count/', _cached_count_view)]
+
+
+class ReplicaCacheRoutingTests(TransactionTestCase):
+    """
+    DatabaseCache (پیش‌فرض core/cache_tier.py) روی default می‌ماند و نوشتن در آن
+    درخواست فقط‌خواندنی را از replica بیرون نمی‌برد
+    """
+
+    def setUp(self):
+        # replica همان فایل دیتابیس تست است (مثل replica کاملاً همگام)
+        connections.settings[db_router.REPLICA_DB] = dict(connections[db_router.DEFAULT_DB].settings_dict)
+        patcher = mock.patch('core.db_router.replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._drop_replica)
+        cache.clear()
+
+        user = User.objects.create_user(username='reader', phone_number='09120000001', role='customer')
+        self.user = user
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def _drop_replica(self):
+        connections[db_router.REPLICA_DB].close()
+        del connections[db_router.REPLICA_DB]
+        del connections.settings[db_router.REPLICA_DB]
+
+    def test_cache_writes_do_not_count_as_writes(self):
+        tokens = db_router.reset()
+        try:
+            with db_router.use_replica():
+                self.assertIsNone(cache.get('replica-test'))
+                self.assertTrue(cache.add('replica-test', 1))
+                cache.set('replica-test', 2)
+                self.assertEqual(cache.get('replica-test'), 2)
+            self.assertFalse(db_router.wrote())
+        finally:
+            db_router.restore(tokens)
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_replica_get_that_fills_cache_stays_on_replica(self):
+        with mock.patch('core.db_router.mark_sticky') as mark_sticky, \
+                CaptureQueriesContext(connections[db_router.REPLICA_DB]) as replica_queries, \
+                CaptureQueriesContext(connections[db_router.DEFAULT_DB]) as default_queries:
+            response = self.client.get('/cached-count/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'count': 1, 'wrote': False})
+        mark_sticky.assert_not_called()
+        self.assertTrue(any('accounts_user' in query['sql'] for query in replica_queries))
+        self.assertFalse(any('accounts_user' in query['sql'] for query in default_queries))
+        # cache (قفل get_or_compute و نتیجه) همیشه روی default
+        self.assertTrue(any('django_cache' in query['sql'] for query in default_queries))
+        self.assertFalse(any('django_cache' in query['sql'] for query in replica_queries))
+
+
+@override_settings(LLM_TOKENS_PER_MINUTE=1000, LLM_USER_TOKENS_PER_MINUTE=1000)
+class TokenBudgetConcurrencyTests(TransactionTestCase):
+    """رزرو هم‌زمان از چند thread (مثل چند worker) از بودجه دقیقه بیشتر نمی‌شود"""
+
+    threads = 8
+    attempts = 10
+    tokens = 100
+
+    def _reserve(self, barrier, reservations):
+        from .llm_guard import reserve
+
+        barrier.wait()
+        try:
+            for _ in range(self.attempts):
+                reservation = reserve(None, self.tokens)
+                if reservation is not None:
+                    reservations.append(reservation)
+        finally:
+            connections.close_all()
+
+    def test_parallel_reservations_never_exceed_budget(self):
+        from . import llm_guard
+
+        cache.clear()
+        barrier = threading.Barrier(self.threads)
+        reservations = []
+        # همه رزروها در یک پنجره دقیقه
+        with mock.patch.object(llm_guard, '_window', return_value=1):
+            workers = [
+                threading.Thread(target=self._reserve, args=(barrier, reservations))
+                for _ in range(self.threads)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            used = llm_guard.used(llm_guard.GLOBAL_SCOPE)
+
+        self.assertEqual(len(reservations) * self.tokens, 1000)
+        self.assertEqual(used, 1000)
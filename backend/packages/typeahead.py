@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+"""
+index حافظه‌ای typeahead برای نام کسب‌وکارها (با پکیج فعال)، دسته‌ها، باشگاه‌ها و شهرها
+
+کلیدها:
+- هر کلمه نام و کل نام بدون فاصله، نرمال شده (accounts/persian_text.py؛ ی/ک عربی
+  و نیم‌فاصله یکسان می‌شوند)
+- اسکلت صامت لاتین هر کلمه تا تایپ فینگلیش (cafe، tehran) هم پیدا شود
+
+جستجو:
+۱. پیشوندی روی trie کلیدها (کلیدهای کوتاه‌تر اول)
+۲. اگر نتیجه کم بود، fallback فازی با trigram های کاراکتری (غلط تایپی)
+
+ساخت: هنگام بالا آمدن worker (warm در core/wsgi.py) یا در اولین درخواست.
+به‌روزرسانی:
+- همین process: سیگنال‌های post_save/post_delete بعد از commit (packages/signals.py)
+- workerهای دیگر: هر TYPEAHEAD_SYNC_SECONDS ردیف‌هایی که modified_at آن‌ها بعد
+  از آخرین همگام‌سازی است دوباره index می‌شوند؛ هر TYPEAHEAD_REBUILD_SECONDS
+  کل index از نو ساخته می‌شود (حذف‌ها و تغییرات queryset.update)
+- ساخت دوباره چند ثانیه طول می‌کشد (۱۰۰هزار کسب‌وکار حدود ۴ ثانیه)؛ پس در
+  یک thread پس‌زمینه (فقط یکی در هر process) در یک TypeaheadIndex تازه انجام
+  می‌شود و در پایان ارجاع index یکجا عوض می‌شود. تا آن موقع درخواست‌ها با
+  index قبلی جواب می‌گیرند. تغییرات حین ساخت با sync بعدی index تازه (از
+  لحظه شروع ساخت) اعمال می‌شوند.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.utils import timezone
+
+from accounts.persian_text import normalize, normalize_compact, skeleton, tokenize
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('club', 'category', 'city', 'business')
+# ترتیب نمایش انواع در نتیجه‌های هم‌رتبه
+KIND_ORDER = {kind: index for index, kind in enumerate(KINDS)}
+
+MAX_LIMIT = 20
+FUZZY_THRESHOLD = 0.4
+# trigram های خیلی رایج در امتیاز فازی شمرده نمی‌شوند
+MAX_POSTING = 5000
+# ارجاع‌های بررسی شده برای هر کلید و هر نوع (کلمات پرتکرار مثل «کافه»)
+MAX_REFS_PER_KEY = 200
+# حاشیه همگام‌سازی برای transaction هایی که هنگام خواندن قبلی commit نشده بودند
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def entry_keys(label):
+    """(کلیدهای کلمه‌ای که در fallback فازی هم شرکت می‌کنند، کلید کل نام)"""
+    words = tokenize(label)
+    keys = set(words)
+    for word in words:
+        latin = skeleton(word)
+        if len(latin) >= 2:
+            keys.add(latin)
+    return keys, normalize_compact(label)
+
+
+def query_keys(query):
+    """(کلید کامل، کلید آخرین کلمه، اسکلت لاتین آخرین کلمه)"""
+    words = tokenize(query)
+    if not words:
+        return None, None, None
+    last = words[-1]
+    return normalize_compact(query), last, skeleton(last) if last.isascii() else None
+
+
+class _Trie:
+    __slots__ = ('root',)
+
+    def __init__(self):
+        # گره: {کاراکتر: گره}؛ کلید None خود کلیدی است که در این گره تمام می‌شود
+        self.root = {}
+
+    def add(self, key):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        node[None] = key
+
+    def remove(self, key):
+        node = self.root
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return
+        node.pop(None, None)
+
+    def complete(self, prefix, limit):
+        """کلیدهای دارای پیشوند، کوتاه‌ترها اول (BFS)"""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        found = []
+        level = [node]
+        while level and len(found) < limit:
+            next_level = []
+            for current in level:
+                for char, child in current.items():
+                    if char is None:
+                        found.append(child)
+                    else:
+                        next_level.append(child)
+            level = next_level
+        return found
+
+
+class TypeaheadIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._synced_at = 0.0
+        self._cursor = None
+        self._reset()
+
+    def _reset(self):
+        self._entries = {}          # (kind, id) → {'kind','id','label','keys'}
+        self._key_entries = {}      # کلید → {kind: مجموعه (kind, id)}
+        self._trie = _Trie()
+        self._postings = {}         # trigram → مجموعه کلیدهای کلمه‌ای
+        self._fuzzy_keys = set()
+
+    # ─── نگهداری index ──────────────────────────────────────────
+
+    def _add_key(self, key, ref, fuzzy):
+        by_kind = self._key_entries.get(key)
+        if by_kind is None:
+            by_kind = self._key_entries[key] = {}
+            self._trie.add(key)
+        by_kind.setdefault(ref[0], set()).add(ref)
+        if fuzzy and key not in self._fuzzy_keys:
+            self._fuzzy_keys.add(key)
+            for gram in _trigrams(key):
+                self._postings.setdefault(gram, set()).add(key)
+
+    def _remove_key(self, key, ref):
+        by_kind = self._key_entries.get(key)
+        if by_kind is None:
+            return
+        refs = by_kind.get(ref[0])
+        if refs is not None:
+            refs.discard(ref)
+            if not refs:
+                del by_kind[ref[0]]
+        if by_kind:
+            return
+        del self._key_entries[key]
+        self._trie.remove(key)
+        if key in self._fuzzy_keys:
+            self._fuzzy_keys.discard(key)
+            for gram in _trigrams(key):
+                keys = self._postings.get(gram)
+                if keys is not None:
+                    keys.discard(key)
+
+    def upsert(self, kind, pk, label):
+        ref = (kind, pk)
+        with self._lock:
+            self._remove(ref)
+            label = (label or '').strip()
+            if not label:
+                return
+            word_keys, compact = entry_keys(label)
+            keys = word_keys | {compact} if compact else word_keys
+            self._entries[ref] = {'kind': kind, 'id': pk, 'label': label, 'keys': keys}
+            for key in word_keys:
+                self._add_key(key, ref, fuzzy=True)
+            if compact and compact not in word_keys:
+                self._add_key(compact, ref, fuzzy=False)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._remove((kind, pk))
+
+    def _remove(self, ref):
+        entry = self._entries.pop(ref, None)
+        if entry:
+            for key in entry['keys']:
+                self._remove_key(key, ref)
+
+    # ─── بارگذاری از دیتابیس ────────────────────────────────────
+
+    def _rows(self, since=None):
+        """(kind, id, label یا None برای حذف) از همه منابع"""
+        from accounts.models import BusinessProfile, City, Club, ServiceCategory
+        from .models import Package
+
+        def changed(queryset):
+            return queryset.filter(modified_at__gte=since) if since else queryset
+
+        for kind, model in (('club', Club), ('category', ServiceCategory), ('city', City)):
+            for pk, name in changed(model.objects.all()).values_list('id', 'name').iterator():
+                yield kind, pk, name
+
+        businesses = changed(BusinessProfile.objects.all())
+        business_ids = None
+        if since:
+            # فعال/غیرفعال شدن پکیج هم کسب‌وکار را وارد/خارج می‌کند
+            business_ids = set(businesses.values_list('id', flat=True))
+            business_ids.update(changed(Package.objects.all()).values_list('business_id', flat=True))
+            businesses = BusinessProfile.objects.filter(pk__in=business_ids)
+        active = set(
+            Package.objects.filter(is_active=True, status='approved', is_complete=True)
+            .filter(**({'business_id__in': business_ids} if business_ids is not None else {}))
+            .values_list('business_id', flat=True)
+        )
+        for pk, name in businesses.values_list('id', 'name').iterator():
+            yield 'business', pk, name if pk in active else None
+
+    def build(self):
+        """پر کردن از دیتابیس؛ برای index در حال استفاده فقط از rebuild() (نمونه تازه)"""
+        started = timezone.now()
+        with self._lock:
+            self._reset()
+            for kind, pk, label in self._rows():
+                if label:
+                    self.upsert(kind, pk, label)
+            self._built_at = time.monotonic()
+            self._synced_at = self._built_at
+            self._cursor = started
+
+    def sync(self):
+        """اعمال تغییرات workerهای دیگر از روی modified_at"""
+        started = timezone.now()
+        with self._lock:
+            # thread دیگری که منتظر همین قفل بود همین الان همگام کرده است
+            if time.monotonic() - self._synced_at <= _setting('TYPEAHEAD_SYNC_SECONDS', 5):
+                return
+            for kind, pk, label in self._rows(since=self._cursor - SYNC_OVERLAP):
+                if label:
+                    self.upsert(kind, pk, label)
+                else:
+                    self.remove(kind, pk)
+            self._synced_at = time.monotonic()
+            self._cursor = started
+
+    def is_stale(self):
+        return time.monotonic() - self._built_at > _setting('TYPEAHEAD_REBUILD_SECONDS', 900)
+
+    def needs_sync(self):
+        return time.monotonic() - self._synced_at > _setting('TYPEAHEAD_SYNC_SECONDS', 5)
+
+    # ─── جستجو ─────────────────────────────────────────────────
+
+    def _fuzzy(self, key, limit):
+        grams = _trigrams(key)
+        counts = Counter()
+        for gram in grams:
+            keys = self._postings.get(gram)
+            if keys and len(keys) <= MAX_POSTING:
+                counts.update(keys)
+        scored = []
+        for candidate, common in counts.items():
+            score = 2 * common / (len(grams) + len(candidate) + 1)
+            if score >= FUZZY_THRESHOLD:
+                scored.append((score, candidate))
+        scored.sort(key=lambda item: (-item[0], len(item[1])))
+        return scored[:limit]
+
+    def lookup(self, query, limit=8, kinds=None):
+        """[{kind, id, label, match}, ...]؛ match: prefix یا fuzzy"""
+        compact, last, latin = query_keys(query)
+        if not compact:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+        kinds = set(kinds or KINDS)
+        words = tokenize(query)
+        results = {}
+
+        def accept(ref, match, rank):
+            if ref in results:
+                return
+            entry = self._entries.get(ref)
+            if entry is None:
+                return
+            # عبارت چند کلمه‌ای: کلمات قبلی هم باید در نام باشند
+            if len(words) > 1 and match == 'prefix':
+                label = normalize(entry['label'])
+                if not all(word in label for word in words[:-1]):
+                    return
+            results[ref] = (rank, entry, match)
+
+        def collect(key, match, rank):
+            """ارجاع‌های یک کلید به ترتیب نوع؛ برای کلیدهای پرتکرار فقط چند مورد اول"""
+            by_kind = self._key_entries.get(key, {})
+            for kind in KINDS:
+                if kind not in kinds:
+                    continue
+                for ref in islice(by_kind.get(kind, ()), MAX_REFS_PER_KEY):
+                    accept(ref, match, rank)
+                    if len(results) >= limit:
+                        return True
+            return False
+
+        with self._lock:
+            candidates = [(compact, 0)]
+            if last != compact:
+                candidates.append((last, 1))
+            if latin:
+                candidates.append((latin, 2))
+            # کلیدها به ترتیب رتبه پیمایش می‌شوند؛ با پر شدن limit بقیه رتبه پایین‌ترند
+            done = False
+            for prefix, rank in candidates:
+                for key in self._trie.complete(prefix, limit * 4):
+                    if collect(key, 'prefix', (rank, len(key))):
+                        done = True
+                        break
+                if done:
+                    break
+            if not done:
+                for score, key in self._fuzzy(latin or last, limit * 4):
+                    if collect(key, 'fuzzy', (3, -score)):
+                        break
+
+        ordered = sorted(
+            results.values(),
+            key=lambda item: (item[0], KIND_ORDER[item[1]['kind']], item[1]['label']),
+        )
+        return [
+            {'kind': entry['kind'], 'id': entry['id'], 'label': entry['label'], 'match': match}
+            for rank, entry, match in ordered[:limit]
+        ]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# index در حال سرویس؛ rebuild() آن را با نمونه تازه جایگزین می‌کند
+index = TypeaheadIndex()
+# فقط یک ساخت در هر process (اولین ساخت یا rebuild پس‌زمینه)
+_build_lock = threading.Lock()
+
+
+def _build_first():
+    """اولین ساخت (بدون warm)؛ درخواست‌های هم‌زمان منتظر همان یک ساخت می‌مانند"""
+    with _build_lock:
+        if index._built_at is None:
+            index.build()
+
+
+def _rebuild():
+    global index
+    try:
+        fresh = TypeaheadIndex()
+        fresh.build()
+        index = fresh
+    except Exception:
+        logger.warning('typeahead rebuild failed', exc_info=True)
+    finally:
+        from django.db import connection
+
+        connection.close()
+        _build_lock.release()
+
+
+def rebuild_in_background():
+    """شروع ساخت دوباره در پس‌زمینه اگر ساختی در جریان نباشد"""
+    if not _build_lock.acquire(blocking=False):
+        return False
+    try:
+        threading.Thread(target=_rebuild, name='typeahead-rebuild', daemon=True).start()
+    except Exception:
+        _build_lock.release()
+        raise
+    return True
+
+
+def ensure_fresh():
+    if index._built_at is None:
+        _build_first()
+        return
+    current = index
+    if current.is_stale():
+        rebuild_in_background()
+    if current.needs_sync():
+        current.sync()
+
+
+def autocomplete(query, limit=8, kinds=None):
+    ensure_fresh()
+    return index.lookup(query, limit, kinds)
+
+
+def refresh(kind, pk, label=None):
+    """به‌روزرسانی همین process از سیگنال‌ها (index ساخته نشده → کاری لازم نیست)"""
+    if index._built_at is None:
+        return
+    if kind == 'business':
+        from accounts.models import BusinessProfile
+        from .models import Package
+
+        label = BusinessProfile.objects.filter(pk=pk).values_list('name', flat=True).first()
+        if label and not Package.objects.filter(
+            business_id=pk, is_active=True, status='approved', is_complete=True
+        ).exists():
+            label = None
+    if label:
+        index.upsert(kind, pk, label)
+    else:
+        index.remove(kind, pk)
+
+
+def warm():
+    """ساخت index هنگام بالا آمدن worker (خطای دیتابیس نباید مانع شروع شود)"""
+    try:
+        _build_first()
+    except Exception:
+        logger.warning('typeahead warm-up failed', exc_info=True)
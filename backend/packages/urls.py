@@ -8,5 +8,9 @@ router.register(r'vip-experiences', views.VipExperienceCategoryViewSet, basename
 router.register(r'comments', views.CommentViewSet, basename='comment')
 
 urlpatterns = [
+    path('nearby/', views.nearby_packages, name='nearby-packages'),
+    path('map-clusters/', views.map_clusters, name='map-clusters'),
+    path('search/', views.search_packages, name='search-packages'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('', include(router.urls)),
 ]
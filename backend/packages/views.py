@@ -1,10 +1,15 @@
+import base64
+import json
+
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
 from .models import (
     Package, DiscountAll, SpecificDiscount, EliteGift, 
     VipExperienceCategory, VipExperience, Comment, CommentLike
@@ -13,27 +18,26 @@ from .serializers import (
     PackageListSerializer, PackageDetailSerializer, PackageCreateUpdateSerializer,
     VipExperienceCategorySerializer, CommentSerializer, CommentCreateSerializer
 )
-from accounts.models import BusinessProfile, Club, BusinessWorkingHours, BusinessAmenity, Amenity
+from accounts.models import BusinessProfile, BusinessWorkingHours, BusinessAmenity, Amenity
+from core.db_router import ReplicaReadMixin
 from accounts.amenity_utils import get_amenities_for_business, get_business_type_label
+from accounts.schedule import weekday_entries
 from accounts.serializers import (
     AmenitySerializer,
     BusinessWorkingHoursSerializer,
     WorkingHoursEntrySerializer,
     BusinessAmenitiesSaveSerializer,
 )
-from .club_utils import (
-    resolve_business_club,
-    resolve_canonical_club,
-    club_ids_for_lookup,
-    infer_club_from_category_name,
-)
+from .vip_resolver import business_vip_category_ids, customer_vip_category_ids
 
 
-class PackageViewSet(viewsets.ModelViewSet):
+class PackageViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing packages
     """
     permission_classes = [permissions.IsAuthenticated]
+    # feed مشتری، facets و نظرات کسب‌وکار از replica خوانده می‌شوند (core/db_router.py)
+    replica_actions = ('list', 'facets', 'business_comments')
     
     def get_queryset(self):
         """
@@ -50,15 +54,46 @@ class PackageViewSet(viewsets.ModelViewSet):
         elif user.role in ['admin', 'it_manager', 'project_manager']:
             return Package.objects.all()
         elif user.role == 'customer':
-            return Package.objects.filter(
+            queryset = Package.objects.filter(
                 is_active=True, status='approved', is_complete=True
             ).select_related('business', 'business__user').prefetch_related(
                 'business__gallery_images',
                 'experiences__vip_experience_category',
             )
+            if self.action == 'list':
+                from .facets import apply_filters, parse_filters
+                queryset = apply_filters(
+                    self._filter_open(queryset), parse_filters(self.request.query_params)
+                )
+            return queryset
         else:
             return Package.objects.none()
     
+    def _open_moment(self):
+        """
+        ?open_now=1 یا ?open_at=2026-10-19T21:30 (بدون منطقه زمانی = وقت تهران)
+        خروجی: (فیلتر فعال است، لحظه؛ None یعنی الان)
+        """
+        from rest_framework.exceptions import ValidationError
+        from accounts.schedule import parse_moment
+
+        params = self.request.query_params
+        if params.get('open_at'):
+            moment = parse_moment(params['open_at'])
+            if moment is None:
+                raise ValidationError({'open_at': 'تاریخ و ساعت نامعتبر است.'})
+            return True, moment
+        return params.get('open_now') in ('1', 'true', 'True'), None
+
+    def _filter_open(self, queryset):
+        """فیلتر باز بودن روی bitmap برنامه هفتگی کسب‌وکار در SQL (accounts/schedule.py)"""
+        from accounts.schedule import open_slot_filter
+
+        active, moment = self._open_moment()
+        if not active:
+            return queryset
+        return open_slot_filter(queryset, moment, 'business__open_slots')
+
     def get_serializer_class(self):
         """
         Return appropriate serializer class based on action
@@ -203,12 +238,16 @@ class PackageViewSet(viewsets.ModelViewSet):
                 )
         
         # If activating, deactivate other active packages for the same business
+        from core import metrics
+
         if not package.is_active:
             Package.objects.filter(business=package.business, is_active=True).exclude(id=package.id).update(is_active=False)
             package.is_active = True
         else:
             package.is_active = False
         package.save()
+        if package.is_active:
+            metrics.PACKAGE_ACTIVATIONS.inc(source='toggle')
         
         return Response({
             'id': package.id,
@@ -235,7 +274,7 @@ class PackageViewSet(viewsets.ModelViewSet):
         
         if package.can_activate_immediately():
             # اگر اولین پکیج کسب‌وکار است یا پکیج فعالی وجود ندارد
-            package.activate_package()
+            package.activate_package(source='approval')
             activation_message = "پکیج تایید و فوراً فعال شد."
         else:
             # اگر پکیج فعالی وجود دارد که کمتر از ۱۰ روز به پایان آن مانده
@@ -434,13 +473,13 @@ class PackageViewSet(viewsets.ModelViewSet):
         business = package.business
 
         if request.method == 'GET':
-            amenities_qs, business_type = get_amenities_for_business(business)
+            amenities, business_type = get_amenities_for_business(business)
             selected_ids = set(
                 business.selected_amenities.filter(is_enabled=True).values_list('amenity_id', flat=True)
             )
             general = []
             specific = []
-            for amenity in amenities_qs:
+            for amenity in amenities:
                 item = AmenitySerializer(amenity).data
                 item['is_selected'] = amenity.id in selected_ids
                 if amenity.business_type == 'general':
@@ -459,8 +498,8 @@ class PackageViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         amenity_ids = serializer.validated_data['amenity_ids']
 
-        amenities_qs, _ = get_amenities_for_business(business)
-        allowed_ids = set(amenities_qs.values_list('id', flat=True))
+        amenities, _ = get_amenities_for_business(business)
+        allowed_ids = {amenity.id for amenity in amenities}
         invalid = set(amenity_ids) - allowed_ids
         if invalid:
             return Response(
@@ -523,24 +562,27 @@ class PackageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        business.working_hours.filter(is_break=False).delete()
-        for entry in validated_entries:
-            if entry['is_closed']:
-                BusinessWorkingHours.objects.create(
-                    business_profile=business,
-                    weekday=entry['weekday'],
-                    start_time='00:00:00',
-                    end_time='00:00:00',
-                    is_closed=True,
-                )
-            else:
-                BusinessWorkingHours.objects.create(
-                    business_profile=business,
-                    weekday=entry['weekday'],
-                    start_time=entry['start_time'],
-                    end_time=entry['end_time'],
-                    is_closed=False,
-                )
+        # یک transaction: برنامه کامپایل شده یک بار و بعد از commit ساخته می‌شود و
+        # درخواست‌های هم‌زمان برنامه نیمه‌کاره (بدون ساعت) نمی‌بینند
+        with transaction.atomic():
+            business.working_hours.filter(is_break=False).delete()
+            for entry in validated_entries:
+                if entry['is_closed']:
+                    BusinessWorkingHours.objects.create(
+                        business_profile=business,
+                        weekday=entry['weekday'],
+                        start_time='00:00:00',
+                        end_time='00:00:00',
+                        is_closed=True,
+                    )
+                else:
+                    BusinessWorkingHours.objects.create(
+                        business_profile=business,
+                        weekday=entry['weekday'],
+                        start_time=entry['start_time'],
+                        end_time=entry['end_time'],
+                        is_closed=False,
+                    )
 
         return Response({'message': 'ساعات کاری ذخیره شد.'})
 
@@ -626,29 +668,68 @@ class PackageViewSet(viewsets.ModelViewSet):
             ),
             "working_hours": [
                 {
-                    "weekday": h.weekday,
-                    "weekday_display": h.get_weekday_display(),
-                    "start_time": h.start_time.strftime('%H:%M') if h.start_time else None,
-                    "end_time": h.end_time.strftime('%H:%M') if h.end_time else None,
-                    "is_closed": h.is_closed,
+                    "weekday": weekday,
+                    "weekday_display": weekday_display,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "is_closed": is_closed,
                 }
-                for h in package.business.working_hours.filter(is_break=False).order_by('weekday')
+                for weekday, weekday_display in BusinessWorkingHours.WEEKDAY_CHOICES
+                for start_time, end_time, is_closed, is_break in weekday_entries(
+                    package.business.weekly_hours, weekday
+                )
+                if not is_break
             ],
         })
     
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        تعداد پکیج‌های feed برای هر گزینه فیلتر (باشگاه، دسته، شهر، بازه تخفیف،
+        VIP/VIP+، امکانات) با فیلترهای فعلی؛ همان پارامترهای لیست (packages/facets.py)
+        """
+        from accounts.schedule import SLOT_MINUTES, open_slot_filter, week_minute
+        from .facets import facet_counts, parse_filters
+
+        if request.user.role != 'customer':
+            return Response({'error': 'فقط برای مشتری'}, status=status.HTTP_403_FORBIDDEN)
+
+        filters = parse_filters(request.query_params)
+        active, moment = self._open_moment()
+        base = Package.objects.filter(is_active=True, status='approved', is_complete=True)
+        scope = ''
+        if active:
+            slot = week_minute(moment) // SLOT_MINUTES
+            base = open_slot_filter(base, moment, 'business__open_slots')
+            scope = f'open_{slot}'
+        return Response(facet_counts(base, filters, scope))
+
     @action(detail=False, methods=['post'], url_path='smart-search')
     def smart_search(self, request):
-        """رتبه‌بندی توصیفی کسب‌وکارهای باشگاه با Groq. در نبود کلید، frontend به جستجوی محلی برمی‌گردد."""
+        """
+        جستجوی توصیفی باشگاه: انتخاب نامزدها از کل کاتالوگ سمت سرور و رتبه‌بندی
+        مجدد آن‌ها با Groq (packages/smart_search.py). در نبود کلید، frontend به
+        جستجوی محلی برمی‌گردد.
+        body: query، فیلترهای اختیاری feed (club, category, city, ...)، top_k
+        catalog ارسالی کلاینت‌های قدیمی پذیرفته می‌شود ولی دیگر استفاده نمی‌شود.
+        """
+        from .facets import parse_filters
+        from .smart_search import smart_search
+
+        if not isinstance(request.data, dict):
+            return Response({'error': 'body must be an object'}, status=status.HTTP_400_BAD_REQUEST)
         query = (request.data.get('query') or '').strip()
-        catalog = request.data.get('catalog') or []
+        catalog = request.data.get('catalog')
         if not query:
             return Response({'error': 'query is required'}, status=status.HTTP_400_BAD_REQUEST)
-        if not isinstance(catalog, list):
+        if catalog is not None and not isinstance(catalog, list):
             return Response({'error': 'catalog must be a list'}, status=status.HTTP_400_BAD_REQUEST)
-        catalog = catalog[:40]
-        from .llm_search import rank_catalog
-        result = rank_catalog(query, catalog)
-        return Response(result)
+        try:
+            top_k = int(request.data.get('top_k') or 0) or None
+        except (TypeError, ValueError):
+            return Response({'error': 'top_k must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        filters = parse_filters(request.data)
+        return Response(smart_search(query, filters, top_k, user_id=request.user.pk))
 
     @action(detail=False, methods=['get'], url_path='business/(?P<business_id>[^/.]+)/comments')
     def business_comments(self, request, business_id=None):
@@ -669,7 +750,7 @@ class PackageViewSet(viewsets.ModelViewSet):
                     comments = Comment.objects.filter(
                         content_type=discount_all_ct,
                         object_id=package.discount_all.id
-                    )
+                    ).select_related('user__user')
                     for comment in comments:
                         all_comments.append({
                             'comment': comment,
@@ -682,7 +763,7 @@ class PackageViewSet(viewsets.ModelViewSet):
                     comments = Comment.objects.filter(
                         content_type=specific_discount_ct,
                         object_id=package.specific_discount.id
-                    )
+                    ).select_related('user__user')
                     for comment in comments:
                         all_comments.append({
                             'comment': comment,
@@ -695,7 +776,7 @@ class PackageViewSet(viewsets.ModelViewSet):
                     comments = Comment.objects.filter(
                         content_type=elite_gift_ct,
                         object_id=package.elite_gift.id
-                    )
+                    ).select_related('user__user')
                     for comment in comments:
                         all_comments.append({
                             'comment': comment,
@@ -708,7 +789,7 @@ class PackageViewSet(viewsets.ModelViewSet):
                     comments = Comment.objects.filter(
                         content_type=vip_experience_ct,
                         object_id=vip_exp.id
-                    )
+                    ).select_related('user__user')
                     for comment in comments:
                         all_comments.append({
                             'comment': comment,
@@ -727,15 +808,15 @@ class PackageViewSet(viewsets.ModelViewSet):
                 except:
                     pass
             
+            # لایک‌های کاربر جاری برای همه کامنت‌ها در یک کوئری
+            liked_ids = CommentLike.liked_comment_ids(
+                customer_profile, [item['comment'].id for item in all_comments]
+            )
+
             serialized_comments = []
             for item in all_comments:
                 comment = item['comment']
-                is_liked = False
-                if customer_profile:
-                    is_liked = CommentLike.objects.filter(
-                        comment=comment,
-                        user=customer_profile
-                    ).exists()
+                is_liked = comment.id in liked_ids
                 
                 serialized_comments.append({
                     'id': comment.id,
@@ -744,7 +825,7 @@ class PackageViewSet(viewsets.ModelViewSet):
                     'content': comment.text or '',
                     'score': comment.score,
                     'service_type': comment.service_type or item['category'],  # استفاده از service_type یا category
-                    'likes_count': comment.likes.count(),
+                    'likes_count': comment.likes_count,
                     'is_liked': is_liked,
                     'category': item['category'],
                     'created_at': comment.created_at.isoformat()
@@ -770,15 +851,11 @@ class VipExperienceCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None
     
-    def _club_items(self, base_qs, club):
-        if not club:
-            return base_qs.none()
-        lookup_ids = club_ids_for_lookup(club)
-        return base_qs.filter(
-            club_id__in=lookup_ids, category__isnull=True
-        ).order_by('vip_type', 'id')
-
     def get_queryset(self):
+        """
+        لیست مؤثر از packages/vip_resolver.py (محاسبه شده و cache شده برای هر
+        (دسته، باشگاه)) خوانده می‌شود و فقط یک کوئری برای خود آیتم‌ها می‌ماند.
+        """
         user = self.request.user
         base_qs = VipExperienceCategory.objects.select_related(
             'category', 'category__club', 'club'
@@ -786,68 +863,13 @@ class VipExperienceCategoryViewSet(viewsets.ReadOnlyModelViewSet):
         club_id_param = self.request.query_params.get('club_id')
 
         if user.role == 'business':
-            try:
-                business_profile = BusinessProfile.objects.select_related(
-                    'category',
-                    'category__club',
-                    'category__parent',
-                    'category__parent__club',
-                    'category__parent__parent',
-                    'category__parent__parent__club',
-                ).get(user=user)
-                business_category = business_profile.category
-            except BusinessProfile.DoesNotExist:
-                business_profile = None
-                business_category = None
-
-            business_club = resolve_business_club(business_profile)
-
-            if club_id_param:
-                club = Club.objects.filter(pk=club_id_param).first()
-                if club:
-                    club_qs = self._club_items(base_qs, club)
-                    if club_qs.exists():
-                        return club_qs
-
-            if business_category:
-                specific = base_qs.filter(category=business_category)
-                if specific.exists():
-                    return specific.order_by('vip_type', 'id')
-
-            if business_club:
-                club_qs = self._club_items(base_qs, business_club)
-                if club_qs.exists():
-                    return club_qs
-
-            if business_category:
-                inferred = infer_club_from_category_name(business_category)
-                if inferred:
-                    club_qs = self._club_items(base_qs, resolve_canonical_club(inferred))
-                    if club_qs.exists():
-                        return club_qs
-
-            universal = base_qs.filter(category__isnull=True, club__isnull=True)
-            if universal.exists():
-                return universal.order_by('vip_type', 'id')
-
-            return base_qs.none()
+            category_id = (
+                BusinessProfile.objects.filter(user=user).values_list('category_id', flat=True).first()
+            )
+            ids = business_vip_category_ids(category_id, club_id_param)
 
         elif user.role == 'customer':
-            if club_id_param:
-                club = Club.objects.filter(pk=club_id_param).first()
-                club_qs = self._club_items(base_qs, club)
-                if club_qs.exists():
-                    return club_qs
-
-                legacy = base_qs.filter(category__club_id=club_id_param)
-                if legacy.exists():
-                    return legacy.order_by('vip_type', 'id')
-
-            universal = base_qs.filter(category__isnull=True, club__isnull=True)
-            if universal.exists():
-                return universal.order_by('vip_type', 'id')
-
-            return base_qs.filter(category__isnull=True, club__isnull=False).order_by('vip_type', 'id')
+            ids = customer_vip_category_ids(club_id_param)
 
         elif user.role in ['admin', 'it_manager', 'project_manager']:
             return base_qs.all().order_by('vip_type', 'id')
@@ -855,6 +877,8 @@ class VipExperienceCategoryViewSet(viewsets.ReadOnlyModelViewSet):
         else:
             return VipExperienceCategory.objects.none()
 
+        return base_qs.filter(pk__in=ids).order_by('vip_type', 'id')
+
 
 class CommentViewSet(viewsets.ModelViewSet):
     """
@@ -874,10 +898,10 @@ class CommentViewSet(viewsets.ModelViewSet):
             return Comment.objects.filter(
                 content_type=content_type,
                 object_id=object_id
-            )
+            ).select_related('user__user')
         
         if self.action in ('retrieve', 'update', 'partial_update', 'destroy', 'like'):
-            return Comment.objects.all()
+            return Comment.objects.select_related('user__user')
         
         return Comment.objects.none()
     
@@ -910,22 +934,14 @@ class CommentViewSet(viewsets.ModelViewSet):
         
         try:
             customer_profile = user.customerprofile
-            like, created = CommentLike.objects.get_or_create(
-                comment=comment,
-                user=customer_profile
-            )
-            
-            if not created:
-                like.delete()
-                message = 'Comment unliked'
-                is_liked = False
-            else:
-                message = 'Comment liked'
-                is_liked = True
+            is_liked = CommentLike.toggle(comment, customer_profile)
+            message = 'Comment liked' if is_liked else 'Comment unliked'
             
+            # likes_count با F expression در سیگنال به‌روز شده است
+            comment.refresh_from_db(fields=['likes_count'])
             return Response({
                 'is_liked': is_liked,
-                'likes_count': comment.likes.count(),
+                'likes_count': comment.likes_count,
                 'message': message
             })
         except:
@@ -934,3 +950,217 @@ class CommentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 50
+NEARBY_DEFAULT_PAGE_SIZE = 20
+NEARBY_MAX_PAGE_SIZE = 50
+
+
+def _encode_nearby_cursor(distance, pk):
+    raw = json.dumps([repr(distance), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_nearby_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    distance, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return float(distance), int(pk)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def nearby_packages(request):
+    """
+    پکیج‌های فعال نزدیک یک نقطه، مرتب شده بر اساس فاصله
+    GET /packages/nearby/?lat=35.7&lng=51.4&radius=5[&page_size=20][&cursor=...]
+
+    پیش‌فیلتر با سلول‌های geohash (ایندکس) و bounding box، سپس فاصله haversine
+    در SQL برای فیلتر شعاع، مرتب‌سازی و صفحه‌بندی cursor (accounts/geo.py)
+    """
+    from decimal import Decimal
+    from rest_framework.utils.urls import replace_query_param
+    from accounts.geo import bounding_box, covering_cells, geohash_prefilter, haversine_expression
+
+    try:
+        lat = float(request.query_params['lat'])
+        lng = float(request.query_params['lng'])
+        radius = float(request.query_params.get('radius', NEARBY_DEFAULT_RADIUS_KM))
+        page_size = int(request.query_params.get('page_size', NEARBY_DEFAULT_PAGE_SIZE))
+    except (KeyError, TypeError, ValueError):
+        return Response(
+            {'error': 'پارامترهای lat و lng (و radius به کیلومتر) الزامی هستند.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or radius <= 0:
+        return Response({'error': 'مختصات یا شعاع نامعتبر است.'}, status=status.HTTP_400_BAD_REQUEST)
+    radius = min(radius, NEARBY_MAX_RADIUS_KM)
+    page_size = max(1, min(page_size, NEARBY_MAX_PAGE_SIZE))
+
+    bbox = bounding_box(lat, lng, radius)
+    min_lat, max_lat, min_lng, max_lng = (Decimal(str(round(v, 6))) for v in bbox)
+
+    queryset = (
+        Package.objects.filter(is_active=True, status='approved', is_complete=True)
+        .filter(geohash_prefilter(covering_cells(bbox), 'business__geohash'))
+        .filter(
+            business__business_location_latitude__range=(min_lat, max_lat),
+            business__business_location_longitude__range=(min_lng, max_lng),
+        )
+        .annotate(distance_km=haversine_expression(
+            lat, lng, 'business__business_location_latitude', 'business__business_location_longitude'
+        ))
+        .filter(distance_km__lte=radius)
+        .select_related('business', 'business__user', 'discount_all', 'specific_discount', 'elite_gift')
+        .prefetch_related('business__gallery_images', 'experiences__vip_experience_category')
+        .order_by('distance_km', 'id')
+    )
+
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        try:
+            after_distance, after_id = _decode_nearby_cursor(cursor)
+        except (ValueError, TypeError):
+            return Response({'error': 'cursor نامعتبر است.'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = queryset.filter(
+            Q(distance_km__gt=after_distance) | Q(distance_km=after_distance, id__gt=after_id)
+        )
+
+    page = list(queryset[:page_size + 1])
+    has_next = len(page) > page_size
+    page = page[:page_size]
+
+    results = PackageListSerializer(page, many=True, context={'request': request}).data
+    for item, package in zip(results, page):
+        item['distance_km'] = round(package.distance_km, 3)
+
+    next_url = None
+    if has_next:
+        last = page[-1]
+        next_url = replace_query_param(
+            request.build_absolute_uri(), 'cursor', _encode_nearby_cursor(last.distance_km, last.pk)
+        )
+    return Response({'next': next_url, 'results': results})
+
+
+SEARCH_DEFAULT_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def search_packages(request):
+    """
+    جستجوی متنی پکیج‌های فعال، مرتب شده بر اساس ارتباط (bm25)
+    GET /packages/search/?q=کافه تولد[&page_size=20][&offset=0]
+
+    نام، توضیحات، دسته، باشگاه، آدرس و متن پیشنهادها (packages/search_index.py)
+    """
+    from .search_index import search
+
+    query = (request.query_params.get('q') or '').strip()
+    if not query:
+        return Response({'error': 'پارامتر q الزامی است.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        page_size = int(request.query_params.get('page_size', SEARCH_DEFAULT_PAGE_SIZE))
+        offset = int(request.query_params.get('offset', 0))
+    except (TypeError, ValueError):
+        return Response({'error': 'page_size و offset باید عدد باشند.'}, status=status.HTTP_400_BAD_REQUEST)
+    page_size = max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+    offset = max(0, offset)
+
+    ranked = search(query, limit=page_size, offset=offset)
+    scores = dict(ranked)
+    packages = {}
+    for package in (
+        Package.objects.filter(
+            business_id__in=scores, is_active=True, status='approved', is_complete=True,
+        )
+        .select_related('business', 'business__user', 'discount_all', 'specific_discount', 'elite_gift')
+        .prefetch_related('business__gallery_images', 'experiences__vip_experience_category')
+        .order_by('-end_date', '-id')
+    ):
+        # یک پکیج فعال برای هر کسب‌وکار (آخرین)
+        packages.setdefault(package.business_id, package)
+    page = [packages[business_id] for business_id, score in ranked if business_id in packages]
+
+    results = PackageListSerializer(page, many=True, context={'request': request}).data
+    for item, package in zip(results, page):
+        item['search_score'] = round(scores[package.business_id], 4)
+    return Response({
+        'query': query,
+        'offset': offset,
+        'next_offset': offset + page_size if len(ranked) == page_size else None,
+        'results': results,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def autocomplete(request):
+    """
+    پیشنهاد هنگام تایپ: کسب‌وکارها، دسته‌ها، باشگاه‌ها و شهرها
+    GET /packages/autocomplete/?q=کاف[&limit=8][&kinds=business,city]
+
+    index حافظه‌ای پیشوندی با fallback فازی (packages/typeahead.py)
+    """
+    import time
+    from .typeahead import KINDS, autocomplete as lookup
+
+    query = (request.query_params.get('q') or '').strip()
+    try:
+        limit = int(request.query_params.get('limit', 8))
+    except (TypeError, ValueError):
+        return Response({'error': 'limit باید عدد باشد.'}, status=status.HTTP_400_BAD_REQUEST)
+    kinds = [kind for kind in (request.query_params.get('kinds') or '').split(',') if kind]
+    if any(kind not in KINDS for kind in kinds):
+        return Response(
+            {'error': f"kinds فقط از {', '.join(KINDS)}"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    started = time.perf_counter()
+    results = lookup(query, limit, kinds or None) if query else []
+    return Response({
+        'query': query,
+        'results': results,
+        'took_ms': round((time.perf_counter() - started) * 1000, 3),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def map_clusters(request):
+    """
+    خوشه‌های marker نقشه برای یک viewport
+    GET /packages/map-clusters/?zoom=12&bbox=min_lng,min_lat,max_lng,max_lat
+
+    هر خوشه: geohash، تعداد پکیج‌های فعال، مرکز و یک کسب‌وکار نماینده
+    (کاشی‌های cache شده؛ packages/map_clusters.py)
+    """
+    from .map_clusters import clusters_for_viewport
+
+    try:
+        zoom = int(request.query_params['zoom'])
+        min_lng, min_lat, max_lng, max_lat = (
+            float(v) for v in request.query_params['bbox'].split(',')
+        )
+    except (KeyError, TypeError, ValueError):
+        return Response(
+            {'error': 'پارامترهای zoom و bbox (min_lng,min_lat,max_lng,max_lat) الزامی هستند.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+        return Response({'error': 'bbox نامعتبر است.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    precision, clusters = clusters_for_viewport((min_lat, max_lat, min_lng, max_lng), zoom)
+    if clusters is None:
+        return Response(
+            {'error': 'محدوده نقشه برای این zoom بیش از حد بزرگ است.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return Response({
+        'zoom': zoom,
+        'precision': precision,
+        'total': sum(cluster['count'] for cluster in clusters),
+        'clusters': clusters,
+    })
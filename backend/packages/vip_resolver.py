@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+انتخاب دسته‌بندی‌های VIP قابل نمایش برای هر (دسته کسب‌وکار، باشگاه)
+
+VipExperienceCategoryViewSet قبلاً در هر بار باز شدن ویزارد چند کوئری پشت
+سر هم اجرا می‌کرد (پروفایل، باشگاه، دسته، سطح باشگاه، قدیمی، عمومی).
+نتیجه فقط به (دسته، باشگاه) بستگی دارد؛ اینجا همان ترتیب fallback روی
+داده‌های رجیستری (accounts/reference_registry.py) در حافظه اجرا و نتیجه
+برای همان نسخه رجیستری نگه داشته می‌شود. هر تغییر VipExperienceCategory،
+ServiceCategory یا Club رجیستری را باطل می‌کند، پس نتیجه‌ها هم باطل می‌شوند.
+
+خروجی: لیست id ها به ترتیب (vip_type, id)
+"""
+from accounts.reference_registry import registry
+
+from .club_utils import club_ids_for_lookup, infer_club_from_category_name, resolve_canonical_club
+
+
+def _memo(data):
+    return data.derived('vip_resolution', lambda d: {})
+
+
+def _club_level(data, club):
+    """آیتم‌های سطح باشگاه (بدون دسته) برای باشگاه و تکراری‌هایش"""
+    if not club:
+        return []
+    club_ids = set(club_ids_for_lookup(club))
+    return [
+        item.pk for item in data.vip_categories
+        if item.category_id is None and item.club_id in club_ids
+    ]
+
+
+def _universal(data):
+    return [
+        item.pk for item in data.vip_categories
+        if item.category_id is None and item.club_id is None
+    ]
+
+
+def _parse_id(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _known_club_id(data, value):
+    """
+    id باشگاه موجود یا None؛ id ناشناخته همان نتیجه None را دارد و نباید
+    کلید تازه‌ای در memo بسازد (ورودی کلاینت است و memo بی‌حد رشد می‌کرد)
+    """
+    club_id = _parse_id(value)
+    return club_id if club_id in data.clubs_by_id else None
+
+
+def business_vip_category_ids(category_id, club_id=None):
+    """
+    ترتیب fallback برای کسب‌وکار:
+    باشگاه درخواستی → مخصوص دسته → باشگاه دسته → باشگاه استنباطی از نام → عمومی
+    """
+    from accounts.category_tree import get_category
+
+    data = registry.get()
+    club_id = _known_club_id(data, club_id)
+    # دسته ناشناخته هم مثل بدون دسته (به همان دلیل باشگاه)
+    category = get_category(_parse_id(category_id))
+    memo = _memo(data)
+    key = ('business', category.pk if category else None, club_id)
+    if key in memo:
+        return memo[key]
+
+    def resolve():
+        if club_id:
+            items = _club_level(data, data.clubs_by_id.get(club_id))
+            if items:
+                return items
+
+        if category:
+            specific = [item.pk for item in data.vip_categories if item.category_id == category.pk]
+            if specific:
+                return specific
+
+            if category.effective_club_id:
+                items = _club_level(data, data.clubs_by_id.get(category.effective_club_id))
+                if items:
+                    return items
+
+            inferred = infer_club_from_category_name(category)
+            if inferred:
+                items = _club_level(data, resolve_canonical_club(inferred))
+                if items:
+                    return items
+
+        return _universal(data)
+
+    memo[key] = resolve()
+    return memo[key]
+
+
+def customer_vip_category_ids(club_id):
+    """
+    ترتیب fallback برای مشتری:
+    سطح باشگاه → قدیمی (دسته‌های آن باشگاه) → عمومی → همه آیتم‌های سطح باشگاه
+    """
+    data = registry.get()
+    club_id = _known_club_id(data, club_id)
+    memo = _memo(data)
+    key = ('customer', club_id)
+    if key in memo:
+        return memo[key]
+
+    def resolve():
+        if club_id:
+            items = _club_level(data, data.clubs_by_id.get(club_id))
+            if items:
+                return items
+
+            legacy = [
+                item.pk for item in data.vip_categories
+                if item.category_id
+                and getattr(data.categories_by_id.get(item.category_id), 'club_id', None) == club_id
+            ]
+            if legacy:
+                return legacy
+
+        universal = _universal(data)
+        if universal:
+            return universal
+
+        return [
+            item.pk for item in data.vip_categories
+            if item.category_id is None and item.club_id is not None
+        ]
+
+    memo[key] = resolve()
+    return memo[key]
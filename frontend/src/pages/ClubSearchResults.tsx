@@ -15,7 +15,6 @@ import {
   ClubSearchResult,
   isDescriptiveQuery,
   searchClubBusinesses,
-  toSearchCatalog,
 } from '../utils/clubSmartSearch'
 
 type SortFilter = 'suggested' | 'nearest' | 'rating' | 'popular'
@@ -92,12 +91,13 @@ export const ClubSearchResults: React.FC = () => {
         return
       }
       setRanking(true)
-      const llm = await apiService.smartSearchClubs({
-        query,
-        catalog: toSearchCatalog(packages),
-      })
+      const llm = await apiService.smartSearchClubs({ query })
       if (cancelled) return
-      if (llm.data?.ok && (llm.data.ranked_ids?.length || llm.data.keywords?.length)) {
+      if (
+        llm.data?.ok &&
+        llm.data.provider !== 'local' &&
+        (llm.data.ranked_ids?.length || llm.data.keywords?.length)
+      ) {
         setSearch(applyLlmRanking(query, packages, llm.data))
         setUsedLlm(true)
       } else {
@@ -1343,17 +1343,15 @@ class ApiService {
     })
   }
 
+  // Candidates come from the server-side catalog; only the query and optional feed filters are sent
   async smartSearchClubs(payload: {
     query: string
-    catalog: {
-      id: number
-      name: string
-      club: string
-      category: string
-      city: string
-      gold: string
-      vip: string
-    }[]
+    club?: number
+    category?: number
+    city?: number
+    vip?: 'VIP' | 'VIP+'
+    amenities?: number[]
+    top_k?: number
   }): Promise<
     ApiResponse<{
       ok: boolean
@@ -171,22 +171,6 @@ export function isDescriptiveQuery(query: string) {
   return isSmartQuery(normalizedQuery, tokens, detectIntents(normalizedQuery))
 }
 
-export function toSearchCatalog(packages: Package[]) {
-  return packages.map(pkg => ({
-    id: pkg.id,
-    name: pkg.business_name,
-    club: pkg.club_name || '',
-    category: pkg.business_category?.name || '',
-    city: pkg.city?.name || '',
-    gold: pkg.gold_experiences?.[0]
-      ? `${pkg.gold_experiences[0].name}: ${pkg.gold_experiences[0].description || ''}`
-      : '',
-    vip: pkg.vip_experiences?.[0]
-      ? `${pkg.vip_experiences[0].name}: ${pkg.vip_experiences[0].description || ''}`
-      : '',
-  }))
-}
-
 const INTENT_LABELS: Record<string, string> = {
   birthday: 'تولد و مناسبت',
   welcome: 'خوشامدگویی',